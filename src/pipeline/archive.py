@@ -0,0 +1,215 @@
+import logging
+import os
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional
+
+import pandas as pd
+from engine import Engine, get_engine
+from load_data import StockData
+from pipeline_config import load_pipeline_config
+from sqlalchemy import delete, select
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+    pq = None
+
+DEFAULT_ARCHIVE_DIRECTORY = "archive"
+
+# Rows older than this many days are moved to the archive, can be overridden in the [archive] section
+DEFAULT_HOT_DAYS = 365
+
+# Number of rows read from the database and written to Parquet at a time
+ARCHIVE_CHUNK_SIZE = 50000
+
+# The time column and the partition key column of every table that is archived. Only tables whose readers combine the
+# database with read_archive belong here, rows of the other tables would be lost to them e.g. to the news search and
+# the fingerprint deduplication of NewsData
+ARCHIVE_SOURCES = {
+    "StockData": (StockData, "datetime", "symbol"),
+}
+
+
+def require_pyarrow():
+    if pa is None:
+        raise ImportError("The Parquet archive needs pyarrow, install it with pip install pyarrow")
+
+
+def get_archive_directory() -> str:
+    return load_pipeline_config().get("archive", "directory", fallback=DEFAULT_ARCHIVE_DIRECTORY)
+
+
+def get_hot_cutoff(now: Optional[datetime] = None) -> datetime:
+    """
+    :return: Rows before this naive UTC datetime live in the archive, configured with hot_days in the [archive] section
+    """
+
+    now = now or datetime.now(timezone.utc)
+    hot_days = load_pipeline_config().getint("archive", "hot_days", fallback=DEFAULT_HOT_DAYS)
+
+    return (now - timedelta(days=hot_days)).replace(tzinfo=None)
+
+
+# Name of the single file of every month and key directory
+PARTITION_FILE = "data.parquet"
+
+
+def write_partitions(frame: pd.DataFrame, source: str, directory: str) -> int:
+    """
+    :return: Number of files that were written
+
+    Writes the rows to one zstd compressed Parquet file per month and key, laid out as
+    <directory>/source=<source>/month=<YYYY-MM>/<key column>=<key>/data.parquet so that readers can skip whole
+    directories. Rows of a month and key that is already archived are merged with the stored rows and the file is
+    replaced atomically, so a nightly run that archives one bar per symbol does not add a file per bar.
+    """
+
+    require_pyarrow()
+
+    _, time_column, key_column = ARCHIVE_SOURCES[source]
+
+    months = frame[time_column].dt.strftime("%Y-%m")
+    files = 0
+
+    for (month, key), group in frame.groupby([months, key_column], sort=False):
+        path = os.path.join(directory, f"source={source}", f"month={month}", f"{key_column}={key}")
+        os.makedirs(path, exist_ok=True)
+
+        # The partition values are part of the path. Every Parquet file in the directory is merged, which also
+        # compacts the one file per run layout of earlier versions
+        existing = sorted(entry.path for entry in os.scandir(path) if entry.name.endswith(".parquet"))
+        rows = group.drop(columns=[key_column])
+
+        if existing:
+            stored = pd.concat([pq.read_table(file).to_pandas() for file in existing], ignore_index=True)
+
+            # A row that is archived again replaces the stored one
+            rows = pd.concat([stored, rows], ignore_index=True).drop_duplicates(subset=[time_column], keep="last")
+
+        rows = rows.sort_values(time_column, ignore_index=True)
+
+        # Readers skip hidden files, so the partly written file is never read
+        temporary = os.path.join(path, f".{PARTITION_FILE}.tmp")
+
+        pq.write_table(pa.Table.from_pandas(rows, preserve_index=False), temporary, compression="zstd")
+        os.replace(temporary, os.path.join(path, PARTITION_FILE))
+
+        # Until these are removed their rows are in two files, the read path drops the duplicates
+        for file in existing:
+            if os.path.basename(file) != PARTITION_FILE:
+                os.remove(file)
+
+        files += 1
+
+    return files
+
+
+def archive_cold_rows(engine: Engine, now: Optional[datetime] = None) -> Dict[str, int]:
+    """
+    :return: Dictionary mapping every table to the number of rows that were moved to the archive
+
+    Every table is archived in its own transaction: the rows older than the hot window are written to Parquet and
+    then deleted. If the delete fails the rows are in both places, which the read path handles by preferring the
+    database.
+    """
+
+    require_pyarrow()
+
+    directory = get_archive_directory()
+    cutoff = get_hot_cutoff(now)
+
+    archived = {}
+
+    for source, (model, time_column, _) in ARCHIVE_SOURCES.items():
+        column = getattr(model, time_column)
+        count = 0
+
+        with engine.session_factory.begin() as session:
+            # Streams the result from a server side cursor instead of fetching it all at once
+            connection = session.connection(execution_options={"stream_results": True})
+
+            for chunk in pd.read_sql_query(
+                select(model.__table__).where(column < cutoff), connection, chunksize=ARCHIVE_CHUNK_SIZE
+            ):
+                write_partitions(chunk, source, directory)
+                count += len(chunk)
+
+            if count:
+                session.execute(delete(model).where(column < cutoff))
+
+        logging.info(f"Archived {count} rows of {source} older than {cutoff}")
+        archived[source] = count
+
+    return archived
+
+
+def archive_start(source: str) -> Optional[datetime]:
+    """
+    :return: Start of the earliest month in the archive of source, None if nothing is archived
+    """
+
+    try:
+        months = [
+            entry.name.removeprefix("month=")
+            for entry in os.scandir(os.path.join(get_archive_directory(), f"source={source}"))
+            if entry.is_dir() and entry.name.startswith("month=")
+        ]
+    except FileNotFoundError:
+        return None
+
+    return datetime.strptime(min(months), "%Y-%m") if months else None
+
+
+def read_archive(
+    source: str,
+    keys: List[str],
+    start: datetime,
+    end: datetime,
+    columns: Optional[List[str]] = None,
+) -> Optional[pd.DataFrame]:
+    """
+    :param keys: Values of the key column of source e.g. symbols, only their directories are read
+    :param columns: The columns to read, all of them if None
+    :return: Dataframe with the archived rows between start and end, None if nothing is archived or pyarrow is missing
+
+    The files are memory-mapped and only the months, keys and columns that are asked for are read.
+    """
+
+    if archive_start(source) is None:
+        return None
+
+    if pa is None:
+        logging.warning(f"pyarrow is not installed, the archived rows of {source} are left out")
+        return None
+
+    _, time_column, key_column = ARCHIVE_SOURCES[source]
+
+    table = pq.read_table(
+        os.path.join(get_archive_directory(), f"source={source}"),
+        columns=columns,
+        filters=[
+            ("month", ">=", start.strftime("%Y-%m")),
+            ("month", "<=", end.strftime("%Y-%m")),
+            (key_column, "in", keys),
+            (time_column, ">=", start),
+            (time_column, "<=", end),
+        ],
+        memory_map=True,
+        partitioning="hive",
+    )
+
+    frame = table.to_pandas().drop(columns=["month"], errors="ignore")
+
+    # Partition values are read back as categories
+    if key_column in frame.columns:
+        frame[key_column] = frame[key_column].astype(str)
+
+    return frame
+
+
+if __name__ == "__main__":
+    logging.getLogger().setLevel(logging.INFO)
+
+    archive_cold_rows(get_engine())
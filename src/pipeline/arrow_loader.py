@@ -0,0 +1,56 @@
+from datetime import datetime
+from typing import Any, Dict, List
+
+import pandas as pd
+from copy_loader import LOAD_SEQUENCE_COLUMN, merge_staging_table, staging_table_name
+from sqlalchemy.orm import Session as OrmSession
+from transform_data import as_naive_utc
+
+try:
+    import pyarrow as pa
+except ImportError:
+    pa = None
+
+
+def arrow_upsert(session: OrmSession, model, rows: List[Dict[str, Any]], update_on_conflict: bool):
+    """
+    :param model: The ORM model of the target table e.g. StockData
+    :param update_on_conflict: Overwrite rows with the same primary key instead of keeping the stored ones
+
+    Bulk path of DuckDB: the rows are handed over as one Arrow table, which DuckDB scans in place, and merged into
+    the target table with a single INSERT ... SELECT ... ON CONFLICT statement. Without pyarrow a pandas dataframe
+    is handed over instead.
+    """
+
+    if not rows:
+        return
+
+    table = model.__table__
+    columns = [column.name for column in table.columns if column is not table.autoincrement_column]
+
+    records = [
+        {
+            **{
+                column: as_naive_utc(row.get(column)) if isinstance(row.get(column), datetime) else row.get(column)
+                for column in columns
+            },
+            LOAD_SEQUENCE_COLUMN: load_sequence,
+        }
+        for load_sequence, row in enumerate(rows)
+    ]
+
+    staging = (
+        pa.Table.from_pylist(records)
+        if pa is not None
+        else pd.DataFrame.from_records(records, columns=columns + [LOAD_SEQUENCE_COLUMN])
+    )
+
+    staging_name = staging_table_name(table)
+    connection = session.connection().connection.driver_connection
+
+    connection.register(staging_name, staging)
+
+    try:
+        merge_staging_table(session, model, update_on_conflict=update_on_conflict)
+    finally:
+        connection.unregister(staging_name)
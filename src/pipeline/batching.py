@@ -0,0 +1,22 @@
+from itertools import islice
+from typing import Iterable, Iterator, List, TypeVar
+
+T = TypeVar("T")
+
+
+def chunked(iterable: Iterable[T], size: int) -> Iterator[List[T]]:
+    """
+    :param iterable: Any iterable e.g. a generator of rows
+    :param size: Maximum number of items per chunk
+    :return: Iterator of lists with up to size items each, only one chunk is held in memory at a time
+    """
+
+    iterator = iter(iterable)
+
+    while True:
+        chunk = list(islice(iterator, size))
+
+        if not chunk:
+            return
+
+        yield chunk
@@ -0,0 +1,113 @@
+import io
+from datetime import datetime
+from typing import Any, Dict, List
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session as OrmSession
+from transform_data import as_naive_utc
+
+# Loads with at least this many rows go through COPY instead of multi-row INSERTs, see [load] copy_threshold
+DEFAULT_COPY_THRESHOLD = 50000
+
+# Extra column of the staging tables which numbers the rows in the order they were loaded, so that the merge keeps the
+# last row with each primary key like the multi-row INSERTs do
+LOAD_SEQUENCE_COLUMN = "load_sequence"
+
+
+def staging_table_name(table) -> str:
+    return f"staging_{table.name.lower()}"
+
+
+def _to_csv_field(value: Any) -> str:
+    # Unquoted empty fields are read as NULL by COPY, quoted ones as empty strings
+    if value is None:
+        return ""
+
+    if isinstance(value, datetime):
+        # COPY would silently drop the offset of an aware datetime instead of converting it to UTC
+        return as_naive_utc(value).isoformat()
+
+    if isinstance(value, (int, float)):
+        return str(value)
+
+    return '"' + str(value).replace('"', '""') + '"'
+
+
+def create_staging_table(session: OrmSession, model):
+    """
+    :param model: The ORM model of the target table e.g. StockData
+
+    Creates a temporary table with the columns of the target table and a load sequence, which is dropped when the
+    transaction ends.
+    """
+
+    table = model.__table__
+
+    session.execute(
+        text(
+            f"CREATE TEMP TABLE {staging_table_name(table)} "
+            f'(LIKE "{table.name}" INCLUDING DEFAULTS, "{LOAD_SEQUENCE_COLUMN}" BIGSERIAL) ON COMMIT DROP'
+        )
+    )
+
+
+def copy_into_staging(session: OrmSession, model, rows: List[Dict[str, Any]]):
+    """
+    Stream rows into the staging table with COPY FROM STDIN, using an in-memory CSV buffer instead of a temporary file.
+    COPY keeps the order of the rows, so the load sequence is filled in from its default
+    """
+
+    if not rows:
+        return
+
+    table = model.__table__
+    columns = [column.name for column in table.columns]
+
+    buffer = io.StringIO()
+
+    for row in rows:
+        buffer.write(",".join(_to_csv_field(row.get(column)) for column in columns))
+        buffer.write("\n")
+
+    buffer.seek(0)
+
+    column_list = ", ".join(f'"{column}"' for column in columns)
+
+    cursor = session.connection().connection.cursor()
+
+    try:
+        cursor.copy_expert(f"COPY {staging_table_name(table)} ({column_list}) FROM STDIN WITH (FORMAT csv)", buffer)
+    finally:
+        cursor.close()
+
+
+def merge_staging_table(session: OrmSession, model, update_on_conflict: bool):
+    """
+    :param update_on_conflict: Overwrite rows with the same primary key instead of keeping the stored ones
+
+    Merges the staging table into the target table with a single INSERT ... SELECT ... ON CONFLICT statement. Of the
+    staged rows with the same primary key the one with the highest load sequence is merged.
+    """
+
+    table = model.__table__
+
+    columns = ", ".join(f'"{column.name}"' for column in table.columns)
+    primary_key = ", ".join(f'"{column.name}"' for column in table.primary_key.columns)
+
+    if update_on_conflict:
+        updates = ", ".join(
+            f'"{column.name}" = excluded."{column.name}"' for column in table.columns if not column.primary_key
+        )
+        on_conflict = f"DO UPDATE SET {updates}"
+    else:
+        on_conflict = "DO NOTHING"
+
+    # DISTINCT ON since a statement must not touch the same row twice, it keeps the first row of every key in the order
+    session.execute(
+        text(
+            f'INSERT INTO "{table.name}" ({columns}) '
+            f"SELECT DISTINCT ON ({primary_key}) {columns} FROM {staging_table_name(table)} "
+            f'ORDER BY {primary_key}, "{LOAD_SEQUENCE_COLUMN}" DESC '
+            f"ON CONFLICT ({primary_key}) {on_conflict}"
+        )
+    )
@@ -1,5 +1,6 @@
 import json
-from typing import List
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional, Tuple
 
 import dash_bootstrap_components as dbc
 import numpy as np
@@ -7,10 +8,21 @@ import pandas as pd
 import plotly.express as px
 import plotly.graph_objects as go
 import requests
-from dash import Dash, Input, Output, dcc, html
-from engine import Engine
-from load_data import NewsData, buildEngine
-from sqlalchemy.orm import sessionmaker
+from dash import Dash, Input, Output, Patch, State, dcc, html, no_update
+from dash.exceptions import PreventUpdate
+from downsample import downsample_frame, get_live_max_points, get_max_points, visible_range
+from engine import Engine, get_engine
+from queries import (
+    get_last_bar_times,
+    get_live_interval_seconds,
+    get_lookback_start,
+    get_new_stock_closes,
+    get_news_page,
+    get_news_page_size,
+    get_stock_closes,
+    search_news,
+)
+from result_cache import memoize
 
 app = Dash(external_stylesheets=[dbc.themes.SLATE], suppress_callback_exceptions=True)
 
@@ -32,6 +44,22 @@ app.layout = html.Div(
 )
 
 
+def create_news_search() -> html.Div:
+    """
+    return: html.Div with the search box and date range of the news search, shared by both news panels
+    """
+
+    return html.Div(
+        [
+            dcc.Input(
+                id="news-search", type="search", placeholder="Search the news", debounce=True, style={"width": "400px"}
+            ),
+            dcc.DatePickerRange(id="news-search-dates", clearable=True),
+        ],
+        style={"display": "flex", "margin": "auto", "width": "1800px", "justify-content": "center", "gap": "20px"},
+    )
+
+
 def create_country_dropdowns(info_type: str) -> html.Div:
     """
     return: html.Div which contains the relevant heading and country dropdowns with the particular ids.
@@ -57,6 +85,7 @@ def create_country_dropdowns(info_type: str) -> html.Div:
                 ],
                 style={"display": "flex", "margin": "auto", "width": "1800px", "justify-content": "space-around"},
             ),
+            *([create_news_search()] if info_type == "News" else []),
             html.Div(
                 [
                     dbc.Card(
@@ -120,73 +149,352 @@ def render_content(tab):
         )
 
 
-def create_stocks_graph(selected_country: str):
+@memoize
+def create_stocks_figure(selected_country: str, start: Optional[datetime] = None, end: Optional[datetime] = None):
+    """
+    :param start: Start of the time range to show, the first stored bar if None
+    :param end: End of the time range to show, the last stored bar if None
+    :return: Figure with the closing prices of the stocks of the country, cached until the next load
+    """
+
     with open('configs/my_stocks.json', 'r') as file:
         my_stocks = json.load(file)
 
     symbols = [stock['symbol'] for stock in my_stocks['stocks'][selected_country]]
 
-    engine: Engine = buildEngine()
+    # One engine per process, so the callbacks reuse the pooled connections
+    engine: Engine = get_engine()
 
-    # Convert table from database into datafram since plotly relies on dataframes
-    df = pd.read_sql_table("StockData", engine.db_engine.connect())
+    # Convert table from database into datafram since plotly relies on dataframes. Long time ranges are read from the
+    # daily, weekly or monthly rollups instead of the raw bars. Only the rows of the selected symbols and time range
+    # are read from the database
+    # Read before the closes, so a bar stored in between is at worst fetched again by the live updates and never missed
+    last_bars = get_last_bar_times(engine, symbols)
 
-    df = df[['symbol', 'datetime', 'close']]
+    df = get_stock_closes(engine, symbols, start=start, end=end)
+    resolution = df.attrs.get("resolution", "StockData")
 
-    df = df.query(f"symbol in {symbols}")
+    # A panel cannot show more points than it has pixels, so every line is reduced to at most max_points points
+    df = downsample_frame(df, x="datetime", y="close", by="symbol", max_points=get_max_points())
 
     fig = px.line(df, x="datetime", y="close", color="symbol")
 
-    fig.update_layout(template="plotly_dark", xaxis_title='Date', yaxis_title='Closing Price')
+    # The same uirevision keeps the zoom of the user when the figure is replaced with the data of the visible range
+    fig.update_layout(
+        template="plotly_dark", xaxis_title='Date', yaxis_title='Closing Price', uirevision=selected_country
+    )
+
+    # For create_live_state: the table the lines were read from and the last raw bar of every symbol
+    fig.update_layout(
+        meta={"resolution": resolution, "last_bars": {symbol: last.isoformat() for symbol, last in last_bars.items()}}
+    )
+
+    return fig
+
+
+def create_live_state(fig, live: bool = True) -> Dict[str, Any]:
+    """
+    :param live: Whether new bars should be appended to the figure, they are not while the user looks at a zoomed range
+    :return: The trace index of every symbol of the figure, the table its lines were read from and, if live, the time
+    of the last raw bar it shows of every symbol as ISO string
+    """
+
+    meta = fig.layout.meta or {}
+    resolution = meta.get("resolution", "StockData")
+
+    traces = {trace.name: index for index, trace in enumerate(fig.data)}
+
+    if not live:
+        last = {}
+    elif resolution == "StockData":
+        last = {trace.name: pd.Timestamp(trace.x[-1]).isoformat() for trace in fig.data if len(trace.x)}
+    else:
+        # The last point of a rollup line is the start of its bucket, not the time of the last bar in it
+        last = {symbol: time for symbol, time in meta.get("last_bars", {}).items() if symbol in traces}
+
+    return {"traces": traces, "last": last, "resolution": resolution}
+
+
+def create_stocks_graph(panel: str, selected_country: str):
+    fig = create_stocks_figure(selected_country, get_lookback_start())
+
+    return [
+        dcc.Graph(id=f"{panel}-stocks-graph", figure=fig),
+        # Which bars the browser already has, the live updates only send the ones after them
+        dcc.Store(id=f"{panel}-stocks-live", data=create_live_state(fig)),
+        dcc.Interval(id=f"{panel}-stocks-interval", interval=get_live_interval_seconds() * 1000),
+    ]
+
+
+def zoom_stocks_graph(relayout_data, selected_country: str):
+    """
+    :return: The figure of the range the user zoomed or panned to, read again from the database at the resolution of
+    that range, and the default figure after the axes were reset. Live updates pause while a range is zoomed
+    """
+
+    zoom = visible_range(relayout_data)
+
+    if zoom is None:
+        raise PreventUpdate
+
+    start, end = zoom
+
+    if start is None:
+        fig = create_stocks_figure(selected_country, get_lookback_start())
+
+        return fig, create_live_state(fig)
+
+    fig = create_stocks_figure(selected_country, start, end)
+
+    return fig, create_live_state(fig, live=False)
+
+
+def extend_stocks_graph(live_state: Dict[str, Any], selected_country: str):
+    """
+    :return: The extendData which appends the bars stored since the last update to the lines of the graph, at most
+    live_max_points points per line, the figure and the new live state. No update if there are no new bars
+
+    Lines of raw bars get the new bars appended. Rollup lines would need their last bucket replaced, which extendData
+    cannot do, so their figure is built again at its resolution instead.
+    """
+
+    if not live_state or not live_state["last"]:
+        raise PreventUpdate
+
+    last_seen = {symbol: datetime.fromisoformat(last) for symbol, last in live_state["last"].items()}
 
-    return dcc.Graph(figure=fig)
+    new_closes = get_new_stock_closes(get_engine(), last_seen)
+
+    if new_closes.empty:
+        raise PreventUpdate
+
+    if live_state.get("resolution", "StockData") != "StockData":
+        fig = create_stocks_figure(selected_country, get_lookback_start())
+        new_live_state = create_live_state(fig)
+
+        # The cached figure is only built again once run.py bumped the data version after the load
+        if new_live_state["last"] == live_state["last"]:
+            raise PreventUpdate
+
+        return no_update, fig, new_live_state
+
+    traces, x, y = [], [], []
+
+    for symbol, bars in new_closes.groupby("symbol", observed=True, sort=False):
+        traces.append(live_state["traces"][symbol])
+        x.append([value.isoformat() for value in bars["datetime"]])
+        y.append(bars["close"].tolist())
+
+        live_state["last"][symbol] = x[-1][-1]
+
+    return ({"x": x, "y": y}, traces, get_live_max_points()), no_update, live_state
 
 
 @app.callback(Output("country1-stocks", "children"), Input("select-country1-stocks", "value"))
 def stocks1(selected_country):
-    return create_stocks_graph(selected_country)
+    return create_stocks_graph("country1", selected_country)
 
 
 @app.callback(Output("country2-stocks", "children"), Input("select-country2-stocks", "value"))
 def stocks2(selected_country):
-    return create_stocks_graph(selected_country)
-
-
-def create_news_div(selected_country: str):
-    engine: Engine = buildEngine()
-
-    Session = sessionmaker(bind=engine.db_engine)
-
-    with Session.begin() as session:
-        content = []
-
-        articles = session.query(NewsData).filter(NewsData.country == selected_country)
-        for article in articles:
-            content.append(
-                html.Div(
-                    [
-                        html.Div(
-                            [
-                                html.H3([article.title], style={"font-size": "20px"}),
-                                html.P([article.description]),
-                                html.P([article.url]),
-                            ]
-                        )
-                    ]
-                )
+    return create_stocks_graph("country2", selected_country)
+
+
+@app.callback(
+    Output("country1-stocks-graph", "figure", allow_duplicate=True),
+    Output("country1-stocks-live", "data", allow_duplicate=True),
+    Input("country1-stocks-graph", "relayoutData"),
+    State("select-country1-stocks", "value"),
+    prevent_initial_call=True,
+)
+def zoom_stocks1(relayout_data, selected_country):
+    return zoom_stocks_graph(relayout_data, selected_country)
+
+
+@app.callback(
+    Output("country2-stocks-graph", "figure", allow_duplicate=True),
+    Output("country2-stocks-live", "data", allow_duplicate=True),
+    Input("country2-stocks-graph", "relayoutData"),
+    State("select-country2-stocks", "value"),
+    prevent_initial_call=True,
+)
+def zoom_stocks2(relayout_data, selected_country):
+    return zoom_stocks_graph(relayout_data, selected_country)
+
+
+@app.callback(
+    Output("country1-stocks-graph", "extendData"),
+    Output("country1-stocks-graph", "figure", allow_duplicate=True),
+    Output("country1-stocks-live", "data", allow_duplicate=True),
+    Input("country1-stocks-interval", "n_intervals"),
+    State("country1-stocks-live", "data"),
+    State("select-country1-stocks", "value"),
+    prevent_initial_call=True,
+)
+def live_stocks1(n_intervals, live_state, selected_country):
+    return extend_stocks_graph(live_state, selected_country)
+
+
+@app.callback(
+    Output("country2-stocks-graph", "extendData"),
+    Output("country2-stocks-graph", "figure", allow_duplicate=True),
+    Output("country2-stocks-live", "data", allow_duplicate=True),
+    Input("country2-stocks-interval", "n_intervals"),
+    State("country2-stocks-live", "data"),
+    State("select-country2-stocks", "value"),
+    prevent_initial_call=True,
+)
+def live_stocks2(n_intervals, live_state, selected_country):
+    return extend_stocks_graph(live_state, selected_country)
+
+
+def create_article_divs(articles) -> List[html.Div]:
+    content = []
+
+    for article in articles:
+        content.append(
+            html.Div(
+                [
+                    html.Div(
+                        [
+                            html.H3([article.title], style={"font-size": "20px"}),
+                            html.P([article.description]),
+                            html.P([article.url]),
+                        ]
+                    )
+                ]
             )
+        )
+
+    return content
+
 
-        return content
+@memoize
+def render_news_page(
+    selected_country: str,
+    cursor=None,
+    search: Optional[str] = None,
+    start_date: Optional[str] = None,
+    end_date: Optional[str] = None,
+):
+    """
+    :param cursor: Where the page starts, None for the first page. The [published_date, id] of the last article
+    already shown when listing the newest articles, the number of results already shown when searching
+    :param search: The search terms, the newest articles are listed if empty
+    :param start_date: First day of the search as YYYY-MM-DD, no lower bound if None
+    :param end_date: Last day of the search as YYYY-MM-DD, no upper bound if None
+    :return: The components of the next page of articles, the cursor of the page after it and whether there may be
+    more articles
+    """
+
+    page_size = get_news_page_size()
+    engine: Engine = get_engine()
+
+    # Only the shown columns of one page are read, as plain rows instead of ORM objects
+    if search and search.strip():
+        offset = cursor or 0
+
+        articles = search_news(
+            engine,
+            search,
+            selected_country,
+            start=datetime.fromisoformat(start_date) if start_date else None,
+            end=datetime.fromisoformat(end_date) + timedelta(days=1) if end_date else None,
+            offset=offset,
+            page_size=page_size,
+        )
+
+        cursor = offset + len(articles)
+    else:
+        after = (datetime.fromisoformat(cursor[0]), cursor[1]) if cursor else None
+
+        articles = get_news_page(engine, selected_country, after=after, page_size=page_size)
+
+        if articles:
+            cursor = [articles[-1].published_date.isoformat(), articles[-1].id]
+
+    return create_article_divs(articles), cursor, len(articles) == page_size
+
+
+def create_news_div(panel: str, selected_country: str, search: Optional[str], dates: Tuple[Optional[str], ...]):
+    content, cursor, has_more = render_news_page(selected_country, None, search, *dates)
+
+    return [
+        html.Div(content, id=f"{panel}-news-list"),
+        # Where the next page starts, see render_news_page
+        dcc.Store(id=f"{panel}-news-cursor", data=cursor),
+        dbc.Button("More", id=f"{panel}-news-more", color="primary", disabled=not has_more),
+    ]
 
 
-@app.callback(Output("country1-news", "children"), Input("select-country1-news", "value"))
-def render_news_country1(selected_country):
-    return create_news_div(selected_country)
+def load_more_news(selected_country: str, cursor, search: Optional[str], dates: Tuple[Optional[str], ...]):
+    """
+    :return: Patch which appends the next page to the news list, the new cursor and whether to disable the button
+    """
+
+    if cursor is None:
+        raise PreventUpdate
+
+    content, cursor, has_more = render_news_page(selected_country, cursor, search, *dates)
+
+    news_list = Patch()
+    news_list.extend(content)
+
+    return news_list, cursor, not has_more
 
 
-@app.callback(Output("country2-news", "children"), Input("select-country2-news", "value"))
-def render_news_country2(selected_country):
-    return create_news_div(selected_country)
+@app.callback(
+    Output("country1-news", "children"),
+    Input("select-country1-news", "value"),
+    Input("news-search", "value"),
+    Input("news-search-dates", "start_date"),
+    Input("news-search-dates", "end_date"),
+)
+def render_news_country1(selected_country, search, start_date, end_date):
+    return create_news_div("country1", selected_country, search, (start_date, end_date))
+
+
+@app.callback(
+    Output("country2-news", "children"),
+    Input("select-country2-news", "value"),
+    Input("news-search", "value"),
+    Input("news-search-dates", "start_date"),
+    Input("news-search-dates", "end_date"),
+)
+def render_news_country2(selected_country, search, start_date, end_date):
+    return create_news_div("country2", selected_country, search, (start_date, end_date))
+
+
+@app.callback(
+    Output("country1-news-list", "children"),
+    Output("country1-news-cursor", "data"),
+    Output("country1-news-more", "disabled"),
+    Input("country1-news-more", "n_clicks"),
+    State("select-country1-news", "value"),
+    State("country1-news-cursor", "data"),
+    State("news-search", "value"),
+    State("news-search-dates", "start_date"),
+    State("news-search-dates", "end_date"),
+    prevent_initial_call=True,
+)
+def more_news_country1(n_clicks, selected_country, cursor, search, start_date, end_date):
+    return load_more_news(selected_country, cursor, search, (start_date, end_date))
+
+
+@app.callback(
+    Output("country2-news-list", "children"),
+    Output("country2-news-cursor", "data"),
+    Output("country2-news-more", "disabled"),
+    Input("country2-news-more", "n_clicks"),
+    State("select-country2-news", "value"),
+    State("country2-news-cursor", "data"),
+    State("news-search", "value"),
+    State("news-search-dates", "start_date"),
+    State("news-search-dates", "end_date"),
+    prevent_initial_call=True,
+)
+def more_news_country2(n_clicks, selected_country, cursor, search, start_date, end_date):
+    return load_more_news(selected_country, cursor, search, (start_date, end_date))
 
 
 if __name__ == "__main__":
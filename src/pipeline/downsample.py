@@ -0,0 +1,118 @@
+from datetime import datetime
+from typing import Any, Dict, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+from pipeline_config import load_pipeline_config
+
+# Maximum number of points per line of a stock graph, about two per horizontal pixel of a dashboard panel. Can be
+# overridden with max_points in the [dashboard] section
+DEFAULT_MAX_POINTS = 1000
+
+# Maximum number of points per line once live updates appended bars to it, the oldest points are dropped beyond it.
+# Can be overridden with live_max_points in the [dashboard] section
+DEFAULT_LIVE_MAX_POINTS = 2 * DEFAULT_MAX_POINTS
+
+
+def get_max_points() -> int:
+    return load_pipeline_config().getint("dashboard", "max_points", fallback=DEFAULT_MAX_POINTS)
+
+
+def get_live_max_points() -> int:
+    return load_pipeline_config().getint("dashboard", "live_max_points", fallback=DEFAULT_LIVE_MAX_POINTS)
+
+
+def lttb(x: np.ndarray, y: np.ndarray, threshold: int) -> np.ndarray:
+    """
+    Largest-Triangle-Three-Buckets downsampling: keeps the first and last point and from each of threshold - 2
+    equally sized buckets in between the point which forms the largest triangle with the point kept from the previous
+    bucket and the average of the next bucket. Peaks and dips survive, unlike with plain decimation or averaging.
+
+    :param x: Sorted x values e.g. timestamps as numbers
+    :param y: y values
+    :param threshold: Number of points to keep
+    :return: Sorted indices of the points to keep
+    """
+
+    n = len(x)
+
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+
+    # threshold - 2 buckets over the points between the first and the last one, none of them empty as threshold < n
+    edges = np.linspace(1, n - 1, threshold - 1).astype(np.int64)
+    counts = np.diff(edges)
+
+    # Average of every bucket, followed by the last point which plays the next bucket of the last bucket
+    average_x = np.append(np.add.reduceat(x, edges[:-1]) / counts, x[-1])
+    average_y = np.append(np.add.reduceat(y, edges[:-1]) / counts, y[-1])
+
+    indices = np.empty(threshold, dtype=np.int64)
+    indices[0] = 0
+    indices[-1] = n - 1
+
+    previous = 0
+
+    for bucket in range(threshold - 2):
+        start, end = edges[bucket], edges[bucket + 1]
+
+        # Twice the area of the triangles between the previous point, every candidate and the next average
+        areas = np.abs(
+            (x[previous] - average_x[bucket + 1]) * (y[start:end] - y[previous])
+            - (x[previous] - x[start:end]) * (average_y[bucket + 1] - y[previous])
+        )
+
+        previous = start + int(np.argmax(areas))
+        indices[bucket + 1] = previous
+
+    return indices
+
+
+def downsample_frame(frame: pd.DataFrame, x: str, y: str, by: str, max_points: int) -> pd.DataFrame:
+    """
+    :param frame: Dataframe sorted by the by and x columns, e.g. from get_stock_closes
+    :param by: Column with the name of the line of every row e.g. symbol
+    :param max_points: Maximum number of points to keep per line
+    :return: The rows kept by lttb from every line
+    """
+
+    if frame.empty:
+        return frame
+
+    kept = []
+
+    for _, line in frame.groupby(by, sort=False, observed=True):
+        x_values = line[x].to_numpy()
+
+        if np.issubdtype(x_values.dtype, np.datetime64):
+            x_values = x_values.astype("datetime64[ns]").astype(np.int64)
+
+        kept.append(line.iloc[lttb(x_values, line[y].to_numpy(), max_points)])
+
+    return pd.concat(kept, ignore_index=True)
+
+
+def visible_range(relayout_data: Optional[Dict[str, Any]]) -> Optional[Tuple[Optional[datetime], Optional[datetime]]]:
+    """
+    :param relayout_data: The relayoutData of a dcc.Graph after the user zoomed, panned or reset the axes
+    :return: The visible x range after a zoom or pan, (None, None) after the axes were reset and None if the x axis
+    did not change
+    """
+
+    if not relayout_data:
+        return None
+
+    if relayout_data.get("xaxis.autorange"):
+        return None, None
+
+    if "xaxis.range[0]" in relayout_data and "xaxis.range[1]" in relayout_data:
+        start, end = relayout_data["xaxis.range[0]"], relayout_data["xaxis.range[1]"]
+    elif "xaxis.range" in relayout_data:
+        start, end = relayout_data["xaxis.range"]
+    else:
+        return None
+
+    return pd.Timestamp(start).to_pydatetime(), pd.Timestamp(end).to_pydatetime()
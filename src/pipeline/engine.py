@@ -1,8 +1,114 @@
-from sqlalchemy import create_engine
+import configparser
+import logging
+import os
+import threading
+import time
+from typing import Any, Dict, Optional
+
+from sqlalchemy import create_engine, text
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import QueuePool
+
+DATABASE_CONFIG_PATH = "configs/database.ini"
+
+# Backends which can be selected with backend in the [database] section of configs/database.ini. SQLite and DuckDB
+# run in-process and store everything in the file given by path
+SUPPORTED_BACKENDS = ("postgresql", "sqlite", "duckdb")
+
+DEFAULT_EMBEDDED_PATHS = {"sqlite": "data/dashboard.sqlite", "duckdb": "data/dashboard.duckdb"}
+
+# Seconds wait_until_ready waits for the database server to accept connections
+DEFAULT_READY_TIMEOUT = 60
+
+# Can be overridden in the [pool] section of configs/database.ini
+DEFAULT_POOL_SETTINGS = {
+    "pool_size": 5,
+    "max_overflow": 10,
+    # Seconds to wait for a connection before giving up
+    "pool_timeout": 30,
+    # Seconds after which a connection is replaced, so that connections dropped by the server are not handed out
+    "pool_recycle": 1800,
+    "pool_pre_ping": True,
+}
+
+
+class PoolStats:
+    """
+    Counts the connection checkouts of a pool and how long they had to wait for a free connection
+    """
+
+    def __init__(self):
+        self.checkouts = 0
+        self.timeouts = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+
+        self._lock = threading.Lock()
+
+    def record(self, wait: float, timed_out: bool = False):
+        with self._lock:
+            if timed_out:
+                self.timeouts += 1
+            else:
+                self.checkouts += 1
+
+            self.total_wait += wait
+            self.max_wait = max(self.max_wait, wait)
+
+    def report(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "checkouts": self.checkouts,
+                "timeouts": self.timeouts,
+                "average_wait_ms": round(1000 * self.total_wait / max(1, self.checkouts + self.timeouts), 3),
+                "max_wait_ms": round(1000 * self.max_wait, 3),
+            }
+
+
+class InstrumentedQueuePool(QueuePool):
+    """
+    QueuePool which records the time every checkout waits for a connection in self.stats
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.stats = PoolStats()
+
+    def _do_get(self):
+        start = time.perf_counter()
+
+        try:
+            connection = super()._do_get()
+        except PoolTimeoutError:
+            self.stats.record(time.perf_counter() - start, timed_out=True)
+            raise
+
+        self.stats.record(time.perf_counter() - start)
+
+        return connection
 
 
 class Engine:
-    def __init__(self, user: str, password: str, host: str, port: int, db_type: str, db_name: str):
+    def __init__(
+        self,
+        user: Optional[str] = None,
+        password: Optional[str] = None,
+        host: Optional[str] = None,
+        port: Optional[int] = None,
+        db_type: str = "postgresql",
+        db_name: Optional[str] = None,
+        pool_settings: Optional[Dict[str, Any]] = None,
+    ):
+        """
+        :param db_type: One of SUPPORTED_BACKENDS
+        :param db_name: Name of the database, or the path of the database file for sqlite and duckdb
+        """
+
+        if db_type not in SUPPORTED_BACKENDS:
+            raise ValueError(f"Unsupported database backend {db_type}, expected one of {', '.join(SUPPORTED_BACKENDS)}")
+
         self.user = user
         self.password = password
         self.host = host
@@ -10,7 +116,138 @@ class Engine:
         self.db_type = db_type
         self.db_name = db_name
 
-        self.db_engine = create_engine(f"{db_type}://{user}:{password}@{host}:{port}/{db_name}")
+        if self.is_embedded:
+            # An embedded database has a single writer, more connections would only wait for each other
+            pool_settings = {"pool_size": 1, "max_overflow": 0, "pool_timeout": DEFAULT_POOL_SETTINGS["pool_timeout"]}
+            connect_args = {"check_same_thread": False} if db_type == "sqlite" else {}
+        else:
+            pool_settings = pool_settings or DEFAULT_POOL_SETTINGS
+            connect_args = {}
+
+        self.db_engine = create_engine(
+            self.get_db_connection_url(),
+            poolclass=InstrumentedQueuePool,
+            connect_args=connect_args,
+            **pool_settings,
+        )
+        self.session_factory = sessionmaker(bind=self.db_engine)
+
+    @property
+    def is_embedded(self) -> bool:
+        return self.db_type in ("sqlite", "duckdb")
 
     def get_db_connection_url(self):
+        if self.is_embedded:
+            return f"{self.db_type}:///{self.db_name}"
+
         return f"{self.db_type}://{self.user}:{self.password}@{self.host}:{self.port}/{self.db_name}"
+
+    def wait_until_ready(self, timeout: float = DEFAULT_READY_TIMEOUT):
+        """
+        Block until the database server accepts connections, raises the last connection error after timeout seconds.
+        Embedded databases are always ready.
+        """
+
+        if self.is_embedded:
+            return
+
+        deadline = time.monotonic() + timeout
+        delay = 0.5
+
+        while True:
+            try:
+                with self.db_engine.connect() as connection:
+                    connection.execute(text("SELECT 1"))
+                return
+            except OperationalError:
+                if time.monotonic() + delay > deadline:
+                    raise
+
+                logging.info(f"Waiting for the database at {self.host}:{self.port}")
+                time.sleep(delay)
+                delay = min(2 * delay, 5.0)
+
+    def pool_report(self) -> Dict[str, Any]:
+        """
+        :return: Checkout and wait statistics of the connection pool, and its current state
+        """
+
+        return {**self.db_engine.pool.stats.report(), "status": self.db_engine.pool.status()}
+
+
+def load_pool_settings(config: configparser.ConfigParser) -> Dict[str, Any]:
+    """
+    :return: Keyword arguments for create_engine from the [pool] section of configs/database.ini
+    """
+
+    settings = dict(DEFAULT_POOL_SETTINGS)
+
+    if config.has_section("pool"):
+        for option in ("pool_size", "max_overflow", "pool_timeout", "pool_recycle"):
+            if config.has_option("pool", option):
+                settings[option] = config.getint("pool", option)
+
+        if config.has_option("pool", "pool_pre_ping"):
+            settings["pool_pre_ping"] = config.getboolean("pool", "pool_pre_ping")
+
+    return settings
+
+
+_engine: Optional[Engine] = None
+_engine_pid: Optional[int] = None
+_engine_lock = threading.Lock()
+
+
+def get_engine() -> Engine:
+    """
+    :return: The engine of the current process, configured from configs/database.ini and created on first use.
+    The backend is selected with backend in the [database] section, PostgreSQL by default
+
+    Connections must not be shared between processes, so a process forked from one that already had an engine
+    e.g. a gunicorn worker gets a new engine. The pool inherited from the parent is discarded without closing the
+    connections, which the parent still uses.
+    """
+
+    global _engine, _engine_pid
+
+    with _engine_lock:
+        if _engine is not None and _engine_pid != os.getpid():
+            _engine.db_engine.dispose(close=False)
+            _engine = None
+
+        if _engine is None:
+            config = configparser.ConfigParser()
+            config.read(DATABASE_CONFIG_PATH)
+
+            backend = config.get("database", "backend", fallback="postgresql")
+
+            if backend == "postgresql":
+                # Get the PostgreSQL connection details
+                _engine = Engine(
+                    user=config.get("postgresql", "user"),
+                    password=config.get("postgresql", "password"),
+                    host=config.get("postgresql", "host"),
+                    port=config.get("postgresql", "port"),
+                    db_type="postgresql",
+                    db_name=config.get("postgresql", "dbname"),
+                    pool_settings=load_pool_settings(config),
+                )
+            else:
+                path = config.get("database", "path", fallback=DEFAULT_EMBEDDED_PATHS.get(backend))
+
+                if path and path != ":memory:" and os.path.dirname(path):
+                    os.makedirs(os.path.dirname(path), exist_ok=True)
+
+                _engine = Engine(db_type=backend, db_name=path)
+
+            _engine_pid = os.getpid()
+
+        return _engine
+
+
+def get_sessionmaker() -> sessionmaker:
+    """
+    :return: The session factory bound to the engine of the current process
+    """
+
+    return get_engine().session_factory
@@ -2,136 +2,252 @@ import configparser
 import datetime
 import json
 import logging
+import math
 import sys
 from datetime import datetime
-from typing import Any, Dict, List, Optional
+from itertools import chain
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
 
+import numpy as np
 import requests
+from extraction_engine import ExtractionTask
+from http_client import get_session, http_get
 from newsapi import NewsApiClient
+from rate_limiter import get_rate_limiter
+from transform_data import (
+    alpha_vantage_frame,
+    cross_rate_discrepancies,
+    cross_rate_matrix,
+    cross_rate_records,
+    frame_to_records,
+    market_stack_frame,
+    newsdataio_frame,
+)
 
+# Number of transformed records the streaming extractors yield at a time
+DEFAULT_EXTRACT_BATCH_SIZE = 1000
 
-def get_stock_data_market_stack(symbol: str = "AAPL") -> List[Dict[str, Any]]:
-    """
-    :param symbol: The company or index you would like to get information from AlphaAvantage API e.g. TSLA
-    :return: List of dictionaries where each dictionary contains stock data information for the symbol at a particular time point
+# The /eod endpoint accepts up to 100 comma-separated symbols and up to 1000 results per page
+MARKET_STACK_MAX_SYMBOLS_PER_REQUEST = 100
+MARKET_STACK_MAX_PAGE_LIMIT = 1000
 
-    For more info about MarketData API: https://marketstack.com/documentation
-    Max of 1000 monthly API calls per month on free version.
+# Days of end-of-day data Marketstack returns for a symbol without date_from, used to estimate the pages of a first load
+MARKET_STACK_DEFAULT_HISTORY_DAYS = 365
+
+# Number of currencies ExchangeRate-API quotes, verifying all of the exchange rates costs one call for each
+EXCHANGE_RATE_API_CURRENCY_COUNT = 161
+
+
+def get_api_key(name: str) -> str:
+    """
+    :param name: Name of the key in the [api_keys] section of configs/api_keys.ini e.g. Marketstack_api_key
+    :return: The API key
     """
 
     config = configparser.ConfigParser()
     config.read("configs/api_keys.ini")
 
-    api_key = config.get("api_keys", "Marketstack_api_key")
+    return config.get("api_keys", name)
 
-    url = f"http://api.marketstack.com/v1/eod?access_key={api_key}&symbols={symbol}"
 
-    try:
-        response = requests.get(url)
-    except requests.ConnectionError as ce:
-        logging.error(f"There was an error with the request: {ce}")
-        sys.exit(1)
+def estimate_market_stack_calls(
+    symbols: List[str],
+    limit: int = MARKET_STACK_MAX_PAGE_LIMIT,
+    watermarks: Optional[Dict[str, datetime]] = None,
+    today: Optional[datetime] = None,
+) -> int:
+    """
+    :return: Estimated number of pages, each one API call, iter_stock_data_market_stack requests for the symbols
+    """
 
-    if response.status_code == 200:
-        content = json.loads(response.content)
+    watermarks = watermarks or {}
+    today = today or datetime.utcnow()
 
-        try:
-            stock_data = content["data"]
+    if symbols and all(symbol in watermarks for symbol in symbols):
+        days = max(1, (today - min(watermarks[symbol] for symbol in symbols)).days + 1)
+    else:
+        days = MARKET_STACK_DEFAULT_HISTORY_DAYS
+
+    # There are end-of-day bars for the trading days only, about 5 of every 7 days
+    rows = len(symbols) * math.ceil(days * 5 / 7)
 
-            # Transformation
+    return max(1, math.ceil(rows / limit))
 
-            formatted_stock_data = []
 
-            relevant_columns = {"symbol", "datetime", "open", "high", "low", "close", "volume"}
+def estimate_exchange_rate_calls(currencies: Optional[List[str]], verify: bool) -> int:
+    """
+    :return: Number of API calls get_exchange_rates makes, one for the snapshot and one per currency when verifying
+    """
 
-            for stock_data_point in stock_data:
-                stock_data_point['datetime'] = datetime.strptime(stock_data_point['date'], "%Y-%m-%dT%H:%M:%S%z")
+    if not verify:
+        return 1
 
-                if stock_data_point["volume"]:
-                    stock_data_point["volume"] = int(stock_data_point["volume"])
-                else:
-                    stock_data_point["volume"] = None
+    return 1 + (len(set(currencies)) if currencies is not None else EXCHANGE_RATE_API_CURRENCY_COUNT)
 
-                formatted_stock_data_point = {
-                    key: value for key, value in stock_data_point.items() if key in relevant_columns
-                }
 
-                formatted_stock_data.append(formatted_stock_data_point)
+def chunk_symbols(symbols: List[str], batch_size: int = MARKET_STACK_MAX_SYMBOLS_PER_REQUEST) -> List[List[str]]:
+    """
+    :param symbols: The symbols you would like to request e.g. all the symbols in my_stocks.json
+    :param batch_size: Maximum number of symbols per request
+    :return: The symbols without duplicates split into request-sized chunks
+    """
+
+    unique_symbols = list(dict.fromkeys(symbols))
+
+    return [unique_symbols[i : i + batch_size] for i in range(0, len(unique_symbols), batch_size)]
+
+
+def iter_stock_data_market_stack(
+    symbols: List[str],
+    limit: int = MARKET_STACK_MAX_PAGE_LIMIT,
+    max_pages: Optional[int] = None,
+    watermarks: Optional[Dict[str, datetime]] = None,
+) -> Iterator[Dict[str, List[Dict[str, Any]]]]:
+    """
+    :param symbols: Up to 100 symbols you would like to get information for with a single request e.g. ["AAPL", "TSLA"]
+    :param limit: Number of results per page, at most 1000
+    :param max_pages: Stop after this many pages, by default pagination is followed until the last page
+    :param watermarks: Latest datetime (in UTC) already stored for each symbol. When every symbol has a watermark
+    only data from the oldest of them onwards is requested, and data points older than the watermark of their own
+    symbol are dropped before they are transformed
+    :return: Iterator which yields one dictionary per page as soon as the page has arrived. Each dictionary maps a
+    symbol to the list of its stock data points on that page
+
+    For more info about MarketData API: https://marketstack.com/documentation
+    Max of 1000 monthly API calls per month on free version, each page costs one API call.
+    """
+
+    api_key = get_api_key("Marketstack_api_key")
+
+    url = "http://api.marketstack.com/v1/eod"
 
-            return formatted_stock_data
+    watermarks = watermarks or {}
 
+    # The dates in the response are in UTC e.g. 2024-01-12T00:00:00+0000, so their first 19 characters can be
+    # compared with the watermarks as strings without parsing them first
+    watermark_strings = {symbol: watermark.strftime("%Y-%m-%dT%H:%M:%S") for symbol, watermark in watermarks.items()}
+
+    offset = 0
+    pages = 0
+
+    while max_pages is None or pages < max_pages:
+        params = {"access_key": api_key, "symbols": ",".join(symbols), "limit": limit, "offset": offset}
+
+        if symbols and all(symbol in watermarks for symbol in symbols):
+            params["date_from"] = min(watermarks[symbol] for symbol in symbols).strftime("%Y-%m-%d")
+
+        try:
+            response = http_get("marketstack", url, params=params)
+        except requests.RequestException as ce:
+            logging.error(f"There was an error with the request: {ce}")
+            sys.exit(1)
+
+        if response.status_code != 200:
+            logging.error(f"Response had the following status code: {response.status_code}")
+            sys.exit(1)
+
+        content = json.loads(response.content)
+
+        try:
+            stock_data = content["data"]
         except KeyError:
             logging.error("'data' field is not present in content")
             sys.exit(1)
 
-    else:
-        logging.error(f"Response had the following status code: {response.status_code}")
-        sys.exit(1)
+        # Transformation
 
+        new_stock_data = [
+            stock_data_point
+            for stock_data_point in stock_data
+            if stock_data_point["date"][:19] >= watermark_strings.get(stock_data_point["symbol"], "")
+        ]
 
-def get_stock_data_alpha_vantage(symbol: str) -> List[Dict[str, Any]]:
+        stock_data_frame = market_stack_frame(new_stock_data)
+
+        yield {
+            symbol: frame_to_records(symbol_frame)
+            for symbol, symbol_frame in stock_data_frame.groupby("symbol", sort=False)
+        }
+
+        pages += 1
+
+        pagination = content.get("pagination", {})
+        offset += pagination.get("count", len(stock_data))
+
+        if not stock_data or offset >= pagination.get("total", 0):
+            break
+
+
+def get_stock_data_market_stack(symbol: str = "AAPL") -> List[Dict[str, Any]]:
     """
     :param symbol: The company or index you would like to get information from AlphaAvantage API e.g. TSLA
     :return: List of dictionaries where each dictionary contains stock data information for the symbol at a particular time point
 
-    For more info about AlphaVantage API: https://www.alphavantage.co/documentation/
+    For more info about MarketData API: https://marketstack.com/documentation
+    Max of 1000 monthly API calls per month on free version.
     """
 
-    config = configparser.ConfigParser()
-    config.read("configs/api_keys.ini")
+    formatted_stock_data = []
+
+    for stock_data_by_symbol in iter_stock_data_market_stack([symbol]):
+        formatted_stock_data.extend(stock_data_by_symbol.get(symbol, []))
+
+    return formatted_stock_data
 
-    api_key = config.get("api_keys", "AlphaAvantage_api_key")
 
-    url = f"https://www.alphavantage.co/query?function=TIME_SERIES_INTRADAY&symbol={symbol}&interval=60min&apikey={api_key}"
+def iter_stock_data_alpha_vantage(
+    symbol: str, batch_size: int = DEFAULT_EXTRACT_BATCH_SIZE
+) -> Iterator[List[Dict[str, Any]]]:
+    """
+    :param symbol: The company or index you would like to get information from AlphaAvantage API e.g. TSLA
+    :param batch_size: Maximum number of stock data points per yielded batch
+    :return: Iterator of batches, each batch is a list of dictionaries where each dictionary contains stock data
+    information for the symbol at a particular time point. Only one batch is transformed at a time
+
+    For more info about AlphaVantage API: https://www.alphavantage.co/documentation/
+    """
+
+    api_key = get_api_key("AlphaAvantage_api_key")
+
+    url = "https://www.alphavantage.co/query"
+    params = {"function": "TIME_SERIES_INTRADAY", "symbol": symbol, "interval": "60min", "apikey": api_key}
 
     try:
-        response = requests.get(url)
-    except requests.ConnectionError as ce:
+        response = http_get("alphavantage", url, params=params)
+    except requests.RequestException as ce:
         logging.error(f"There was an error with the request: {ce}")
         sys.exit(1)
 
     if response.status_code == 200:
         data = response.json()
 
-        print(data)
-        print("\n\n")
-
         try:
             price_data = data['Time Series (60min)']
+        except KeyError:
+            logging.error("Time Series (60min) field is not present in content")
+            sys.exit(1)
 
-            # Transformations
-            # TODO: Move the transform functionality into a separate function
-
-            price_data = {
-                datetime.strptime(date, "%Y-%m-%d %H:%M:%S"): attributes for date, attributes in price_data.items()
-            }
+        # Transformations
 
-            column_renamings = {
-                '1. open': 'open',
-                '2. high': 'high',
-                '3. low': 'low',
-                '4. close': 'close',
-                '5. volume': 'volume',
-            }
+        price_data_frame = alpha_vantage_frame(price_data, symbol)
 
-            formatted_price_data = []
+        for start in range(0, len(price_data_frame), batch_size):
+            yield frame_to_records(price_data_frame.iloc[start : start + batch_size])
 
-            for date, attributes in price_data.items():
-                attributes = {column_renamings[key]: float(value) for key, value in attributes.items()}
-                attributes["volume"] = int(attributes["volume"])
+    else:
+        logging.error(f"Response had the following status code: {response.status_code}")
+        sys.exit(1)
 
-                attributes.update({"datetime": date, "symbol": symbol})
-                formatted_price_data.append(attributes)
 
-            return formatted_price_data
+def get_stock_data_alpha_vantage(symbol: str) -> List[Dict[str, Any]]:
+    """
+    :param symbol: The company or index you would like to get information from AlphaAvantage API e.g. TSLA
+    :return: List of dictionaries where each dictionary contains stock data information for the symbol at a particular time point
 
-        except KeyError:
-            logging.error("Time Series (60min) field is not present in content")
-            sys.exit(1)
+    For more info about AlphaVantage API: https://www.alphavantage.co/documentation/
+    """
 
-    else:
-        logging.error(f"Response had the following status code: {response.status_code}")
-        sys.exit(1)
+    return list(chain.from_iterable(iter_stock_data_alpha_vantage(symbol)))
 
 
 def get_fake_stock_data():
@@ -200,16 +316,15 @@ def get_newsapi_news(country: str = "us", category: str = "general") -> List[Dic
     For more info about NewsAPI documentation: https://newsapi.org/docs and https://newsapi.org/docs/endpoints/top-headlines
     """
 
-    config = configparser.ConfigParser()
-    config.read("configs/api_keys.ini")
-
-    api_key = config.get("api_keys", "NewsAPI_api_key")
+    api_key = get_api_key("NewsAPI_api_key")
 
-    newsapi = NewsApiClient(api_key=api_key)
+    newsapi = NewsApiClient(api_key=api_key, session=get_session("newsapi"))
 
     try:
+        # The client sends the request itself, so it is charged to the budget here
+        get_rate_limiter().acquire("newsapi")
         response = newsapi.get_top_headlines(country=country, category=category)
-    except ValueError as ve:
+    except (ValueError, requests.RequestException) as ve:
         logging.error(f"Request failed due to {ve}")
         sys.exit(1)
 
@@ -242,26 +357,28 @@ def get_newsapi_news(country: str = "us", category: str = "general") -> List[Dic
         sys.exit(1)
 
 
-def get_newsdataio_news(country: str = "de", category: str = "top") -> List[Dict[str, Any]]:
+def iter_newsdataio_news(
+    country: str = "de", category: str = "top", batch_size: int = DEFAULT_EXTRACT_BATCH_SIZE
+) -> Iterator[List[Dict[str, Any]]]:
     """
     :param country: The country you would like to receive news information about. Default is Germany. This API returns good results for UK (gb), Germany (de), United States (us), India (in)
     :param category: The category of news that you would be interested in e.g. business, domestic, sports, technology
+    :param batch_size: Maximum number of articles per yielded batch
 
-    :return: List of dictionaries containing the relevant news articles from NewsDataIO
+    :return: Iterator of batches, each batch is a list of dictionaries containing the relevant news articles from
+    NewsDataIO
 
     For more documentation: https://newsdata.io/documentation/#latest-news
     """
 
-    config = configparser.ConfigParser()
-    config.read("configs/api_keys.ini")
-
-    api_key = config.get("api_keys", "NewsDataIO_api_key")
+    api_key = get_api_key("NewsDataIO_api_key")
 
-    url = f"https://newsdata.io/api/1/news?apikey={api_key}&country={country}&prioritydomain=top&category={category}"
+    url = "https://newsdata.io/api/1/news"
+    params = {"apikey": api_key, "country": country, "prioritydomain": "top", "category": category}
 
     try:
-        response = requests.get(url)
-    except requests.ConnectionError as ce:
+        response = http_get("newsdataio", url, params=params)
+    except requests.RequestException as ce:
         logging.error(f"There was an error with the request: {ce}")
         sys.exit(1)
 
@@ -270,38 +387,33 @@ def get_newsdataio_news(country: str = "de", category: str = "top") -> List[Dict
 
         try:
             articles = data['results']
+        except KeyError:
+            logging.error("No 'results' field")
+            sys.exit(1)
 
-            # Transformations
-
-            column_renamings = {
-                "pubDate": "published_date",
-                "source_id": "source_name",
-                "creator": "author",
-                "link": "url",
-            }
+        # Transformations
 
-            relevant_columns = {"title", "description", "source_name", "author", "url", "published_date"}
+        articles_frame = newsdataio_frame(articles, country)
 
-            formatted_articles = []
+        for start in range(0, len(articles_frame), batch_size):
+            yield frame_to_records(articles_frame.iloc[start : start + batch_size])
 
-            for article in articles:
-                article = {column_renamings.get(key, key): value for key, value in article.items()}
+    else:
+        logging.error(f"Response for {country} had the following status code: {response.status_code}")
+        sys.exit(1)
 
-                article['published_date'] = datetime.strptime(article['published_date'], "%Y-%m-%d %H:%M:%S")
 
-                formatted_article = {key: value for key, value in article.items() if key in relevant_columns}
-                formatted_article['country'] = country
-                formatted_articles.append(formatted_article)
+def get_newsdataio_news(country: str = "de", category: str = "top") -> List[Dict[str, Any]]:
+    """
+    :param country: The country you would like to receive news information about. Default is Germany. This API returns good results for UK (gb), Germany (de), United States (us), India (in)
+    :param category: The category of news that you would be interested in e.g. business, domestic, sports, technology
 
-            return formatted_articles
+    :return: List of dictionaries containing the relevant news articles from NewsDataIO
 
-        except KeyError:
-            logging.error("No 'results' field")
-            sys.exit(1)
+    For more documentation: https://newsdata.io/documentation/#latest-news
+    """
 
-    else:
-        logging.error(f"Response for {country} had the following status code: {response.status_code}")
-        sys.exit(1)
+    return list(chain.from_iterable(iter_newsdataio_news(country, category)))
 
 
 def get_crypto_exchange_data() -> List[Dict[str, Any]]:
@@ -311,63 +423,94 @@ def get_crypto_exchange_data() -> List[Dict[str, Any]]:
 
     url = 'https://api.coincap.io/v2/exchanges'
     try:
-        response = requests.get(url)
-    except requests.ConnectionError as ce:
+        response = http_get("coincap", url)
+    except requests.RequestException as ce:
         logging.error(f"There was an error with the request, {ce}")
         sys.exit(1)
     return response.json().get('data', [])
 
 
-def get_exchange_rates(currencies: List[str] = ["USD", "EUR", "GBP", "INR"]) -> List[Dict[str, Any]]:
+def get_exchange_rate_snapshot(base_currency: str = "USD") -> Tuple[Dict[str, float], datetime]:
     """
-    :param currencies: List of currencies which you want currency exchange info e.g. ["USD", "EUR", "GBP", "INR"]
-    :return: List of dictionaries containing currency exchange info
+    :param base_currency: The currency all the rates are quoted against e.g. USD
+    :return: Tuple of (dictionary mapping every currency to its units per 1 unit of the base currency, time of the
+    last update of the rates)
     """
 
-    config = configparser.ConfigParser()
-    config.read("configs/api_keys.ini")
-
-    api_key = config.get("api_keys", "ExchangeRateAPI_api_key")
+    api_key = get_api_key("ExchangeRateAPI_api_key")
 
-    exchange_rates = []
+    url = f"https://v6.exchangerate-api.com/v6/{api_key}/latest/{base_currency}"
 
-    currencies = set(currencies)
+    try:
+        response = http_get("exchangerate", url, secrets=[api_key])
+    except requests.RequestException as ce:
+        logging.error(f"There was an error with the request: {ce}")
+        sys.exit(1)
 
-    for first_currency in currencies:
-        url = f"https://v6.exchangerate-api.com/v6/{api_key}/latest/{first_currency}"
+    if response.status_code == 200:
+        data = json.loads(response.content)
 
         try:
-            response = requests.get(url)
-        except requests.ConnectionError as ce:
-            logging.error(f"There was an error with the request: {ce}")
+            conversion_rates = {currency: float(value) for currency, value in data['conversion_rates'].items()}
+
+            return conversion_rates, datetime.strptime(data['time_last_update_utc'], "%a, %d %b %Y %H:%M:%S %z")
+
+        except KeyError:
+            logging.error("No 'conversion_rates' field")
             sys.exit(1)
 
-        if response.status_code == 200:
-            data = json.loads(response.content)
+    else:
+        logging.error(f"Response had the following status code: {response.status_code}")
+        sys.exit(1)
+
 
-            try:
-                conversion_rates = data['conversion_rates']
+def get_exchange_rates(
+    currencies: Optional[List[str]] = ["USD", "EUR", "GBP", "INR"],
+    base_currency: str = "USD",
+    verify: bool = False,
+    tolerance: float = 1e-3,
+) -> List[Dict[str, Any]]:
+    """
+    :param currencies: List of currencies which you want currency exchange info e.g. ["USD", "EUR", "GBP", "INR"].
+    None returns the exchange rates between every currency the API knows
+    :param base_currency: The currency of the single snapshot all the cross rates are triangulated from
+    :param verify: Additionally request a direct quote for every currency and log the cross rates which differ from
+    it by more than the relative tolerance. Costs one extra API call per currency
+    :param tolerance: Maximum relative difference between a cross rate and the direct quote when verify is set
+    :return: List of dictionaries containing currency exchange info for every pair of different currencies
+
+    Only one API call is needed regardless of the number of currencies, since every cross rate can be computed
+    from the rates against the base currency.
+    """
 
-                for second_currency, value in conversion_rates.items():
-                    if first_currency != second_currency and second_currency in currencies:
-                        exchange_rates.append(
-                            {
-                                "first_currency": first_currency,
-                                "second_currency": second_currency,
-                                "exchange_rate": float(value),
-                                "datetime": datetime.strptime(data['time_last_update_utc'], "%a, %d %b %Y %H:%M:%S %z"),
-                            }
-                        )
+    base_rates, last_update = get_exchange_rate_snapshot(base_currency)
 
-            except KeyError:
-                logging.error("No 'conversion_rates' field")
-                sys.exit(1)
+    if currencies is None:
+        currencies = sorted(base_rates)
 
-        else:
-            logging.error(f"Response had the following status code: {response.status_code}")
-            sys.exit(1)
+    currencies = list(dict.fromkeys(currencies))
 
-    return exchange_rates
+    missing_currencies = [currency for currency in currencies if currency not in base_rates]
+
+    if missing_currencies:
+        logging.error(f"No exchange rates for {missing_currencies}")
+        currencies = [currency for currency in currencies if currency in base_rates]
+
+    matrix = cross_rate_matrix(np.array([base_rates[currency] for currency in currencies]))
+
+    if verify:
+        for currency in currencies:
+            direct_rates, _ = get_exchange_rate_snapshot(currency)
+
+            for second_currency, relative_difference in cross_rate_discrepancies(
+                currencies, matrix, currency, direct_rates, tolerance
+            ).items():
+                logging.warning(
+                    f"Triangulated {currency}/{second_currency} differs from the direct quote "
+                    f"by {relative_difference:.2%}"
+                )
+
+    return cross_rate_records(currencies, matrix, last_update)
 
 
 def get_weather_data(city: str = "Munich") -> Dict[str, Any]:
@@ -376,15 +519,12 @@ def get_weather_data(city: str = "Munich") -> Dict[str, Any]:
     :return: Dictionary containing weather info for the particular city
     """
 
-    config = configparser.ConfigParser()
-    config.read("configs/api_keys.ini")
-
-    api_key = config.get("api_keys", "WeatherAPI_api_key")
-    url = f"http://api.weatherapi.com/v1/current.json?key={api_key}&q={city}"
+    api_key = get_api_key("WeatherAPI_api_key")
+    url = "http://api.weatherapi.com/v1/current.json"
 
     try:
-        response = requests.get(url)
-    except requests.ConnectionError as ce:
+        response = http_get("weatherapi", url, params={"key": api_key, "q": city})
+    except requests.RequestException as ce:
         logging.error(f"There was an error with the request: {ce}")
         sys.exit(1)
 
@@ -407,7 +547,7 @@ def get_weather_data(city: str = "Munich") -> Dict[str, Any]:
             return weather_data
 
         except KeyError as ke:
-            logging.error("Missing mandatory field: {ke}")
+            logging.error(f"Missing mandatory field: {ke}")
             sys.exit(1)
 
     else:
@@ -415,6 +555,88 @@ def get_weather_data(city: str = "Munich") -> Dict[str, Any]:
         sys.exit(1)
 
 
+def get_hourly_weather_data(city: str, days: int = 1, history_date: Optional[str] = None) -> List[Dict[str, Any]]:
+    """
+    :param city: The city you would like to receive weather data for
+    :param days: Number of days of forecast, starting today
+    :param history_date: Instead of the forecast, get the weather of this past date e.g. 2024-01-16
+    :return: List of dictionaries containing the weather info for every hour, all from a single request
+    """
+
+    api_key = get_api_key("WeatherAPI_api_key")
+
+    if history_date is None:
+        url = "http://api.weatherapi.com/v1/forecast.json"
+        params = {"key": api_key, "q": city, "days": days}
+    else:
+        url = "http://api.weatherapi.com/v1/history.json"
+        params = {"key": api_key, "q": city, "dt": history_date}
+
+    try:
+        response = http_get("weatherapi", url, params=params)
+    except requests.RequestException as ce:
+        logging.error(f"There was an error with the request: {ce}")
+        sys.exit(1)
+
+    if response.status_code == 200:
+        data = json.loads(response.content)
+
+        try:
+            return [
+                {
+                    "city": data["location"]["name"],
+                    "country": data["location"]["country"],
+                    "condition": hour["condition"]["text"],
+                    "temp_celsius": hour["temp_c"],
+                    "temp_feels_like_celsius": hour["feelslike_c"],
+                    "wind_kph": hour["wind_kph"],
+                    "humidity": hour["humidity"],
+                    "datetime": hour["time"],
+                }
+                for forecast_day in data["forecast"]["forecastday"]
+                for hour in forecast_day["hour"]
+            ]
+
+        except KeyError as ke:
+            logging.error(f"Missing mandatory field: {ke}")
+            sys.exit(1)
+
+    else:
+        logging.error(f"Response had the following status code: {response.status_code}")
+        sys.exit(1)
+
+
+def get_weather_tasks(
+    cities: List[str],
+    mode: str = "current",
+    days: int = 1,
+    history_date: Optional[str] = None,
+    load: Optional[Callable[..., None]] = None,
+) -> List[ExtractionTask]:
+    """
+    :param cities: The cities you would like to receive weather data for, duplicates are only requested once
+    :param mode: current for the current conditions, hourly for the hourly forecast or history of every city
+    :param days: Number of days of forecast in hourly mode
+    :param history_date: Past date to get the hourly history for in hourly mode e.g. 2024-01-16
+    :param load: Load function of the tasks, receives the weather info of one city
+    :return: One extraction task per city. Run them with the other fetches, so the cities are fetched concurrently
+    within the concurrency limit and rate limit of WeatherAPI
+    """
+
+    unique_cities = list({city.strip().lower(): city.strip() for city in cities}.values())
+
+    if mode == "current":
+        return [ExtractionTask("weatherapi", get_weather_data, (city,), load=load) for city in unique_cities]
+
+    if mode == "hourly":
+        return [
+            ExtractionTask("weatherapi", get_hourly_weather_data, (city, days, history_date), load=load)
+            for city in unique_cities
+        ]
+
+    raise ValueError(f"Unknown weather mode {mode}, expected current or hourly")
+
+
 if __name__ == "__main__":
     # print(get_stock_data_alpha_vantage("AAPL"))
     # print(get_newsapi_news("in"))
@@ -0,0 +1,220 @@
+import logging
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from pipeline_config import load_pipeline_config
+from rate_limiter import RateLimiter, get_rate_limiter
+from stage_timeline import StageTimeline
+from timer_decorator_wrapper import timer_decorator
+
+# Maximum number of requests that are in flight at the same time for each provider.
+# Can be overridden in the [concurrency] section of configs/pipeline.ini
+DEFAULT_CONCURRENCY_LIMITS = {
+    "marketstack": 4,
+    "alphavantage": 1,
+    "newsapi": 2,
+    "newsdataio": 2,
+    "coincap": 2,
+    "exchangerate": 2,
+    "weatherapi": 8,
+}
+
+# Maximum number of extracted results waiting to be loaded, can be overridden with queue_size in the [pipeline] section.
+# Once the queue is full the extractors wait, so memory stays bounded when the loaders fall behind
+DEFAULT_QUEUE_SIZE = 16
+
+# Marks the end of a task in the results queue
+_TASK_FINISHED = object()
+
+
+@dataclass
+class ExtractionTask:
+    provider: str
+    extract: Callable[..., Any]
+    args: Tuple[Any, ...] = ()
+    kwargs: Dict[str, Any] = field(default_factory=dict)
+    load: Optional[Callable[..., None]] = None
+    # The extractor returns an iterator and every item it yields is handed to the loader separately
+    stream: bool = False
+    # Estimated number of API calls, used to check the task against the remaining budget of its provider
+    cost: int = 1
+    # Tasks with a higher priority are started first and get the remaining budget first
+    priority: int = 0
+    # Called with the database engine once the extraction and every load of the task succeeded, see LoadPipeline
+    finish: Optional[Callable[..., None]] = None
+
+    @property
+    def name(self) -> str:
+        arguments = [repr(arg) for arg in self.args] + [f"{key}={value!r}" for key, value in self.kwargs.items()]
+        return f"{self.extract.__name__}({', '.join(arguments)})"
+
+
+def load_concurrency_limits() -> Dict[str, int]:
+    """
+    :return: Dictionary mapping each provider to the maximum number of concurrent requests it should receive
+    """
+
+    config = load_pipeline_config()
+
+    limits = dict(DEFAULT_CONCURRENCY_LIMITS)
+
+    if config.has_section("concurrency"):
+        for provider, limit in config.items("concurrency"):
+            limits[provider] = int(limit)
+
+    return limits
+
+
+class ExtractionEngine:
+    """
+    Runs independent extraction tasks concurrently and hands back each result as soon as its task has finished.
+
+    Every provider gets its own bounded thread pool, so a slow or rate limited provider can only ever occupy its
+    own workers and never holds up the fetches of the other providers.
+    """
+
+    def __init__(
+        self,
+        concurrency_limits: Optional[Dict[str, int]] = None,
+        rate_limiter: Optional[RateLimiter] = None,
+        queue_size: Optional[int] = None,
+        timeline: Optional[StageTimeline] = None,
+    ):
+        """
+        :param queue_size: Maximum number of results waiting to be consumed, see DEFAULT_QUEUE_SIZE
+        :param timeline: Records when the extractors are busy, see StageTimeline
+        """
+
+        self.concurrency_limits = concurrency_limits if concurrency_limits is not None else load_concurrency_limits()
+        self.rate_limiter = rate_limiter if rate_limiter is not None else get_rate_limiter()
+        self.queue_size = (
+            queue_size
+            if queue_size is not None
+            else load_pipeline_config().getint("pipeline", "queue_size", fallback=DEFAULT_QUEUE_SIZE)
+        )
+        self.timeline = timeline if timeline is not None else StageTimeline()
+        self.failures: List[Tuple[ExtractionTask, BaseException]] = []
+        self.skipped: List[ExtractionTask] = []
+
+    def _get_limit(self, provider: str) -> int:
+        return max(1, self.concurrency_limits.get(provider, 1))
+
+    def schedule(self, tasks: Iterable[ExtractionTask]) -> List[ExtractionTask]:
+        """
+        :param tasks: The extraction tasks to run
+        :return: The tasks that fit into the remaining budgets of their providers, ordered by priority
+
+        Tasks are run in priority order, so lower priority fetches are deferred behind the more important ones of
+        the same provider and are additionally held back by the per-second rate limit. Tasks whose provider does
+        not have enough calls left in its daily or monthly budget are skipped and recorded in self.skipped.
+        """
+
+        budgets: Dict[str, Optional[int]] = {}
+        scheduled = []
+
+        for task in sorted(tasks, key=lambda task: task.priority, reverse=True):
+            if task.provider not in budgets:
+                budgets[task.provider] = self.rate_limiter.remaining(task.provider)
+
+            budget = budgets[task.provider]
+
+            if budget is not None:
+                if budget < task.cost:
+                    logging.warning(f"Skipping {task.name}, only {budget} calls are left for {task.provider}")
+                    self.skipped.append(task)
+                    continue
+
+                budgets[task.provider] = budget - task.cost
+
+            scheduled.append(task)
+
+        return scheduled
+
+    def _put(self, results: queue.Queue, item: Tuple[ExtractionTask, Any, Optional[BaseException]]) -> bool:
+        """
+        Wait for room in the bounded results queue, gives up and returns False once the consumer has stopped
+        """
+
+        while not self._stopped.is_set():
+            try:
+                results.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+
+        return False
+
+    def _run_task(self, task: ExtractionTask, results: queue.Queue):
+        error = None
+
+        try:
+            with self.timeline.measure("extract"):
+                result = timer_decorator(task.extract)(*task.args, **task.kwargs)
+
+            if task.stream:
+                items = iter(result)
+
+                while True:
+                    # Only the time spent producing an item counts, not the time spent waiting for room in the queue
+                    with self.timeline.measure("extract"):
+                        item = next(items, _TASK_FINISHED)
+
+                    if item is _TASK_FINISHED or not self._put(results, (task, item, None)):
+                        break
+            else:
+                self._put(results, (task, result, None))
+
+        # The extractors call sys.exit(1) on failure, which would otherwise stop every other fetch
+        except (Exception, SystemExit) as e:
+            error = e
+
+        self._put(results, (task, _TASK_FINISHED, error))
+
+    def run(self, tasks: Iterable[ExtractionTask]) -> Iterator[Tuple[ExtractionTask, Any]]:
+        """
+        :param tasks: The extraction tasks to run
+        :return: Iterator of (task, result) tuples in the order in which the results arrive. Streaming tasks
+        produce one tuple for every item their extractor yields e.g. for every page
+
+        Failed tasks are logged and recorded in self.failures instead of stopping the remaining tasks. The results are
+        passed through a queue of queue_size entries, so the extractors pause while the consumer is behind.
+        """
+
+        self._stopped = threading.Event()
+
+        executors: Dict[str, ThreadPoolExecutor] = {}
+        results: queue.Queue = queue.Queue(maxsize=self.queue_size)
+        pending = 0
+
+        for task in self.schedule(tasks):
+            if task.provider not in executors:
+                executors[task.provider] = ThreadPoolExecutor(
+                    max_workers=self._get_limit(task.provider), thread_name_prefix=task.provider
+                )
+
+            executors[task.provider].submit(self._run_task, task, results)
+            pending += 1
+
+        try:
+            while pending:
+                task, result, error = results.get()
+
+                if result is not _TASK_FINISHED:
+                    yield task, result
+                    continue
+
+                pending -= 1
+
+                if error is not None:
+                    logging.error(f"Extraction {task.name} for {task.provider} failed: {error!r}")
+                    self.failures.append((task, error))
+
+        finally:
+            # Unblocks the extractors that still wait for room in the queue if the consumer stopped early
+            self._stopped.set()
+
+            for executor in executors.values():
+                executor.shutdown(wait=True, cancel_futures=True)
@@ -0,0 +1,291 @@
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, Dict, Iterable, Optional
+
+import requests
+from pipeline_config import load_pipeline_config
+from requests.structures import CaseInsensitiveDict
+
+# off: always use the network, readwrite: serve fresh entries from disk and store new responses,
+# only: never touch the network and fail on a cache miss e.g. for development runs and tests
+CACHE_MODES = ("off", "readwrite", "only")
+
+DEFAULT_CACHE_MODE = "readwrite"
+
+DEFAULT_CACHE_DIRECTORY = "cache/http"
+DEFAULT_MAX_SIZE_MB = 256
+
+# How long (in seconds) a response of each provider is considered fresh, can be overridden in [http_cache.ttl]
+DEFAULT_TTLS = {
+    "marketstack": 12 * 60 * 60,
+    "alphavantage": 60 * 60,
+    "newsapi": 60 * 60,
+    "newsdataio": 60 * 60,
+    "coincap": 5 * 60,
+    "exchangerate": 12 * 60 * 60,
+    "weatherapi": 15 * 60,
+}
+DEFAULT_TTL = 60 * 60
+
+# Query parameters holding API keys, these never become part of a cache key
+SECRET_PARAMS = {"access_key", "apikey", "apiKey", "key"}
+
+# Response headers that are kept with a cached body
+STORED_HEADERS = ("Content-Type", "ETag", "Last-Modified")
+
+
+def _atomic_write(path: str, content: bytes):
+    # Write to a temporary file first so that concurrent readers never see a partially written file
+    temporary_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+
+    with open(temporary_path, "wb") as file:
+        file.write(content)
+
+    os.replace(temporary_path, path)
+
+
+class CacheMissError(requests.ConnectionError):
+    """Raised in cache-only mode when a request is not in the cache"""
+
+
+@dataclass
+class CacheEntry:
+    meta: Dict[str, Any]
+    body: bytes
+
+    def age(self) -> float:
+        return time.time() - self.meta["stored_at"]
+
+    def conditional_headers(self) -> Dict[str, str]:
+        """
+        :return: The If-None-Match / If-Modified-Since headers to revalidate this entry, if the provider sent validators
+        """
+
+        headers = {}
+
+        if self.meta["headers"].get("ETag"):
+            headers["If-None-Match"] = self.meta["headers"]["ETag"]
+
+        if self.meta["headers"].get("Last-Modified"):
+            headers["If-Modified-Since"] = self.meta["headers"]["Last-Modified"]
+
+        return headers
+
+    def to_response(self) -> requests.Response:
+        response = requests.Response()
+        response.status_code = self.meta["status_code"]
+        response._content = self.body
+        response.headers = CaseInsensitiveDict(self.meta["headers"])
+        response.encoding = self.meta.get("encoding")
+        response.url = self.meta["url"]
+
+        return response
+
+
+class ResponseCache:
+    """
+    On-disk cache of HTTP responses, keyed by provider, endpoint and query parameters without the API key.
+
+    Every entry is stored as a body file next to a small json file with its metadata. The modification time of the
+    metadata file is bumped on every hit and the least recently used entries are evicted once the cache is larger
+    than max_size_bytes.
+    """
+
+    def __init__(
+        self,
+        directory: str = DEFAULT_CACHE_DIRECTORY,
+        mode: str = DEFAULT_CACHE_MODE,
+        max_size_bytes: int = DEFAULT_MAX_SIZE_MB * 1024 * 1024,
+        ttls: Optional[Dict[str, int]] = None,
+    ):
+        if mode not in CACHE_MODES:
+            raise ValueError(f"Unknown cache mode {mode}, expected one of {CACHE_MODES}")
+
+        self.directory = directory
+        self.mode = mode
+        self.max_size_bytes = max_size_bytes
+        self.ttls = ttls if ttls is not None else dict(DEFAULT_TTLS)
+
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def describe_request(
+        provider: str, url: str, params: Optional[Dict[str, Any]] = None, secrets: Iterable[str] = ()
+    ) -> str:
+        """
+        :return: Provider, url and sorted query parameters of a request with every API key removed
+        """
+
+        for secret in secrets:
+            url = url.replace(secret, "***")
+
+        public_params = sorted((key, str(value)) for key, value in (params or {}).items() if key not in SECRET_PARAMS)
+
+        query = "&".join(f"{key}={value}" for key, value in public_params)
+
+        return f"{provider} {url}?{query}"
+
+    def make_key(
+        self, provider: str, url: str, params: Optional[Dict[str, Any]] = None, secrets: Iterable[str] = ()
+    ) -> str:
+        description = self.describe_request(provider, url, params, secrets)
+
+        return hashlib.sha256(description.encode("utf-8")).hexdigest()
+
+    def get_ttl(self, provider: str) -> int:
+        return self.ttls.get(provider, DEFAULT_TTL)
+
+    def _paths(self, key: str):
+        return os.path.join(self.directory, f"{key}.json"), os.path.join(self.directory, f"{key}.body")
+
+    def lookup(self, key: str) -> Optional[CacheEntry]:
+        meta_path, body_path = self._paths(key)
+
+        try:
+            with open(meta_path, "r") as file:
+                meta = json.load(file)
+
+            with open(body_path, "rb") as file:
+                body = file.read()
+
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+
+        # Mark the entry as recently used for the LRU eviction
+        os.utime(meta_path)
+
+        return CacheEntry(meta=meta, body=body)
+
+    def store(self, key: str, description: str, response: requests.Response) -> CacheEntry:
+        meta = {
+            "url": description,
+            "status_code": response.status_code,
+            "headers": {header: response.headers[header] for header in STORED_HEADERS if header in response.headers},
+            "encoding": response.encoding,
+            "stored_at": time.time(),
+        }
+
+        os.makedirs(self.directory, exist_ok=True)
+
+        meta_path, body_path = self._paths(key)
+
+        _atomic_write(body_path, response.content)
+        _atomic_write(meta_path, json.dumps(meta).encode("utf-8"))
+
+        self.evict()
+
+        return CacheEntry(meta=meta, body=response.content)
+
+    def refresh(self, key: str, entry: CacheEntry):
+        """
+        Restart the time to live of an entry after the provider confirmed it is still valid (304 Not Modified)
+        """
+
+        entry.meta["stored_at"] = time.time()
+
+        meta_path, _ = self._paths(key)
+
+        _atomic_write(meta_path, json.dumps(entry.meta).encode("utf-8"))
+
+    def evict(self):
+        """
+        Remove the least recently used entries until the cache fits into max_size_bytes
+        """
+
+        with self._lock:
+            entries = []
+            total_size = 0
+
+            for file_name in os.listdir(self.directory):
+                if not file_name.endswith(".json"):
+                    continue
+
+                meta_path, body_path = self._paths(file_name[: -len(".json")])
+
+                try:
+                    size = os.path.getsize(meta_path) + os.path.getsize(body_path)
+                    last_used = os.path.getmtime(meta_path)
+                except FileNotFoundError:
+                    continue
+
+                entries.append((last_used, size, meta_path, body_path))
+                total_size += size
+
+            for last_used, size, meta_path, body_path in sorted(entries):
+                if total_size <= self.max_size_bytes:
+                    break
+
+                for path in (meta_path, body_path):
+                    try:
+                        os.remove(path)
+                    except FileNotFoundError:
+                        pass
+
+                total_size -= size
+
+    def get(self, provider: str, url: str, params: Optional[Dict[str, Any]], secrets: Iterable[str], fetch):
+        """
+        :param fetch: Function which takes additional request headers and sends the request over the network
+        :return: A fresh cached response, or the network response which is then stored in the cache
+        """
+
+        key = self.make_key(provider, url, params, secrets)
+        entry = self.lookup(key)
+
+        if entry is not None and (self.mode == "only" or entry.age() < self.get_ttl(provider)):
+            logging.info(f"Serving {self.describe_request(provider, url, params, secrets)} from the cache")
+            return entry.to_response()
+
+        if self.mode == "only":
+            raise CacheMissError(f"{self.describe_request(provider, url, params, secrets)} is not in the cache")
+
+        response = fetch(entry.conditional_headers() if entry is not None else {})
+
+        if response.status_code == 304 and entry is not None:
+            self.refresh(key, entry)
+            return entry.to_response()
+
+        if response.status_code == 200:
+            self.store(key, self.describe_request(provider, url, params, secrets), response)
+
+        return response
+
+
+_response_cache: Optional[ResponseCache] = None
+_response_cache_lock = threading.Lock()
+
+
+def get_response_cache() -> ResponseCache:
+    """
+    :return: The response cache configured in the [http_cache] section of configs/pipeline.ini
+
+    The PIPELINE_HTTP_CACHE environment variable overrides the configured mode e.g. PIPELINE_HTTP_CACHE=only
+    """
+
+    global _response_cache
+
+    with _response_cache_lock:
+        if _response_cache is None:
+            config = load_pipeline_config()
+
+            ttls = dict(DEFAULT_TTLS)
+
+            if config.has_section("http_cache.ttl"):
+                for provider, ttl in config.items("http_cache.ttl"):
+                    ttls[provider] = int(ttl)
+
+            _response_cache = ResponseCache(
+                directory=config.get("http_cache", "directory", fallback=DEFAULT_CACHE_DIRECTORY),
+                mode=os.environ.get(
+                    "PIPELINE_HTTP_CACHE", config.get("http_cache", "mode", fallback=DEFAULT_CACHE_MODE)
+                ),
+                max_size_bytes=config.getint("http_cache", "max_size_mb", fallback=DEFAULT_MAX_SIZE_MB) * 1024 * 1024,
+                ttls=ttls,
+            )
+
+        return _response_cache
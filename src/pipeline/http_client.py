@@ -0,0 +1,152 @@
+import threading
+from typing import Any, Dict, Iterable, Optional, Tuple
+
+import requests
+from http_cache import get_response_cache
+from pipeline_config import load_pipeline_config
+from rate_limiter import get_rate_limiter
+from requests.adapters import HTTPAdapter
+from urllib3.util import Retry
+
+# Fallbacks for the [http] section of configs/pipeline.ini.
+# Every option can be overridden for a single provider in a [http.<provider>] section e.g. [http.marketstack]
+DEFAULT_POOL_SIZE = 10
+DEFAULT_CONNECT_TIMEOUT = 3.05
+DEFAULT_READ_TIMEOUT = 30.0
+DEFAULT_RETRIES = 3
+DEFAULT_BACKOFF_FACTOR = 0.5
+DEFAULT_BACKOFF_JITTER = 0.5
+
+# Rate limited (429) and server side errors are worth retrying, everything else is returned to the extractor
+RETRY_STATUS_CODES = (429, 500, 502, 503, 504)
+
+_sessions: Dict[str, requests.Session] = {}
+_sessions_lock = threading.Lock()
+
+
+def _get_http_option(provider: str, option: str, fallback: Any) -> Any:
+    config = load_pipeline_config()
+
+    for section in (f"http.{provider}", "http"):
+        if config.has_option(section, option):
+            return type(fallback)(config.get(section, option))
+
+    return fallback
+
+
+def get_timeout(provider: str) -> Tuple[float, float]:
+    """
+    :param provider: Name of the API provider e.g. marketstack
+    :return: Tuple of (connect timeout, read timeout) in seconds
+    """
+
+    return (
+        _get_http_option(provider, "connect_timeout", DEFAULT_CONNECT_TIMEOUT),
+        _get_http_option(provider, "read_timeout", DEFAULT_READ_TIMEOUT),
+    )
+
+
+class ProviderSession(requests.Session):
+    """
+    Session which sends every request with the timeout of its provider, also the requests of client libraries like
+    newsapi which hard-code their own timeout or pass none at all
+    """
+
+    def __init__(self, timeout: Tuple[float, float]):
+        super().__init__()
+        self.timeout = timeout
+
+    def request(self, method, url, *args, **kwargs):
+        kwargs["timeout"] = self.timeout
+
+        return super().request(method, url, *args, **kwargs)
+
+
+def charge_retries(provider: str, response: requests.Response):
+    """
+    urllib3 resends rate limited and failed requests without going through the rate limiter, every resent request
+    still counts against the quota of the provider
+    """
+
+    retries = getattr(response.raw, "retries", None)
+
+    if retries is not None and retries.history:
+        get_rate_limiter().charge(provider, len(retries.history))
+
+
+def _build_session(provider: str) -> requests.Session:
+    retries = _get_http_option(provider, "retries", DEFAULT_RETRIES)
+    pool_size = _get_http_option(provider, "pool_size", DEFAULT_POOL_SIZE)
+
+    retry = Retry(
+        total=retries,
+        connect=retries,
+        read=retries,
+        status=retries,
+        status_forcelist=RETRY_STATUS_CODES,
+        backoff_factor=_get_http_option(provider, "backoff_factor", DEFAULT_BACKOFF_FACTOR),
+        backoff_jitter=_get_http_option(provider, "backoff_jitter", DEFAULT_BACKOFF_JITTER),
+        respect_retry_after_header=True,
+        # Hand the last response back after the final retry so the extractors can log its status code
+        raise_on_status=False,
+    )
+
+    # pool_connections is the number of hosts to keep a pool for, pool_maxsize the connections kept alive per host
+    adapter = HTTPAdapter(pool_connections=4, pool_maxsize=pool_size, max_retries=retry)
+
+    session = ProviderSession(timeout=get_timeout(provider))
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    session.hooks["response"].append(lambda response, *args, **kwargs: charge_retries(provider, response))
+    session.headers.update({"Accept-Encoding": "gzip, deflate", "Connection": "keep-alive"})
+
+    return session
+
+
+def get_session(provider: str) -> requests.Session:
+    """
+    :param provider: Name of the API provider e.g. marketstack
+    :return: The keep-alive session shared by every request to this provider
+    """
+
+    with _sessions_lock:
+        if provider not in _sessions:
+            _sessions[provider] = _build_session(provider)
+
+        return _sessions[provider]
+
+
+def http_get(
+    provider: str,
+    url: str,
+    params: Optional[Dict[str, Any]] = None,
+    headers: Optional[Dict[str, str]] = None,
+    secrets: Iterable[str] = (),
+) -> requests.Response:
+    """
+    :param provider: Name of the API provider e.g. marketstack, used to pick the connection pool and its settings
+    :param url: The url to send the GET request to
+    :param params: Query parameters of the request
+    :param headers: Additional request headers
+    :param secrets: API keys which are part of the url itself and have to be left out of the cache key
+    :return: The response of the request, after retrying rate limited and server side errors
+
+    Responses are served from and stored in the on-disk response cache unless it is switched off.
+    Raises requests.RequestException if the request could not be completed e.g. on a timeout, a cache miss
+    in cache-only mode or when the quota of the provider is used up.
+    """
+
+    def fetch(conditional_headers: Dict[str, str]) -> requests.Response:
+        # Only requests that actually go over the network count against the rate limits and quotas
+        get_rate_limiter().acquire(provider)
+
+        return get_session(provider).get(
+            url, params=params, headers={**(headers or {}), **conditional_headers}, timeout=get_timeout(provider)
+        )
+
+    cache = get_response_cache()
+
+    if cache.mode == "off":
+        return fetch({})
+
+    return cache.get(provider, url, params, secrets, fetch)
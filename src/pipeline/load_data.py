@@ -1,9 +1,13 @@
-import configparser
+import threading
 from dataclasses import dataclass
-from datetime import datetime
-from typing import Any, Dict, List
-
-from engine import Engine
+from datetime import datetime, timedelta
+from itertools import chain, islice
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple, Union
+
+from arrow_loader import arrow_upsert
+from batching import chunked
+from copy_loader import DEFAULT_COPY_THRESHOLD, copy_into_staging, create_staging_table, merge_staging_table
+from engine import Engine, get_engine
 from extract_data import (
     get_exchange_rates,
     get_fake_stock_data,
@@ -12,12 +16,37 @@ from extract_data import (
     get_stock_data_market_stack,
     get_weather_data,
 )
-from sqlalchemy import Column, DateTime, Float, Integer, String, create_engine
-from sqlalchemy.orm import declarative_base, sessionmaker
+from pipeline_config import load_pipeline_config
+from sqlalchemy import (
+    BigInteger,
+    Column,
+    DateTime,
+    Float,
+    Index,
+    Integer,
+    Sequence,
+    String,
+    cast,
+    create_engine,
+    func,
+    literal_column,
+    text,
+    update,
+)
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session as OrmSession
+from sqlalchemy.orm import declarative_base
+from transform_data import as_naive_utc, news_fingerprint
 
 # Define the ORM model
 Base = declarative_base()
 
+DEFAULT_LOAD_BATCH_SIZE = 5000
+
+# Text search configuration of the news search. simple does not stem, so the articles of every country are matched
+# the same way whatever their language
+TEXT_SEARCH_CONFIG = "simple"
+
 
 @dataclass
 class StockData(Base):
@@ -34,7 +63,8 @@ class StockData(Base):
 @dataclass
 class NewsData(Base):
     __tablename__ = "NewsData"
-    id: int = Column(Integer, primary_key=True, autoincrement=True)
+    # The sequence PostgreSQL creates for a SERIAL column, named explicitly since DuckDB has no SERIAL
+    id: int = Column(Integer, Sequence("NewsData_id_seq"), primary_key=True, autoincrement=True)
     title: str = Column(String)
     description: str = Column(String)
     source_name: str = Column(String)
@@ -42,6 +72,44 @@ class NewsData(Base):
     url: str = Column(String)
     published_date: datetime = Column(DateTime)
     country: str = Column(String)
+    # news_fingerprint of the url and title, the same article is only stored once
+    fingerprint: str = Column(String)
+    # Weighted tsvector of the title and description for the full-text search, only filled in on PostgreSQL
+    search_vector: str = Column(postgresql.TSVECTOR().with_variant(String, "sqlite", "duckdb"))
+
+    __table_args__ = (Index("ix_newsdata_fingerprint", "fingerprint", unique=True),)
+
+
+def news_search_vector():
+    """
+    :return: SQL expression with the search_vector of a NewsData row, words of the title rank above words of the
+    description
+    """
+
+    config = cast(TEXT_SEARCH_CONFIG, postgresql.REGCONFIG)
+
+    title = func.setweight(func.to_tsvector(config, func.coalesce(NewsData.title, "")), literal_column("'A'"))
+    description = func.setweight(
+        func.to_tsvector(config, func.coalesce(NewsData.description, "")), literal_column("'B'")
+    )
+
+    return title.op("||")(description)
+
+
+def fill_news_search_vectors(session: OrmSession, fingerprints: Optional[List[str]] = None):
+    """
+    :param fingerprints: Only fill in the articles with these fingerprints, every article without a search_vector if
+    None
+
+    Computes the search_vector of the articles in the database with a single UPDATE statement. PostgreSQL only.
+    """
+
+    statement = update(NewsData).where(NewsData.search_vector.is_(None)).values(search_vector=news_search_vector())
+
+    if fingerprints is not None:
+        statement = statement.where(NewsData.fingerprint.in_(fingerprints))
+
+    session.execute(statement)
 
 
 @dataclass
@@ -66,19 +134,79 @@ class WeatherData(Base):
     humidity: float = Column(Float)
 
 
-def buildEngine() -> Engine:
-    config = configparser.ConfigParser()
-    config.read("configs/database.ini")
+@dataclass
+class Watermark(Base):
+    __tablename__ = "Watermark"
+    # Name of the table the watermark belongs to e.g. StockData
+    source: str = Column(String, primary_key=True)
+    # Symbol, currency pair or city the watermark belongs to
+    key: str = Column(String, primary_key=True)
+    datetime: datetime = Column(DateTime)
+
+
+@dataclass
+class StockDataDaily(Base):
+    __tablename__ = "StockDataDaily"
+    symbol: str = Column(String, primary_key=True)
+    # Start of the bucket
+    datetime: datetime = Column(DateTime, primary_key=True)
+    open: float = Column(Float)
+    high: float = Column(Float)
+    low: float = Column(Float)
+    close: float = Column(Float)
+    volume: float = Column(BigInteger)
+    # Number of bars in the bucket
+    bar_count: int = Column(Integer)
+
+
+@dataclass
+class StockDataWeekly(Base):
+    __tablename__ = "StockDataWeekly"
+    symbol: str = Column(String, primary_key=True)
+    datetime: datetime = Column(DateTime, primary_key=True)
+    open: float = Column(Float)
+    high: float = Column(Float)
+    low: float = Column(Float)
+    close: float = Column(Float)
+    volume: float = Column(BigInteger)
+    bar_count: int = Column(Integer)
+
+
+@dataclass
+class StockDataMonthly(Base):
+    __tablename__ = "StockDataMonthly"
+    symbol: str = Column(String, primary_key=True)
+    datetime: datetime = Column(DateTime, primary_key=True)
+    open: float = Column(Float)
+    high: float = Column(Float)
+    low: float = Column(Float)
+    close: float = Column(Float)
+    volume: float = Column(BigInteger)
+    bar_count: int = Column(Integer)
+
+
+# The OHLCV rollups of StockData with the date_trunc field and the length of their buckets, from fine to coarse
+STOCK_ROLLUPS = [
+    (StockDataDaily, "day", "1 day"),
+    (StockDataWeekly, "week", "1 week"),
+    (StockDataMonthly, "month", "1 month"),
+]
 
-    # Get the PostgreSQL connection details
-    host = config.get("postgresql", "host")
-    port = config.get("postgresql", "port")
-    db_name = config.get("postgresql", "dbname")
-    user = config.get("postgresql", "user")
-    password = config.get("postgresql", "password")
 
-    # Define the database connection
-    return Engine(user=user, password=password, host=host, port=port, db_type="postgresql", db_name=db_name)
+# Functions which return the watermark key of a row for every table that is loaded incrementally
+WATERMARK_KEYS = {
+    "StockData": lambda row: row["symbol"],
+    "ExchangeRateData": lambda row: f"{row['first_currency']}/{row['second_currency']}",
+    "WeatherData": lambda row: f"{row['city']}, {row['country']}",
+}
+
+
+def buildEngine() -> Engine:
+    """
+    :return: The engine of the current process, see engine.get_engine
+    """
+
+    return get_engine()
 
 
 # Create the tables
@@ -86,108 +214,483 @@ def create_tables(engine: Engine):
     Base.metadata.create_all(engine.db_engine)
 
 
-def insert_stock_data(engine: Engine, stock_data: List[Dict[str, Any]]):
-    # Create a session
-    # https://docs.sqlalchemy.org/en/20/orm/session_basics.html#using-a-sessionmaker
+def dialect_insert(session: OrmSession, table):
+    """
+    :return: INSERT statement with ON CONFLICT support for the backend of the session, DuckDB understands the one of
+    PostgreSQL
+    """
 
-    Session = sessionmaker(bind=engine.db_engine)
+    if session.get_bind().dialect.name == "sqlite":
+        return sqlite.insert(table)
 
-    # Using a context manager to automatically take care of begin(), commit(), and rollback()
-    with Session.begin() as session:
-        for stock_data_point in stock_data:
-            # Query the data to be avoid adding a duplicate
-            existing_obj = (
-                session.query(StockData)
-                .filter_by(symbol=stock_data_point["symbol"], datetime=stock_data_point["datetime"])
-                .first()
-            )
+    return postgresql.insert(table)
 
-            if not existing_obj:
-                session.add(
-                    StockData(
-                        symbol=stock_data_point["symbol"],
-                        datetime=stock_data_point["datetime"],
-                        open=stock_data_point["open"],
-                        high=stock_data_point["high"],
-                        low=stock_data_point["close"],
-                        close=stock_data_point["low"],
-                        volume=stock_data_point["volume"],
-                    )
-                )
 
+def get_watermarks(session: OrmSession, source: str) -> Dict[str, datetime]:
+    """
+    :param source: Name of the table e.g. StockData
+    :return: Dictionary mapping every symbol, currency pair or city to the latest datetime stored for it
+    """
 
-def insert_news_articles(engine: Engine, news_data: List[Dict[str, Any]]):
-    Session = sessionmaker(bind=engine.db_engine)
+    return {
+        watermark.key: watermark.datetime
+        for watermark in session.query(Watermark).filter(Watermark.source == source)
+        if watermark.datetime is not None
+    }
 
-    country_code_mappings = {"de": "Germany", "gb": "Great Britain", "us": "United States", "in": "India"}
+
+def load_watermarks(engine: Engine, source: str) -> Dict[str, datetime]:
+    Session = engine.session_factory
 
     with Session.begin() as session:
-        for news_article in news_data:
-            session.add(
-                NewsData(
-                    title=news_article["title"],
-                    description=news_article["description"],
-                    source_name=news_article["source_name"],
-                    author=news_article["author"],
-                    url=news_article["url"],
-                    published_date=news_article["published_date"],
-                    country=country_code_mappings[news_article["country"]],
-                )
-            )
+        return get_watermarks(session, source)
 
 
-def insert_exchange_rates(engine: Engine, exchange_rates: List[Dict[str, Any]]):
-    Session = sessionmaker(bind=engine.db_engine)
+def filter_new_rows(source: str, rows: List[Dict[str, Any]], watermarks: Dict[str, datetime]) -> List[Dict[str, Any]]:
+    """
+    :param watermarks: Snapshot of the watermarks taken before the load started. Providers return the newest data
+    first, so comparing against watermarks that were already advanced by an earlier batch would drop older batches
+    :return: The rows which are not older than the watermark of their symbol, currency pair or city
+    """
 
-    with Session.begin() as session:
-        for exchange_rate in exchange_rates:
-            # Query the data to be avoid adding a duplicate
-            existing_obj = (
-                session.query(ExchangeRateData)
-                .filter_by(
-                    first_currency=exchange_rate["first_currency"],
-                    second_currency=exchange_rate["second_currency"],
-                    datetime=exchange_rate["datetime"],
-                )
-                .first()
+    key_function = WATERMARK_KEYS[source]
+
+    return [
+        row
+        for row in rows
+        if key_function(row) not in watermarks or as_naive_utc(row["datetime"]) >= watermarks[key_function(row)]
+    ]
+
+
+def latest_datetimes(source: str, rows: List[Dict[str, Any]]) -> Dict[str, datetime]:
+    """
+    :return: Dictionary mapping every symbol, currency pair or city in rows to its latest datetime
+    """
+
+    key_function = WATERMARK_KEYS[source]
+
+    latest: Dict[str, datetime] = {}
+
+    for row in rows:
+        key = key_function(row)
+        row_datetime = as_naive_utc(row["datetime"])
+
+        if key not in latest or row_datetime > latest[key]:
+            latest[key] = row_datetime
+
+    return latest
+
+
+def write_watermarks(session: OrmSession, source: str, latest: Dict[str, datetime]):
+    """
+    Move the watermarks of the keys in latest forward to the given datetimes, watermarks never move back
+    """
+
+    if not latest:
+        return
+
+    statement = dialect_insert(session, Watermark.__table__).values(
+        [{"source": source, "key": key, "datetime": row_datetime} for key, row_datetime in latest.items()]
+    )
+
+    # SQLite spells greatest as the scalar max
+    greatest = func.max if session.get_bind().dialect.name == "sqlite" else func.greatest
+
+    session.execute(
+        statement.on_conflict_do_update(
+            index_elements=["source", "key"],
+            set_={"datetime": greatest(Watermark.datetime, statement.excluded.datetime)},
+        )
+    )
+
+
+def advance_watermarks(session: OrmSession, source: str, rows: List[Dict[str, Any]]):
+    """
+    Move the watermark of every symbol, currency pair or city in rows to the latest datetime that was loaded
+    """
+
+    write_watermarks(session, source, latest_datetimes(source, rows))
+
+
+class PendingWatermarks:
+    """
+    Collects the latest datetimes of rows which are loaded in several transactions e.g. the pages of a Marketstack
+    fetch, and advances the watermarks only once all of them were loaded. The pages arrive newest first, advancing
+    after every page would skip the older pages for good if a later one fails.
+    """
+
+    def __init__(self, source: str):
+        self.source = source
+        self.latest: Dict[str, datetime] = {}
+        self._lock = threading.Lock()
+
+    def add(self, rows: List[Dict[str, Any]]):
+        with self._lock:
+            for key, row_datetime in latest_datetimes(self.source, rows).items():
+                if key not in self.latest or row_datetime > self.latest[key]:
+                    self.latest[key] = row_datetime
+
+    def advance(self, engine: Engine):
+        """
+        Write the collected watermarks, called once every batch was loaded
+        """
+
+        Session = engine.session_factory
+
+        with self._lock, Session.begin() as session:
+            write_watermarks(session, self.source, self.latest)
+
+
+def bucket_start(value: datetime, field: str) -> datetime:
+    """
+    :param field: day, week or month, like the field of date_trunc
+    :return: The start of the bucket value lies in, weeks start on Monday like in PostgreSQL
+    """
+
+    day = as_naive_utc(value).replace(hour=0, minute=0, second=0, microsecond=0)
+
+    if field == "week":
+        return day - timedelta(days=day.weekday())
+
+    if field == "month":
+        return day.replace(day=1)
+
+    return day
+
+
+class RollupBuckets:
+    """
+    Collects the (symbol, bucket) pairs touched by a stock load, so that only those buckets of the rollups are
+    recomputed afterwards
+    """
+
+    def __init__(self):
+        self.buckets: Dict[str, Set[Tuple[str, datetime]]] = {field: set() for _, field, _ in STOCK_ROLLUPS}
+
+    def add(self, rows: List[Dict[str, Any]]):
+        for row in rows:
+            for field, buckets in self.buckets.items():
+                buckets.add((row["symbol"], bucket_start(row["datetime"], field)))
+
+    def refresh(self, session: OrmSession):
+        """
+        Recompute the touched buckets of every rollup from StockData, with one statement per rollup
+        """
+
+        # The rollups rely on PostgreSQL arrays, other databases are queried at full resolution
+        if session.get_bind().dialect.name != "postgresql":
+            return
+
+        for model, field, interval in STOCK_ROLLUPS:
+            buckets = self.buckets[field]
+
+            if not buckets:
+                continue
+
+            symbols, starts = zip(*sorted(buckets))
+
+            session.execute(
+                text(
+                    f'INSERT INTO "{model.__tablename__}" '
+                    "(symbol, datetime, open, high, low, close, volume, bar_count) "
+                    f"SELECT bar.symbol, date_trunc('{field}', bar.datetime) AS bucket, "
+                    "(array_agg(bar.open ORDER BY bar.datetime))[1], max(bar.high), min(bar.low), "
+                    "(array_agg(bar.close ORDER BY bar.datetime DESC))[1], sum(bar.volume), count(*) "
+                    'FROM "StockData" bar '
+                    "JOIN unnest(CAST(:symbols AS VARCHAR[]), CAST(:starts AS TIMESTAMP[])) AS touched(symbol, start) "
+                    "ON bar.symbol = touched.symbol AND bar.datetime >= touched.start "
+                    f"AND bar.datetime < touched.start + INTERVAL '{interval}' "
+                    "GROUP BY bar.symbol, bucket "
+                    "ON CONFLICT (symbol, datetime) DO UPDATE SET open = excluded.open, high = excluded.high, "
+                    "low = excluded.low, close = excluded.close, volume = excluded.volume, "
+                    "bar_count = excluded.bar_count"
+                ),
+                {"symbols": list(symbols), "starts": list(starts)},
             )
 
-            if not existing_obj:
-                session.add(
-                    ExchangeRateData(
-                        first_currency=exchange_rate["first_currency"],
-                        second_currency=exchange_rate["second_currency"],
-                        exchange_rate=exchange_rate["exchange_rate"],
-                        datetime=exchange_rate["datetime"],
-                    )
-                )
 
+def get_load_batch_size() -> int:
+    """
+    :return: Number of rows the loaders write with a single statement, configured with batch_size in the [load] section
+    """
 
-def insert_weather_data(engine: Engine, weather_data: Dict[str, Any]):
-    Session = sessionmaker(bind=engine.db_engine)
+    return load_pipeline_config().getint("load", "batch_size", fallback=DEFAULT_LOAD_BATCH_SIZE)
 
-    with Session.begin() as session:
-        # Query the data to be avoid adding a duplicate
-        existing_obj = (
-            session.query(WeatherData)
-            .filter_by(city=weather_data["city"], country=weather_data["country"], datetime=weather_data["datetime"])
-            .first()
+
+def bulk_upsert(
+    session: OrmSession,
+    model,
+    rows: List[Dict[str, Any]],
+    update_on_conflict: bool,
+    conflict_columns: Optional[List[str]] = None,
+):
+    """
+    :param model: The ORM model of the table e.g. StockData
+    :param rows: The rows to write, only the keys that are columns of the table are used
+    :param update_on_conflict: Overwrite rows with the same primary key (ON CONFLICT DO UPDATE) instead of keeping the
+    stored ones (ON CONFLICT DO NOTHING)
+    :param conflict_columns: Columns of a unique index to detect conflicts with instead of the primary key
+
+    Writes all the rows with a single multi-row INSERT ... ON CONFLICT statement against the primary key. SQLite limits
+    the number of parameters of a statement, so there the statement is executed once for every row instead, which is
+    its fastest way to insert since it runs in-process.
+    """
+
+    table = model.__table__
+    primary_key = conflict_columns or [column.name for column in table.primary_key.columns]
+
+    # Generated ids are left to the database
+    columns = [column for column in table.columns if column is not table.autoincrement_column]
+
+    # A statement must not touch the same row twice, so only the last row with each primary key is kept
+    unique_rows = {
+        tuple(row[column] for column in primary_key): {column.name: row.get(column.name) for column in columns}
+        for row in rows
+    }
+
+    if not unique_rows:
+        return
+
+    executemany = session.get_bind().dialect.name == "sqlite"
+
+    statement = dialect_insert(session, table)
+
+    if not executemany:
+        statement = statement.values(list(unique_rows.values()))
+
+    if update_on_conflict:
+        statement = statement.on_conflict_do_update(
+            index_elements=primary_key,
+            set_={column.name: statement.excluded[column.name] for column in columns if column.name not in primary_key},
         )
+    else:
+        statement = statement.on_conflict_do_nothing(index_elements=primary_key)
+
+    if executemany:
+        session.execute(statement, list(unique_rows.values()))
+    else:
+        session.execute(statement)
 
-        if not existing_obj:
-            session.add(
-                WeatherData(
-                    city=weather_data["city"],
-                    country=weather_data["country"],
-                    condition=weather_data["condition"],
-                    temp_celsius=weather_data["temp_celsius"],
-                    temp_feels_like_celsius=weather_data["temp_feels_like_celsius"],
-                    wind_kph=weather_data["wind_kph"],
-                    humidity=weather_data["humidity"],
-                    datetime=weather_data["datetime"],
-                )
+
+def get_copy_threshold() -> int:
+    """
+    :return: Number of rows from which the loaders switch to COPY, configured with copy_threshold in the [load] section
+    """
+
+    return load_pipeline_config().getint("load", "copy_threshold", fallback=DEFAULT_COPY_THRESHOLD)
+
+
+def choose_copy(rows: Iterable[Dict[str, Any]], use_copy: Optional[bool]) -> Tuple[bool, Iterable[Dict[str, Any]]]:
+    """
+    :param use_copy: Force or forbid COPY, decided by the number of rows if None
+    :return: Whether to load the rows with COPY and the rows themselves, since a generator has to be partly consumed
+    to count them
+    """
+
+    if use_copy is not None:
+        return use_copy, rows
+
+    threshold = get_copy_threshold()
+
+    rows = iter(rows)
+    head = list(islice(rows, threshold))
+
+    return len(head) >= threshold, chain(head, rows)
+
+
+def load_rows(
+    engine: Engine,
+    model,
+    rows: Iterable[Dict[str, Any]],
+    update_on_conflict: bool,
+    batch_size: Optional[int] = None,
+    watermarks: Optional[Dict[str, datetime]] = None,
+    use_copy: Optional[bool] = None,
+    rollups: Optional[RollupBuckets] = None,
+    pending_watermarks: Optional[PendingWatermarks] = None,
+):
+    """
+    :param model: The ORM model of a table in WATERMARK_KEYS e.g. StockData
+    :param rows: The rows to write, can be a generator
+    :param watermarks: Watermarks at the start of the run. Rows older than the watermark of their key are skipped and
+    the watermarks are advanced, pass None to load all rows without touching the watermarks
+    :param use_copy: Stream the rows into a staging table with COPY and merge it with one statement instead of
+    writing multi-row INSERTs, decided by the number of rows if None. Only PostgreSQL has COPY
+    :param rollups: Collects the buckets touched by the loaded rows and refreshes them at the end of the transaction
+    :param pending_watermarks: Collects the advanced watermarks instead of writing them, for rows that are loaded in
+    several calls, see PendingWatermarks
+
+    All the batches are written in one transaction, with the fastest bulk path of the backend: COPY or multi-row
+    INSERTs for PostgreSQL, Arrow tables for DuckDB and executemany for SQLite.
+    """
+
+    source = model.__tablename__
+    backend = engine.db_engine.dialect.name
+
+    Session = engine.session_factory
+
+    if backend == "postgresql":
+        use_copy, rows = choose_copy(rows, use_copy)
+    else:
+        use_copy = False
+
+    with Session.begin() as session:
+        if use_copy:
+            create_staging_table(session, model)
+
+        # rows can be a generator, it is consumed one batch at a time
+        for batch in chunked(rows, batch_size or get_load_batch_size()):
+            if watermarks is not None:
+                batch = filter_new_rows(source, batch, watermarks)
+
+            if use_copy:
+                copy_into_staging(session, model, batch)
+            elif backend == "duckdb":
+                arrow_upsert(session, model, batch, update_on_conflict=update_on_conflict)
+            else:
+                bulk_upsert(session, model, batch, update_on_conflict=update_on_conflict)
+
+            if pending_watermarks is not None:
+                pending_watermarks.add(batch)
+            elif watermarks is not None:
+                advance_watermarks(session, source, batch)
+
+            if rollups is not None:
+                rollups.add(batch)
+
+        if use_copy:
+            merge_staging_table(session, model, update_on_conflict=update_on_conflict)
+
+        if rollups is not None:
+            rollups.refresh(session)
+
+
+def insert_stock_data(
+    engine: Engine,
+    stock_data: Iterable[Dict[str, Any]],
+    batch_size: Optional[int] = None,
+    watermarks: Optional[Dict[str, datetime]] = None,
+    use_copy: Optional[bool] = None,
+    pending_watermarks: Optional[PendingWatermarks] = None,
+):
+    """
+    :param stock_data: Stock data points, can be a generator
+    :param batch_size: Number of rows written with a single statement
+    :param watermarks: Watermarks at the start of the run, read from the database if not given
+    :param use_copy: Load with COPY e.g. for historical backfills, decided by the number of rows if None
+    :param pending_watermarks: Collects the advanced watermarks instead of writing them, see PendingWatermarks
+
+    All the batches are written in one transaction, existing bars are updated with the newly fetched values. The
+    daily, weekly and monthly buckets the bars fall into are recomputed in the same transaction.
+    """
+
+    if watermarks is None:
+        watermarks = load_watermarks(engine, "StockData")
+
+    load_rows(
+        engine,
+        StockData,
+        stock_data,
+        True,
+        batch_size=batch_size,
+        watermarks=watermarks,
+        use_copy=use_copy,
+        rollups=RollupBuckets(),
+        pending_watermarks=pending_watermarks,
+    )
+
+
+def insert_news_articles(
+    engine: Engine,
+    news_data: Iterable[Dict[str, Any]],
+    batch_size: Optional[int] = None,
+    seen_fingerprints: Optional[Set[str]] = None,
+):
+    """
+    :param news_data: News articles, can be a generator
+    :param batch_size: Number of rows written with a single statement
+    :param seen_fingerprints: Fingerprints of the articles loaded earlier in the run. Articles in it are dropped before
+    they reach the database and the fingerprints of the new ones are added to it
+
+    Articles whose fingerprint is already stored are skipped, so loading the same articles again is a no-op.
+    """
+
+    Session = engine.session_factory
+
+    country_code_mappings = {"de": "Germany", "gb": "Great Britain", "us": "United States", "in": "India"}
+
+    if seen_fingerprints is None:
+        seen_fingerprints = set()
+
+    for news_batch in chunked(news_data, batch_size or get_load_batch_size()):
+        rows = []
+
+        for news_article in news_batch:
+            fingerprint = news_fingerprint(news_article["url"], news_article["title"])
+
+            if fingerprint in seen_fingerprints:
+                continue
+
+            seen_fingerprints.add(fingerprint)
+
+            rows.append(
+                {
+                    "title": news_article["title"],
+                    "description": news_article["description"],
+                    "source_name": news_article["source_name"],
+                    "author": news_article["author"],
+                    "url": news_article["url"],
+                    "published_date": news_article["published_date"],
+                    "country": country_code_mappings[news_article["country"]],
+                    "fingerprint": fingerprint,
+                }
             )
 
+        with Session.begin() as session:
+            bulk_upsert(session, NewsData, rows, update_on_conflict=False, conflict_columns=["fingerprint"])
+
+            # The search vectors of the new articles are written in the same transaction, so every stored article
+            # can be found right away
+            if rows and session.get_bind().dialect.name == "postgresql":
+                fill_news_search_vectors(session, [row["fingerprint"] for row in rows])
+
+
+def insert_exchange_rates(
+    engine: Engine,
+    exchange_rates: Iterable[Dict[str, Any]],
+    batch_size: Optional[int] = None,
+    use_copy: Optional[bool] = None,
+):
+    watermarks = load_watermarks(engine, "ExchangeRateData")
+
+    load_rows(
+        engine, ExchangeRateData, exchange_rates, False, batch_size=batch_size, watermarks=watermarks, use_copy=use_copy
+    )
+
+
+def insert_weather_data(
+    engine: Engine,
+    weather_data: Union[Dict[str, Any], Iterable[Dict[str, Any]]],
+    batch_size: Optional[int] = None,
+    incremental: bool = True,
+    use_copy: Optional[bool] = None,
+):
+    """
+    :param weather_data: Weather info of a single city, or of many cities e.g. from get_weather_data_batch
+    :param batch_size: Number of rows written with a single statement
+    :param incremental: Skip rows older than the watermark of their city and advance it. Turn this off for forecasts,
+    which lie in the future and would otherwise move the watermark past the current conditions, and for the history
+    of a past date, which lies behind the watermark and would be dropped completely
+    :param use_copy: Load with COPY e.g. for historical backfills, decided by the number of rows if None
+    """
+
+    if isinstance(weather_data, dict):
+        weather_data = [weather_data]
+
+    watermarks = load_watermarks(engine, "WeatherData") if incremental else None
+
+    load_rows(engine, WeatherData, weather_data, True, batch_size=batch_size, watermarks=watermarks, use_copy=use_copy)
+
 
 if __name__ == "__main__":
     engine: Engine = buildEngine()
@@ -203,7 +706,7 @@ if __name__ == "__main__":
     # insert_exchange_rates(engine, get_exchange_rates(["USD", "EUR", "GBP", "INR"]))
     # insert_weather_data(engine, get_weather_data("Munich"))
 
-    Session = sessionmaker(bind=engine.db_engine)
+    Session = engine.session_factory
 
     with Session.begin() as session:
         rows = session.query(StockData).all()
@@ -225,4 +728,3 @@ if __name__ == "__main__":
         # for row in rows:
         #     print(row)
         #     print("\n")
-
@@ -0,0 +1,105 @@
+import logging
+import queue
+import threading
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from engine import Engine
+from extraction_engine import DEFAULT_QUEUE_SIZE, ExtractionEngine, ExtractionTask
+from pipeline_config import load_pipeline_config
+
+# Number of threads that write to the database, can be overridden with writers in the [pipeline] section
+DEFAULT_WRITERS = 1
+
+# Tells a writer thread that no more results will arrive
+_STOP = object()
+
+
+class LoadPipeline:
+    """
+    Runs the extraction tasks and loads their results with a producer/consumer pipeline: the extractors push their
+    results into a bounded queue which is drained by one or more database writer threads, so the database writes
+    while the next batches are fetched. When the writers fall behind the queues fill up and the extractors wait,
+    which keeps the memory bounded.
+    """
+
+    def __init__(
+        self,
+        engine: Engine,
+        extraction_engine: Optional[ExtractionEngine] = None,
+        writers: Optional[int] = None,
+        queue_size: Optional[int] = None,
+    ):
+        config = load_pipeline_config()
+
+        self.engine = engine
+        self.extraction_engine = extraction_engine if extraction_engine is not None else ExtractionEngine()
+        self.timeline = self.extraction_engine.timeline
+        self.writers = max(
+            1, writers if writers is not None else config.getint("pipeline", "writers", fallback=DEFAULT_WRITERS)
+        )
+        self.queue_size = (
+            queue_size
+            if queue_size is not None
+            else config.getint("pipeline", "queue_size", fallback=DEFAULT_QUEUE_SIZE)
+        )
+        self.failures: List[Tuple[ExtractionTask, BaseException]] = []
+
+    def _write(self, loads: queue.Queue):
+        while True:
+            item = loads.get()
+
+            if item is _STOP:
+                return
+
+            task, result = item
+
+            try:
+                with self.timeline.measure("load"):
+                    task.load(self.engine, result)
+            except (Exception, SystemExit) as e:
+                logging.error(f"Loading the result of {task.name} failed: {e!r}")
+                self.failures.append((task, e))
+
+    def run(self, tasks: Iterable[ExtractionTask]) -> Dict[str, Dict[str, float]]:
+        """
+        :param tasks: The extraction tasks to run, every task needs a load function. The finish function of a task is
+        called after all the other loads, if neither its extraction nor any of its loads failed
+        :return: How long the extract and load stages were busy and how much of that overlapped with the other stage,
+        see StageTimeline.overlap_report
+        """
+
+        tasks = list(tasks)
+        loads: queue.Queue = queue.Queue(maxsize=self.queue_size)
+
+        writers = [
+            threading.Thread(target=self._write, args=(loads,), name=f"writer-{i}", daemon=True)
+            for i in range(self.writers)
+        ]
+
+        for writer in writers:
+            writer.start()
+
+        try:
+            for task, result in self.extraction_engine.run(tasks):
+                loads.put((task, result))
+        finally:
+            for _ in writers:
+                loads.put(_STOP)
+
+            for writer in writers:
+                writer.join()
+
+        failed = [task for task, _ in self.extraction_engine.failures + self.failures]
+        incomplete = failed + self.extraction_engine.skipped
+
+        for task in tasks:
+            if task.finish is None or any(task is other for other in incomplete):
+                continue
+
+            try:
+                task.finish(self.engine)
+            except Exception as e:
+                logging.error(f"Finishing {task.name} failed: {e!r}")
+                self.failures.append((task, e))
+
+        return self.timeline.overlap_report()
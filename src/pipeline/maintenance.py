@@ -0,0 +1,69 @@
+import argparse
+import logging
+
+from batching import chunked
+from engine import Engine
+from load_data import NewsData, buildEngine
+from sqlalchemy import select, text, update
+from sqlalchemy.orm import Session as OrmSession
+from transform_data import news_fingerprint
+
+
+def deduplicate_news(session: OrmSession, batch_size: int = 5000) -> int:
+    """
+    :param batch_size: Number of fingerprints that are backfilled with a single statement
+    :return: Number of duplicate articles that were deleted
+
+    Brings a NewsData table from before the deduplication up to date: adds the fingerprint column if it is missing,
+    fills it for the stored articles, deletes every duplicate but the oldest copy and creates the unique index.
+    """
+
+    session.execute(text('ALTER TABLE "NewsData" ADD COLUMN IF NOT EXISTS fingerprint VARCHAR'))
+
+    articles = session.execute(
+        select(NewsData.id, NewsData.url, NewsData.title).where(NewsData.fingerprint.is_(None))
+    ).all()
+
+    for article_batch in chunked(articles, batch_size):
+        session.execute(
+            update(NewsData),
+            [
+                {"id": article.id, "fingerprint": news_fingerprint(article.url, article.title)}
+                for article in article_batch
+            ],
+        )
+
+    deleted = session.execute(
+        text(
+            'DELETE FROM "NewsData" duplicate USING "NewsData" original '
+            "WHERE duplicate.fingerprint = original.fingerprint AND duplicate.id > original.id"
+        )
+    ).rowcount
+
+    session.execute(text('CREATE UNIQUE INDEX IF NOT EXISTS ix_newsdata_fingerprint ON "NewsData" (fingerprint)'))
+
+    return deleted
+
+
+def compact_news(engine: Engine) -> int:
+    """
+    Runs deduplicate_news in one transaction, so it can be run again safely
+    """
+
+    Session = engine.session_factory
+
+    with Session.begin() as session:
+        return deduplicate_news(session)
+
+
+if __name__ == "__main__":
+    logging.getLogger().setLevel(logging.INFO)
+
+    parser = argparse.ArgumentParser(description="Maintenance commands for the dashboard database")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    subparsers.add_parser("compact-news", help="Remove duplicate news articles and create the deduplication index")
+
+    arguments = parser.parse_args()
+
+    if arguments.command == "compact-news":
+        logging.info(f"Deleted {compact_news(buildEngine())} duplicate news articles")
@@ -0,0 +1,345 @@
+import logging
+from dataclasses import dataclass
+from datetime import date, datetime, timezone
+from typing import Callable, List, Optional
+
+from engine import Engine, get_engine
+from load_data import STOCK_ROLLUPS, Base, ExchangeRateData, StockData, fill_news_search_vectors
+from maintenance import deduplicate_news
+from pipeline_config import load_pipeline_config
+from sqlalchemy import text
+from sqlalchemy.orm import Session as OrmSession
+
+# Number of monthly partitions that are created in advance, can be overridden in the [partitions] section
+DEFAULT_MONTHS_AHEAD = 3
+
+# Number of past monthly partitions that are created, covers the year of history of a first Marketstack load so that
+# the backfill does not land in the default partition. Can be overridden with months_back in the [partitions] section
+DEFAULT_MONTHS_BACK = 12
+
+# Tables which are range partitioned by month on their datetime column
+PARTITIONED_MODELS = [StockData, ExchangeRateData]
+
+# Key of the advisory lock that keeps two processes from migrating at the same time
+MIGRATION_LOCK_KEY = 7310115
+
+
+@dataclass
+class Migration:
+    version: int
+    description: str
+    upgrade: Callable[[OrmSession], None]
+
+
+def add_months(month: date, months: int) -> date:
+    """
+    :return: The first day of the month that lies the given number of months after the month of month
+    """
+
+    index = month.year * 12 + month.month - 1 + months
+
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def month_starts(first: date, last: date) -> List[date]:
+    """
+    :return: The first day of every month from the month of first up to and including the month of last
+    """
+
+    months = []
+    month = add_months(first, 0)
+
+    while month <= last:
+        months.append(month)
+        month = add_months(month, 1)
+
+    return months
+
+
+def create_month_partition(session: OrmSession, table_name: str, month: date):
+    """
+    Creates the partition of month unless it exists. Rows of the month that were written to the default partition
+    before are moved into it, as PostgreSQL refuses to add a partition for rows the default partition holds.
+    """
+
+    partition = f"{table_name}_{month:%Y_%m}"
+    next_month = add_months(month, 1)
+
+    if session.execute(text("SELECT to_regclass(:name)"), {"name": f'"{partition}"'}).scalar() is not None:
+        return
+
+    session.execute(text(f'CREATE TABLE "{partition}" (LIKE "{table_name}" INCLUDING DEFAULTS)'))
+    session.execute(
+        text(
+            f'WITH moved AS (DELETE FROM "{table_name}_default" WHERE datetime >= :start AND datetime < :end '
+            f'RETURNING *) INSERT INTO "{partition}" SELECT * FROM moved'
+        ),
+        {"start": month, "end": next_month},
+    )
+    session.execute(
+        text(
+            f'ALTER TABLE "{table_name}" ATTACH PARTITION "{partition}" '
+            f"FOR VALUES FROM ('{month}') TO ('{next_month}')"
+        )
+    )
+
+
+def partition_by_month(session: OrmSession, model):
+    """
+    Replace the table of model with a table that is range partitioned by month on its datetime column and move the
+    stored rows into it. Rows outside of every monthly partition end up in the default partition.
+    """
+
+    table_name = model.__tablename__
+    primary_key = ", ".join(f'"{column.name}"' for column in model.__table__.primary_key.columns)
+
+    session.execute(text(f'ALTER TABLE "{table_name}" RENAME TO "{table_name}_unpartitioned"'))
+    session.execute(
+        text(
+            f'ALTER TABLE "{table_name}_unpartitioned" RENAME CONSTRAINT "{table_name}_pkey" TO "{table_name}_old_pkey"'
+        )
+    )
+
+    session.execute(
+        text(
+            f'CREATE TABLE "{table_name}" (LIKE "{table_name}_unpartitioned" INCLUDING DEFAULTS) '
+            f"PARTITION BY RANGE (datetime)"
+        )
+    )
+    session.execute(text(f'ALTER TABLE "{table_name}" ADD PRIMARY KEY ({primary_key})'))
+    session.execute(text(f'CREATE TABLE "{table_name}_default" PARTITION OF "{table_name}" DEFAULT'))
+
+    first, last = session.execute(text(f'SELECT min(datetime), max(datetime) FROM "{table_name}_unpartitioned"')).one()
+
+    if first is not None:
+        for month in month_starts(first.date(), last.date()):
+            create_month_partition(session, table_name, month)
+
+    session.execute(text(f'INSERT INTO "{table_name}" SELECT * FROM "{table_name}_unpartitioned"'))
+    session.execute(text(f'DROP TABLE "{table_name}_unpartitioned"'))
+
+
+def ensure_partitions(
+    session: OrmSession,
+    months_ahead: Optional[int] = None,
+    today: Optional[date] = None,
+    months_back: Optional[int] = None,
+):
+    """
+    :param months_ahead: Number of future months to create partitions for, read from the [partitions] section if None
+    :param months_back: Number of past months to create partitions for, read from the [partitions] section if None
+
+    Creates the monthly partitions from months_back months ago on, so that neither the backfilled history nor new rows
+    end up in the default partition.
+    """
+
+    config = load_pipeline_config()
+
+    if months_ahead is None:
+        months_ahead = config.getint("partitions", "months_ahead", fallback=DEFAULT_MONTHS_AHEAD)
+
+    if months_back is None:
+        months_back = config.getint("partitions", "months_back", fallback=DEFAULT_MONTHS_BACK)
+
+    today = today or datetime.now(timezone.utc).date()
+
+    for model in PARTITIONED_MODELS:
+        for month in month_starts(add_months(today, -months_back), add_months(today, months_ahead)):
+            create_month_partition(session, model.__tablename__, month)
+
+
+# The tables as they were when the migrations were introduced. Later changes of the ORM models are added by later
+# migrations, so this must not be derived from the models
+BASE_TABLES = [
+    '''CREATE TABLE IF NOT EXISTS "StockData" (
+        symbol VARCHAR NOT NULL,
+        datetime TIMESTAMP WITHOUT TIME ZONE NOT NULL,
+        open FLOAT,
+        high FLOAT,
+        low FLOAT,
+        close FLOAT,
+        volume INTEGER,
+        PRIMARY KEY (symbol, datetime)
+    )''',
+    '''CREATE TABLE IF NOT EXISTS "NewsData" (
+        id SERIAL NOT NULL,
+        title VARCHAR,
+        description VARCHAR,
+        source_name VARCHAR,
+        author VARCHAR,
+        url VARCHAR,
+        published_date TIMESTAMP WITHOUT TIME ZONE,
+        country VARCHAR,
+        fingerprint VARCHAR,
+        PRIMARY KEY (id)
+    )''',
+    '''CREATE TABLE IF NOT EXISTS "ExchangeRateData" (
+        first_currency VARCHAR NOT NULL,
+        second_currency VARCHAR NOT NULL,
+        datetime TIMESTAMP WITHOUT TIME ZONE NOT NULL,
+        exchange_rate FLOAT,
+        PRIMARY KEY (first_currency, second_currency, datetime)
+    )''',
+    '''CREATE TABLE IF NOT EXISTS "WeatherData" (
+        city VARCHAR NOT NULL,
+        country VARCHAR NOT NULL,
+        datetime TIMESTAMP WITHOUT TIME ZONE NOT NULL,
+        condition VARCHAR,
+        temp_celsius FLOAT,
+        temp_feels_like_celsius FLOAT,
+        wind_kph FLOAT,
+        humidity FLOAT,
+        PRIMARY KEY (city, country, datetime)
+    )''',
+    '''CREATE TABLE IF NOT EXISTS "Watermark" (
+        source VARCHAR NOT NULL,
+        key VARCHAR NOT NULL,
+        datetime TIMESTAMP WITHOUT TIME ZONE,
+        PRIMARY KEY (source, key)
+    )''',
+]
+
+
+def create_base_tables(session: OrmSession):
+    # Tables created by create_tables before the migrations existed are kept, migration 2 brings NewsData up to date
+    for statement in BASE_TABLES:
+        session.execute(text(statement))
+
+
+def create_news_country_index(session: OrmSession):
+    session.execute(
+        text('CREATE INDEX IF NOT EXISTS ix_newsdata_country_published_date ON "NewsData" (country, published_date)')
+    )
+
+
+def partition_time_series(session: OrmSession):
+    for model in PARTITIONED_MODELS:
+        partition_by_month(session, model)
+
+
+def create_brin_indexes(session: OrmSession):
+    # BRIN indexes stay tiny on append-only time columns and let range scans skip the blocks outside the range
+    for table_name, column in [
+        ("StockData", "datetime"),
+        ("ExchangeRateData", "datetime"),
+        ("WeatherData", "datetime"),
+        ("NewsData", "published_date"),
+    ]:
+        session.execute(
+            text(
+                f'CREATE INDEX IF NOT EXISTS "ix_{table_name.lower()}_{column}_brin" '
+                f'ON "{table_name}" USING brin ("{column}")'
+            )
+        )
+
+
+def create_stock_rollups(session: OrmSession):
+    for model, _, _ in STOCK_ROLLUPS:
+        # Spelled out instead of derived from the models, like BASE_TABLES
+        session.execute(
+            text(
+                f'CREATE TABLE IF NOT EXISTS "{model.__tablename__}" (symbol VARCHAR NOT NULL, '
+                "datetime TIMESTAMP WITHOUT TIME ZONE NOT NULL, open FLOAT, high FLOAT, low FLOAT, close FLOAT, "
+                "volume BIGINT, bar_count INTEGER, PRIMARY KEY (symbol, datetime))"
+            )
+        )
+
+    # Later loads only refresh the buckets they touch, so the stored history is rolled up once here
+    for model, field, _ in STOCK_ROLLUPS:
+        session.execute(
+            text(
+                f'INSERT INTO "{model.__tablename__}" (symbol, datetime, open, high, low, close, volume, bar_count) '
+                f"SELECT symbol, date_trunc('{field}', datetime) AS bucket, (array_agg(open ORDER BY datetime))[1], "
+                "max(high), min(low), (array_agg(close ORDER BY datetime DESC))[1], sum(volume), count(*) "
+                'FROM "StockData" GROUP BY symbol, bucket ON CONFLICT DO NOTHING'
+            )
+        )
+
+
+def create_news_search_index(session: OrmSession):
+    session.execute(text('ALTER TABLE "NewsData" ADD COLUMN IF NOT EXISTS search_vector tsvector'))
+
+    fill_news_search_vectors(session)
+
+    session.execute(
+        text('CREATE INDEX IF NOT EXISTS ix_newsdata_search_vector ON "NewsData" USING GIN (search_vector)')
+    )
+
+
+# Applied in order, a migration must never be changed once it has been released, add a new one instead
+MIGRATIONS = [
+    Migration(1, "Create the tables of the ORM models", create_base_tables),
+    Migration(2, "Deduplicate news articles by fingerprint", deduplicate_news),
+    Migration(3, "Index NewsData on (country, published_date)", create_news_country_index),
+    Migration(4, "Partition StockData and ExchangeRateData by month", partition_time_series),
+    Migration(5, "BRIN indexes on the time columns", create_brin_indexes),
+    Migration(6, "Daily, weekly and monthly OHLCV rollups of StockData", create_stock_rollups),
+    Migration(7, "Full-text search index on the title and description of NewsData", create_news_search_index),
+]
+
+
+def get_applied_versions(session: OrmSession) -> List[int]:
+    return list(session.execute(text("SELECT version FROM schema_migrations ORDER BY version")).scalars())
+
+
+def migrate(engine: Engine, migrations: Optional[List[Migration]] = None) -> List[int]:
+    """
+    :param migrations: The migrations to apply, MIGRATIONS by default
+    :return: The versions that were applied by this call
+
+    Applies every migration that is not yet recorded in the schema_migrations table in one transaction and makes sure
+    the monthly partitions of the coming months exist. The migrations rely on PostgreSQL, other databases only get
+    the tables of the ORM models.
+    """
+
+    migrations = migrations if migrations is not None else MIGRATIONS
+
+    Session = engine.session_factory
+
+    if engine.db_engine.dialect.name != "postgresql":
+        with Session.begin() as session:
+            Base.metadata.create_all(session.connection())
+
+        return []
+
+    applied = []
+
+    with Session.begin() as session:
+        session.execute(text("SELECT pg_advisory_xact_lock(:key)"), {"key": MIGRATION_LOCK_KEY})
+
+        session.execute(
+            text(
+                "CREATE TABLE IF NOT EXISTS schema_migrations "
+                "(version INTEGER PRIMARY KEY, description VARCHAR NOT NULL, applied_at TIMESTAMP NOT NULL)"
+            )
+        )
+
+        applied_versions = set(get_applied_versions(session))
+
+        for migration in sorted(migrations, key=lambda migration: migration.version):
+            if migration.version in applied_versions:
+                continue
+
+            logging.info(f"Applying migration {migration.version}: {migration.description}")
+
+            migration.upgrade(session)
+
+            session.execute(
+                text(
+                    "INSERT INTO schema_migrations (version, description, applied_at) "
+                    "VALUES (:version, :description, now())"
+                ),
+                {"version": migration.version, "description": migration.description},
+            )
+
+            applied.append(migration.version)
+
+        ensure_partitions(session)
+
+    return applied
+
+
+if __name__ == "__main__":
+    logging.getLogger().setLevel(logging.INFO)
+
+    logging.info(f"Applied migrations {migrate(get_engine()) or 'none, the schema is up to date'}")
@@ -0,0 +1,21 @@
+import configparser
+import os
+from functools import lru_cache
+
+# Can be pointed to another file with the PIPELINE_CONFIG environment variable e.g. for the tests
+DEFAULT_PIPELINE_CONFIG_PATH = "configs/pipeline.ini"
+
+
+@lru_cache(maxsize=None)
+def load_pipeline_config() -> configparser.ConfigParser:
+    """
+    :return: ConfigParser with the tuning options for the pipeline e.g. concurrency limits, timeouts and cache settings
+
+    The file is optional. Every option that is read from it has a sensible fallback in the module that uses it,
+    so the pipeline also runs with no _pipeline.ini_ at all.
+    """
+
+    config = configparser.ConfigParser()
+    config.read(os.environ.get("PIPELINE_CONFIG", DEFAULT_PIPELINE_CONFIG_PATH))
+
+    return config
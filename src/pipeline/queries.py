@@ -0,0 +1,333 @@
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+
+import pandas as pd
+from archive import archive_start, get_hot_cutoff, read_archive
+from engine import Engine
+from load_data import STOCK_ROLLUPS, TEXT_SEARCH_CONFIG, NewsData, StockData
+from pipeline_config import load_pipeline_config
+from sqlalchemy import Connection, Row, String, and_, any_, bindparam, cast, func, or_, select
+from sqlalchemy.dialects.postgresql import ARRAY, REGCONFIG
+
+# Minimum number of points per line the stock graphs should show, coarser resolutions are only used above it
+DEFAULT_MIN_POINTS = 300
+
+# How often (in seconds) the stock graphs ask for new bars, can be overridden with live_interval_seconds in the
+# [dashboard] section
+DEFAULT_LIVE_INTERVAL_SECONDS = 60
+
+# Number of articles shown per page of a news panel
+DEFAULT_NEWS_PAGE_SIZE = 20
+
+# Maximum number of matching articles, newest first, that a news search ranks. Can be overridden with
+# search_candidates in the [dashboard] section
+DEFAULT_SEARCH_CANDIDATES = 1000
+
+# Number of rows fetched from the server side cursor at a time
+DEFAULT_FETCH_SIZE = 10000
+
+# Column types of the frames returned by get_stock_closes
+STOCK_CLOSE_DTYPES = {"symbol": "object", "datetime": "datetime64[ns]", "close": "float64"}
+
+# Approximate length of the buckets of each date_trunc field
+BUCKET_LENGTHS = {"day": timedelta(days=1), "week": timedelta(weeks=1), "month": timedelta(days=30.44)}
+
+
+def choose_resolution(start: datetime, end: datetime, min_points: int = DEFAULT_MIN_POINTS):
+    """
+    :param start: Start of the requested time range
+    :param end: End of the requested time range
+    :param min_points: Minimum number of points per symbol the result should have
+    :return: The coarsest of the StockData rollups that still has min_points buckets in the range, StockData itself if
+    none of them does
+    """
+
+    for model, field, _ in reversed(STOCK_ROLLUPS):
+        if (end - start) / BUCKET_LENGTHS[field] >= min_points:
+            return model
+
+    return StockData
+
+
+def get_lookback_start() -> Optional[datetime]:
+    """
+    :return: Start of the time range the stock graphs show by default, midnight lookback_days before today in the
+    [dashboard] section. None if it is not set, then the graphs show the whole history
+    """
+
+    lookback_days = load_pipeline_config().getint("dashboard", "lookback_days", fallback=None)
+
+    if lookback_days is None:
+        return None
+
+    # Whole days, so the range stays the same for a day and the cached graphs can be reused
+    today = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
+
+    return today - timedelta(days=lookback_days)
+
+
+def get_live_interval_seconds() -> int:
+    return load_pipeline_config().getint("dashboard", "live_interval_seconds", fallback=DEFAULT_LIVE_INTERVAL_SECONDS)
+
+
+def get_news_page_size() -> int:
+    return load_pipeline_config().getint("dashboard", "news_page_size", fallback=DEFAULT_NEWS_PAGE_SIZE)
+
+
+def get_search_candidates() -> int:
+    return load_pipeline_config().getint("dashboard", "search_candidates", fallback=DEFAULT_SEARCH_CANDIDATES)
+
+
+def symbol_in(engine: Engine, column, symbols: List[str]):
+    """
+    :return: Predicate that keeps the rows whose column is one of the symbols. PostgreSQL gets a single array
+    parameter (symbol = ANY(:symbols)), so the statement is the same for any number of symbols
+    """
+
+    if engine.db_engine.dialect.name == "postgresql":
+        return column == any_(bindparam("symbols", value=list(symbols), type_=ARRAY(String)))
+
+    return column.in_(symbols)
+
+
+def read_frame(
+    connection: Connection, query, dtypes: Dict[str, str], fetch_size: int = DEFAULT_FETCH_SIZE
+) -> pd.DataFrame:
+    """
+    :param dtypes: The columns of the query mapped to their NumPy dtypes
+    :return: Dataframe with the result of the query, streamed from a server side cursor fetch_size rows at a time
+    and converted into typed columns chunk by chunk
+    """
+
+    result = connection.execution_options(stream_results=True).execute(query)
+
+    chunks = [
+        pd.DataFrame.from_records(rows, columns=list(dtypes)).astype(dtypes) for rows in result.partitions(fetch_size)
+    ]
+
+    if not chunks:
+        return pd.DataFrame({column: pd.Series(dtype=dtype) for column, dtype in dtypes.items()})
+
+    frame = pd.concat(chunks, ignore_index=True)
+
+    # A categorical symbol column stores every symbol once instead of once per row
+    if "symbol" in frame.columns:
+        frame["symbol"] = frame["symbol"].astype("category")
+
+    return frame
+
+
+def get_stock_closes(
+    engine: Engine,
+    symbols: List[str],
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    min_points: int = DEFAULT_MIN_POINTS,
+) -> pd.DataFrame:
+    """
+    :param symbols: The symbols to return the closing prices of
+    :param start: Start of the time range, the first stored bar of the symbols if None
+    :param end: End of the time range, the last stored bar of the symbols if None
+    :param min_points: Minimum number of points per symbol, see choose_resolution
+    :return: Dataframe with the columns symbol, datetime and close at the coarsest resolution that still has
+    min_points points in the range. The name of the table it was read from is in frame.attrs["resolution"]
+    """
+
+    with engine.db_engine.connect() as connection:
+        if start is None or end is None:
+            first, last = connection.execute(
+                select(func.min(StockData.datetime), func.max(StockData.datetime)).where(
+                    symbol_in(engine, StockData.symbol, symbols)
+                )
+            ).one()
+
+            # Older bars may have been moved to the archive
+            first = min(filter(None, [first, archive_start("StockData")]), default=None)
+
+            start = start or first
+            end = end or last
+
+        if start is None or end is None:
+            return pd.DataFrame({column: pd.Series(dtype=dtype) for column, dtype in STOCK_CLOSE_DTYPES.items()})
+
+        model = choose_resolution(start, end, min_points)
+
+        # The rollups are only written to PostgreSQL
+        if engine.db_engine.dialect.name != "postgresql":
+            model = StockData
+
+        # Only the needed columns and rows are read, and the database returns them in plotting order
+        query = (
+            select(model.symbol, model.datetime, model.close)
+            .where(symbol_in(engine, model.symbol, symbols), model.datetime >= start, model.datetime <= end)
+            .order_by(model.symbol, model.datetime)
+        )
+
+        frame = read_frame(connection, query, STOCK_CLOSE_DTYPES)
+
+    # The rollups keep the whole history, only the raw bars before the hot window have to be read from the archive
+    if model is StockData and start < get_hot_cutoff():
+        archived = read_archive("StockData", symbols, start, end, columns=["symbol", "datetime", "close"])
+
+        if archived is not None and not archived.empty:
+            # Rows that were archived but not yet deleted are taken from the database
+            archived = archived[list(STOCK_CLOSE_DTYPES)].astype(STOCK_CLOSE_DTYPES)
+
+            frame = (
+                pd.concat([archived, frame.astype({"symbol": "object"})], ignore_index=True)
+                .drop_duplicates(subset=["symbol", "datetime"], keep="last")
+                .sort_values(["symbol", "datetime"], ignore_index=True)
+                .astype({"symbol": "category"})
+            )
+
+    frame.attrs["resolution"] = model.__tablename__
+
+    return frame
+
+
+def get_last_bar_times(engine: Engine, symbols: List[str]) -> Dict[str, datetime]:
+    """
+    :return: The symbols mapped to the time of their last raw bar in the database, symbols without bars are left out
+    """
+
+    query = (
+        select(StockData.symbol, func.max(StockData.datetime))
+        .where(symbol_in(engine, StockData.symbol, symbols))
+        .group_by(StockData.symbol)
+    )
+
+    with engine.db_engine.connect() as connection:
+        return {symbol: last for symbol, last in connection.execute(query) if last is not None}
+
+
+def get_new_stock_closes(engine: Engine, last_seen: Dict[str, datetime]) -> pd.DataFrame:
+    """
+    :param last_seen: The symbols mapped to the time of the last bar that is already shown
+    :return: Dataframe like get_stock_closes with the raw bars stored after the last seen bar of every symbol
+    """
+
+    if not last_seen:
+        return pd.DataFrame({column: pd.Series(dtype=dtype) for column, dtype in STOCK_CLOSE_DTYPES.items()})
+
+    # One range scan from the oldest of the last seen bars, the bars of the other symbols before theirs are dropped
+    # afterwards
+    query = (
+        select(StockData.symbol, StockData.datetime, StockData.close)
+        .where(symbol_in(engine, StockData.symbol, list(last_seen)), StockData.datetime > min(last_seen.values()))
+        .order_by(StockData.symbol, StockData.datetime)
+    )
+
+    with engine.db_engine.connect() as connection:
+        frame = read_frame(connection, query, STOCK_CLOSE_DTYPES)
+
+    if frame.empty:
+        return frame
+
+    is_new = frame["datetime"] > pd.to_datetime(frame["symbol"].astype("object").map(last_seen))
+
+    return frame[is_new].reset_index(drop=True)
+
+
+def get_news_page(
+    engine: Engine,
+    country: str,
+    after: Optional[Tuple[datetime, int]] = None,
+    page_size: int = DEFAULT_NEWS_PAGE_SIZE,
+) -> List[Row]:
+    """
+    :param country: The country to return the articles of
+    :param after: (published_date, id) of the last article of the previous page, None for the first page
+    :param page_size: Maximum number of articles to return
+    :return: Rows with the id, title, description, url and published_date of the newest articles of the country
+    published before the after article, newest first. Articles without a published date are not listed
+
+    Keyset pagination: every page continues right after the sort key of the previous one, so fetching a page reads
+    page_size rows from the (country, published_date) index however deep the user has scrolled.
+    """
+
+    query = select(NewsData.id, NewsData.title, NewsData.description, NewsData.url, NewsData.published_date).where(
+        NewsData.country == country, NewsData.published_date.is_not(None)
+    )
+
+    if after is not None:
+        published_date, article_id = after
+
+        query = query.where(
+            or_(
+                NewsData.published_date < published_date,
+                and_(NewsData.published_date == published_date, NewsData.id < article_id),
+            )
+        )
+
+    query = query.order_by(NewsData.published_date.desc(), NewsData.id.desc()).limit(page_size)
+
+    with engine.db_engine.connect() as connection:
+        return connection.execute(query).all()
+
+
+def search_news(
+    engine: Engine,
+    search: str,
+    country: str,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    offset: int = 0,
+    page_size: int = DEFAULT_NEWS_PAGE_SIZE,
+    candidates: Optional[int] = None,
+) -> List[Row]:
+    """
+    :param search: The search terms, in the syntax of web search engines on PostgreSQL e.g. rates -"central bank"
+    :param country: The country to search the articles of
+    :param start: Only articles published at or after it if given
+    :param end: Only articles published before it if given
+    :param offset: Number of matching articles already shown
+    :param candidates: Maximum number of matches that are ranked, see DEFAULT_SEARCH_CANDIDATES
+    :return: Rows with the id, title, description, url and published_date of one page of the matching articles,
+    best match first
+
+    On PostgreSQL the terms are looked up in the GIN index on NewsData.search_vector and the matches are ranked by
+    ts_rank_cd, hits in the title weighing more than hits in the description. The rank of every match has to be
+    computed before the first page is known, so only the newest candidates matches are ranked and pages are counted
+    with an offset within them. A common term thus costs at most candidates ranks, but an older article that would
+    rank higher than all of them is not found. Other databases fall back to a case-insensitive substring match of
+    every term, newest first.
+    """
+
+    if not search.split():
+        return []
+
+    columns = [NewsData.id, NewsData.title, NewsData.description, NewsData.url, NewsData.published_date]
+    filters = [NewsData.country == country]
+
+    if start is not None:
+        filters.append(NewsData.published_date >= start)
+
+    if end is not None:
+        filters.append(NewsData.published_date < end)
+
+    if engine.db_engine.dialect.name == "postgresql":
+        ts_query = func.websearch_to_tsquery(cast(TEXT_SEARCH_CONFIG, REGCONFIG), search)
+        matches = (
+            select(*columns, NewsData.search_vector)
+            .where(NewsData.search_vector.op("@@")(ts_query), *filters)
+            .order_by(NewsData.published_date.desc().nulls_last(), NewsData.id.desc())
+            .limit(candidates or get_search_candidates())
+            .subquery()
+        )
+        rank = func.ts_rank_cd(matches.c.search_vector, ts_query)
+
+        query = select(*[matches.c[column.key] for column in columns]).order_by(rank.desc(), matches.c.id.desc())
+    else:
+        terms = [
+            or_(NewsData.title.icontains(term, autoescape=True), NewsData.description.icontains(term, autoescape=True))
+            for term in search.split()
+        ]
+
+        query = (
+            select(*columns)
+            .where(*terms, *filters)
+            .order_by(NewsData.published_date.desc().nulls_last(), NewsData.id.desc())
+        )
+
+    with engine.db_engine.connect() as connection:
+        return connection.execute(query.offset(offset).limit(page_size)).all()
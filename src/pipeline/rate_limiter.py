@@ -0,0 +1,264 @@
+import json
+import os
+import threading
+import time
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Dict, Optional
+
+import requests
+from pipeline_config import load_pipeline_config
+
+# Requests per second for each provider, can be overridden in the [rate_limits] section of configs/pipeline.ini
+DEFAULT_RATE_LIMITS = {
+    "marketstack": 5.0,
+    "alphavantage": 5.0 / 60,
+    "newsapi": 1.0,
+    "newsdataio": 30.0 / (15 * 60),
+    "coincap": 3.0,
+    "exchangerate": 5.0,
+    "weatherapi": 10.0,
+}
+
+# Budgets of the free plans, can be overridden in the [quotas] section e.g. marketstack = 1000/month
+DEFAULT_QUOTAS = {
+    "marketstack": "1000/month",
+    "alphavantage": "25/day",
+    "newsapi": "100/day",
+    "newsdataio": "200/day",
+    "exchangerate": "1500/month",
+    "weatherapi": "1000000/month",
+}
+
+DEFAULT_STATE_FILE = "state/quota_usage.json"
+
+# How the budget periods are named in messages
+PERIOD_ADJECTIVES = {"day": "daily", "month": "monthly"}
+CURRENT_PERIOD_NAMES = {"day": "today", "month": "this month"}
+
+
+class QuotaExceededError(requests.RequestException):
+    """Raised instead of sending a request once the daily or monthly budget of a provider is used up"""
+
+
+class TokenBucket:
+    """
+    Allows on average rate requests per second with bursts of up to capacity requests
+    """
+
+    def __init__(self, rate: float, capacity: Optional[float] = None):
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else max(1.0, rate)
+        self.tokens = self.capacity
+        self.updated_at = time.monotonic()
+
+        self._lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+    def acquire(self, tokens: float = 1.0):
+        """
+        Block until the requested number of tokens is available and take them out of the bucket
+        """
+
+        while True:
+            with self._lock:
+                self._refill()
+
+                if self.tokens >= tokens:
+                    self.tokens -= tokens
+                    return
+
+                wait = (tokens - self.tokens) / self.rate
+
+            time.sleep(wait)
+
+
+@dataclass
+class Quota:
+    limit: int
+    period: str
+
+    @classmethod
+    def parse(cls, quota: str) -> "Quota":
+        """
+        :param quota: Budget in the form <limit>/<period> e.g. 1000/month or 25/day
+        """
+
+        limit, period = quota.split("/")
+
+        if period not in ("day", "month"):
+            raise ValueError(f"Unknown quota period {period}, expected day or month")
+
+        return cls(limit=int(limit), period=period)
+
+    def period_key(self, now: Optional[datetime] = None) -> str:
+        """
+        :return: Identifier of the current budget period e.g. 2024-01-16 for a daily or 2024-01 for a monthly quota
+        """
+
+        now = now or datetime.now(timezone.utc)
+
+        return now.strftime("%Y-%m-%d" if self.period == "day" else "%Y-%m")
+
+
+class QuotaLedger:
+    """
+    Counts the requests sent to every provider in the current budget period and persists the counts in a local
+    json file, so that the budget is shared between runs. Without a state file the counts are only kept in memory.
+    """
+
+    def __init__(self, state_file: Optional[str] = DEFAULT_STATE_FILE):
+        self.state_file = state_file
+        self._lock = threading.Lock()
+        self._usage = self._read()
+
+    def _read(self) -> Dict[str, Dict[str, int]]:
+        if not self.state_file:
+            return {}
+
+        try:
+            with open(self.state_file, "r") as file:
+                return json.load(file)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return {}
+
+    def _write(self):
+        if not self.state_file:
+            return
+
+        directory = os.path.dirname(self.state_file)
+
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        with open(f"{self.state_file}.tmp", "w") as file:
+            json.dump(self._usage, file, indent=2)
+
+        os.replace(f"{self.state_file}.tmp", self.state_file)
+
+    def used(self, provider: str, quota: Quota) -> int:
+        with self._lock:
+            usage = self._usage.get(provider, {})
+
+            return usage.get("used", 0) if usage.get("period") == quota.period_key() else 0
+
+    def consume(self, provider: str, quota: Quota, calls: int = 1, enforce: bool = True):
+        """
+        Record calls to the provider, raises QuotaExceededError if this would exceed the budget of the current period
+
+        :param enforce: Raise if the budget would be exceeded. Calls that have already been sent e.g. retries are
+        recorded with enforce=False
+        """
+
+        with self._lock:
+            period = quota.period_key()
+            usage = self._usage.get(provider, {})
+            used = usage.get("used", 0) if usage.get("period") == period else 0
+
+            if enforce and used + calls > quota.limit:
+                raise QuotaExceededError(
+                    f"The {PERIOD_ADJECTIVES[quota.period]} budget of {quota.limit} calls for {provider} is used up"
+                )
+
+            self._usage[provider] = {"period": period, "used": used + calls}
+            self._write()
+
+
+class RateLimiter:
+    def __init__(
+        self,
+        rate_limits: Optional[Dict[str, float]] = None,
+        quotas: Optional[Dict[str, Quota]] = None,
+        ledger: Optional[QuotaLedger] = None,
+    ):
+        rate_limits = rate_limits if rate_limits is not None else {}
+
+        self.buckets = {provider: TokenBucket(rate) for provider, rate in rate_limits.items()}
+        self.quotas = quotas if quotas is not None else {}
+        self.ledger = ledger if ledger is not None else QuotaLedger()
+
+    def acquire(self, provider: str):
+        """
+        Called before every request that goes over the network. Charges the request to the budget of the provider
+        and then waits until the per-second rate limit allows it to be sent.
+        """
+
+        if provider in self.quotas:
+            self.ledger.consume(provider, self.quotas[provider])
+
+        if provider in self.buckets:
+            self.buckets[provider].acquire()
+
+    def charge(self, provider: str, calls: int):
+        """
+        Charge calls which were sent without going through acquire e.g. the retries of urllib3 to the budget of the
+        provider
+        """
+
+        if provider in self.quotas and calls > 0:
+            self.ledger.consume(provider, self.quotas[provider], calls, enforce=False)
+
+    def remaining(self, provider: str) -> Optional[int]:
+        """
+        :return: Number of calls left in the current budget period, None if the provider has no quota
+        """
+
+        if provider not in self.quotas:
+            return None
+
+        quota = self.quotas[provider]
+
+        return max(0, quota.limit - self.ledger.used(provider, quota))
+
+    def report(self) -> Dict[str, str]:
+        """
+        :return: Dictionary mapping every provider with a quota to a human readable summary of its remaining budget
+        """
+
+        return {
+            provider: f"{self.remaining(provider)} of {quota.limit} calls left {CURRENT_PERIOD_NAMES[quota.period]}"
+            for provider, quota in self.quotas.items()
+        }
+
+
+_rate_limiter: Optional[RateLimiter] = None
+_rate_limiter_lock = threading.Lock()
+
+
+def get_rate_limiter() -> RateLimiter:
+    """
+    :return: The process wide rate limiter configured in the [rate_limits] and [quotas] sections of
+    configs/pipeline.ini
+    """
+
+    global _rate_limiter
+
+    with _rate_limiter_lock:
+        if _rate_limiter is None:
+            config = load_pipeline_config()
+
+            rate_limits = dict(DEFAULT_RATE_LIMITS)
+            quotas = dict(DEFAULT_QUOTAS)
+
+            if config.has_section("rate_limits"):
+                rate_limits.update({provider: float(rate) for provider, rate in config.items("rate_limits")})
+
+            if config.has_section("quotas"):
+                quotas.update(dict(config.items("quotas")))
+
+            _rate_limiter = RateLimiter(
+                rate_limits=rate_limits,
+                quotas={provider: Quota.parse(quota) for provider, quota in quotas.items()},
+                ledger=QuotaLedger(config.get("quota_ledger", "state_file", fallback=DEFAULT_STATE_FILE)),
+            )
+
+        return _rate_limiter
+
+
+if __name__ == "__main__":
+    for provider, summary in get_rate_limiter().report().items():
+        print(f"{provider}: {summary}")
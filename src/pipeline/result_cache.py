@@ -0,0 +1,208 @@
+import functools
+import hashlib
+import logging
+import os
+import pickle
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Optional, Tuple
+
+from http_cache import _atomic_write
+from pipeline_config import load_pipeline_config
+
+DEFAULT_MAX_ENTRIES = 128
+
+# Written by run.py after every load, read by the dashboard workers to find out whether their results are stale
+DEFAULT_VERSION_FILE = "cache/data_version"
+
+# Returned while no load has run yet
+INITIAL_VERSION = "0"
+
+# Marks a key that is not in the cache, None is a valid result
+_MISSING = object()
+
+
+def get_version_file() -> str:
+    """
+    :return: Path of the data version stamp, version_file in the [result_cache] section of configs/pipeline.ini
+    """
+
+    return load_pipeline_config().get("result_cache", "version_file", fallback=DEFAULT_VERSION_FILE)
+
+
+def get_data_version(version_file: Optional[str] = None) -> str:
+    """
+    :return: The current data version, changes every time bump_data_version is called
+    """
+
+    try:
+        with open(version_file or get_version_file(), "r") as file:
+            return file.read().strip() or INITIAL_VERSION
+    except FileNotFoundError:
+        return INITIAL_VERSION
+
+
+def bump_data_version(version_file: Optional[str] = None) -> str:
+    """
+    Mark every cached result as stale, called after new data was loaded into the database
+
+    :return: The new data version
+    """
+
+    version_file = version_file or get_version_file()
+    version = hashlib.sha256(os.urandom(16)).hexdigest()[:16]
+
+    os.makedirs(os.path.dirname(version_file) or ".", exist_ok=True)
+    _atomic_write(version_file, version.encode("utf-8"))
+
+    return version
+
+
+class ResultCache:
+    """
+    Memoizes the results of expensive functions e.g. the figures and article lists built by the dashboard callbacks.
+
+    Results are kept in memory, at most max_entries of them with the least recently used evicted first. With a
+    directory they are also pickled to disk, so several dashboard workers share every result computed by any of them.
+    Every key includes the data version, so all results computed before the last load are ignored once run.py bumps
+    the version.
+    """
+
+    def __init__(
+        self,
+        max_entries: int = DEFAULT_MAX_ENTRIES,
+        directory: Optional[str] = None,
+        version_file: Optional[str] = None,
+    ):
+        self.max_entries = max_entries
+        self.directory = directory
+        self.version_file = version_file
+
+        self._entries: OrderedDict = OrderedDict()
+        self._version: Optional[str] = None
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def make_key(name: str, args: Tuple, kwargs: dict) -> str:
+        return hashlib.sha256(repr((name, args, sorted(kwargs.items()))).encode("utf-8")).hexdigest()
+
+    def _disk_path(self, version: str, key: str) -> str:
+        return os.path.join(self.directory, f"{version}-{key}.pickle")
+
+    def _sync_version(self) -> str:
+        """
+        :return: The current data version, after dropping the in-memory results of older versions
+        """
+
+        version = get_data_version(self.version_file)
+
+        with self._lock:
+            if version == self._version:
+                return version
+
+            self._entries.clear()
+            self._version = version
+
+        if self.directory is not None and os.path.isdir(self.directory):
+            for file_name in os.listdir(self.directory):
+                if file_name.endswith(".pickle") and not file_name.startswith(f"{version}-"):
+                    try:
+                        os.remove(os.path.join(self.directory, file_name))
+                    except FileNotFoundError:
+                        pass
+
+        return version
+
+    def get(self, key: str, version: str) -> Any:
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                return self._entries[key]
+
+        if self.directory is None:
+            return _MISSING
+
+        try:
+            with open(self._disk_path(version, key), "rb") as file:
+                value = pickle.load(file)
+        except (FileNotFoundError, pickle.UnpicklingError, EOFError):
+            return _MISSING
+
+        self._remember(key, value)
+
+        return value
+
+    def _remember(self, key: str, value: Any):
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def set(self, key: str, version: str, value: Any):
+        self._remember(key, value)
+
+        if self.directory is not None:
+            os.makedirs(self.directory, exist_ok=True)
+
+            try:
+                _atomic_write(self._disk_path(version, key), pickle.dumps(value))
+            except (pickle.PicklingError, TypeError, AttributeError) as e:
+                logging.warning(f"Could not store a result on disk: {e!r}")
+
+    def memoize(self, function: Callable) -> Callable:
+        """
+        :return: The function with its results cached by its arguments and the data version
+        """
+
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            version = self._sync_version()
+            key = self.make_key(function.__qualname__, args, kwargs)
+
+            value = self.get(key, version)
+
+            if value is _MISSING:
+                value = function(*args, **kwargs)
+                self.set(key, version, value)
+
+            return value
+
+        return wrapper
+
+
+_result_cache: Optional[ResultCache] = None
+_result_cache_lock = threading.Lock()
+
+
+def get_result_cache() -> ResultCache:
+    """
+    :return: The result cache configured in the [result_cache] section of configs/pipeline.ini
+    """
+
+    global _result_cache
+
+    with _result_cache_lock:
+        if _result_cache is None:
+            config = load_pipeline_config()
+
+            _result_cache = ResultCache(
+                max_entries=config.getint("result_cache", "max_entries", fallback=DEFAULT_MAX_ENTRIES),
+                directory=config.get("result_cache", "directory", fallback=None),
+                version_file=get_version_file(),
+            )
+
+        return _result_cache
+
+
+def memoize(function: Callable) -> Callable:
+    """
+    Decorator which caches the results of a function in the configured result cache, see ResultCache
+    """
+
+    @functools.wraps(function)
+    def wrapper(*args, **kwargs):
+        return get_result_cache().memoize(function)(*args, **kwargs)
+
+    return wrapper
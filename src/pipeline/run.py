@@ -1,57 +1,196 @@
 import configparser
 import json
-import time
+import logging
+import sys
 from dataclasses import dataclass
 from datetime import datetime
-from typing import Any, Dict, List
+from itertools import chain
+from typing import Any, Dict, List, Union
 
+from archive import archive_cold_rows
 from engine import Engine
 from extract_data import (
+    MARKET_STACK_MAX_PAGE_LIMIT,
+    MARKET_STACK_MAX_SYMBOLS_PER_REQUEST,
+    chunk_symbols,
+    estimate_exchange_rate_calls,
+    estimate_market_stack_calls,
     get_exchange_rates,
     get_fake_stock_data,
-    get_newsdataio_news,
     get_stock_data_alpha_vantage,
-    get_stock_data_market_stack,
-    get_weather_data,
+    get_weather_tasks,
+    iter_newsdataio_news,
+    iter_stock_data_market_stack,
 )
+from extraction_engine import ExtractionEngine, ExtractionTask
 from load_data import (
     ExchangeRateData,
     NewsData,
+    PendingWatermarks,
     StockData,
     WeatherData,
     buildEngine,
-    create_tables,
     insert_exchange_rates,
     insert_news_articles,
     insert_stock_data,
     insert_weather_data,
+    load_watermarks,
 )
+from load_pipeline import LoadPipeline
+from migrations import migrate
+from pipeline_config import load_pipeline_config
+from rate_limiter import get_rate_limiter
+from result_cache import bump_data_version
 from sqlalchemy import Column, DateTime, Float, Integer, String, create_engine
-from sqlalchemy.orm import declarative_base, sessionmaker
+from sqlalchemy.orm import declarative_base
+from transform_data import frame_to_records, weather_frame
 
-time.sleep(10)
+logging.getLogger().setLevel(logging.INFO)
 
 engine: Engine = buildEngine()
-create_tables(engine)
+
+# Instead of sleeping a fixed time, wait until the database accepts connections. Embedded backends are ready at once
+engine.wait_until_ready()
+
+# Brings the schema up to date and creates the partitions of the coming months
+migrate(engine)
 
 
 with open('configs/my_stocks.json', 'r') as file:
     # Load the JSON data
     my_stocks = json.load(file)
 
-for country, stocks in my_stocks["stocks"].items():
-    for stock in stocks:
-        insert_stock_data(engine, get_stock_data_market_stack(stock["symbol"]))
 
+def stock_data_page_loader(pending_watermarks: PendingWatermarks):
+    def insert_stock_data_page(engine: Engine, stock_data_by_symbol: Dict[str, List[Dict[str, Any]]]):
+        insert_stock_data(
+            engine,
+            chain.from_iterable(stock_data_by_symbol.values()),
+            watermarks=stock_watermarks,
+            pending_watermarks=pending_watermarks,
+        )
+
+    return insert_stock_data_page
+
+
+pipeline_config = load_pipeline_config()
+
+symbols = [stock["symbol"] for stocks in my_stocks["stocks"].values() for stock in stocks]
+
+# Only request what is newer than the data that is already stored
+stock_watermarks = load_watermarks(engine, "StockData")
+
+tasks = []
+
+# One request per chunk of symbols instead of one per symbol, every page is loaded as soon as it arrives
+for symbol_chunk in chunk_symbols(
+    symbols, pipeline_config.getint("marketstack", "batch_size", fallback=MARKET_STACK_MAX_SYMBOLS_PER_REQUEST)
+):
+    page_limit = pipeline_config.getint("marketstack", "page_limit", fallback=MARKET_STACK_MAX_PAGE_LIMIT)
+    chunk_watermarks = {symbol: stock_watermarks[symbol] for symbol in symbol_chunk if symbol in stock_watermarks}
+
+    # The pages arrive newest first, the watermarks only move once every page of the chunk was stored
+    pending_watermarks = PendingWatermarks("StockData")
+
+    tasks.append(
+        ExtractionTask(
+            "marketstack",
+            iter_stock_data_market_stack,
+            (symbol_chunk,),
+            {"limit": page_limit, "watermarks": chunk_watermarks},
+            load=stock_data_page_loader(pending_watermarks),
+            stream=True,
+            # Every page is one call, the engine only starts the task if the budget covers all of them
+            cost=estimate_market_stack_calls(symbol_chunk, page_limit, chunk_watermarks),
+            finish=pending_watermarks.advance,
+        )
+    )
+
+# Articles which are listed for more than one country are only loaded once
+news_fingerprints = set()
+
+
+def insert_news_batch(engine: Engine, news_data: List[Dict[str, Any]]):
+    insert_news_articles(engine, news_data, seen_fingerprints=news_fingerprints)
+
+
+for country_code in ["de", "gb", "us", "in"]:
+    tasks.append(
+        ExtractionTask("newsdataio", iter_newsdataio_news, (country_code,), load=insert_news_batch, stream=True)
+    )
+
+# A single snapshot against the base currency is enough for the exchange rates between all of the currencies
+currencies = pipeline_config.get("exchange_rates", "currencies", fallback="USD,EUR,GBP,INR")
+currency_list = None if currencies == "all" else [currency.strip() for currency in currencies.split(",")]
+verify_exchange_rates = pipeline_config.getboolean("exchange_rates", "verify", fallback=False)
+
+tasks.append(
+    ExtractionTask(
+        "exchangerate",
+        get_exchange_rates,
+        (currency_list,),
+        {
+            "base_currency": pipeline_config.get("exchange_rates", "base_currency", fallback="USD"),
+            "verify": verify_exchange_rates,
+        },
+        load=insert_exchange_rates,
+        cost=estimate_exchange_rate_calls(currency_list, verify_exchange_rates),
+    )
+)
+
+
+try:
+    with open('configs/my_cities.json', 'r') as file:
+        cities = json.load(file)["cities"]
+except FileNotFoundError:
+    cities = ["Munich"]
+
+weather_mode = pipeline_config.get("weather", "mode", fallback="current")
+
+# The weather of every city is collected while the other fetches are loaded and written with one bulk insert at the end
+weather_data = []
+
+
+def collect_weather(engine: Engine, city_weather: Union[Dict[str, Any], List[Dict[str, Any]]]):
+    weather_data.extend(city_weather if isinstance(city_weather, list) else [city_weather])
+
+
+# One task per city, so the cities are fetched concurrently with the other providers
+tasks.extend(
+    get_weather_tasks(
+        cities,
+        mode=weather_mode,
+        days=pipeline_config.getint("weather", "days", fallback=1),
+        history_date=pipeline_config.get("weather", "history_date", fallback=None),
+        load=collect_weather,
+    )
+)
+
+# Every fetch runs concurrently and is handed to the database writers as soon as it has finished, so fetching and
+# writing overlap
+extraction_engine = ExtractionEngine()
+load_pipeline = LoadPipeline(engine, extraction_engine)
+
+for stage, overlap in load_pipeline.run(tasks).items():
+    logging.info(
+        f"The {stage} stage was busy for {overlap['busy_seconds']}s, "
+        f"{overlap['overlapped_seconds']}s ({overlap['overlap_ratio']:.0%}) of it overlapped with the other stages"
+    )
 
-insert_news_articles(engine, get_newsdataio_news("de"))
-insert_news_articles(engine, get_newsdataio_news("gb"))
-insert_news_articles(engine, get_newsdataio_news("us"))
-insert_news_articles(engine, get_newsdataio_news("in"))
-insert_exchange_rates(engine, get_exchange_rates(["USD", "EUR", "GBP", "INR"]))
-insert_weather_data(engine, get_weather_data("Munich"))
+weather_load_failed = False
 
-Session = sessionmaker(bind=engine.db_engine)
+if weather_data:
+    try:
+        # Only the current conditions advance the watermark. Forecasts lie in the future and the history of a past
+        # date lies behind the watermark of the current conditions, the filter would drop all of its hours
+        insert_weather_data(
+            engine, frame_to_records(weather_frame(weather_data)), incremental=weather_mode == "current"
+        )
+    except Exception as e:
+        logging.error(f"Loading the weather of {len(weather_data)} rows failed: {e!r}")
+        weather_load_failed = True
+
+Session = engine.session_factory
 
 with Session.begin() as session:
     rows = session.query(StockData).all()
@@ -73,3 +212,23 @@ with Session.begin() as session:
     for row in rows:
         print(row)
         print("\n")
+
+# Moves the rows older than the hot window to the Parquet archive
+if pipeline_config.getboolean("archive", "enabled", fallback=False):
+    archive_cold_rows(engine)
+
+# The dashboard caches its graphs and news lists until the data changes, this makes it rebuild them. Also after a
+# partially failed run, since the loads that succeeded changed the data
+logging.info(f"Data version is now {bump_data_version()}")
+
+for provider, summary in get_rate_limiter().report().items():
+    logging.info(f"Remaining API budget for {provider}: {summary}")
+
+logging.info(f"Database connection pool: {engine.pool_report()}")
+
+if extraction_engine.failures or load_pipeline.failures or weather_load_failed:
+    logging.error(
+        f"{len(extraction_engine.failures)} of {len(tasks)} extraction tasks and "
+        f"{len(load_pipeline.failures) + int(weather_load_failed)} loads failed"
+    )
+    sys.exit(1)
@@ -0,0 +1,93 @@
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, List, Tuple
+
+Interval = Tuple[float, float]
+
+
+def merge_intervals(intervals: List[Interval]) -> List[Interval]:
+    """
+    :return: The union of the intervals as a sorted list of disjoint intervals
+    """
+
+    merged: List[Interval] = []
+
+    for start, end in sorted(intervals):
+        if merged and start <= merged[-1][1]:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+        else:
+            merged.append((start, end))
+
+    return merged
+
+
+def intersection_length(first: List[Interval], second: List[Interval]) -> float:
+    """
+    :param first: Sorted disjoint intervals e.g. from merge_intervals
+    :param second: Sorted disjoint intervals e.g. from merge_intervals
+    :return: Total length of the time covered by both
+    """
+
+    length = 0.0
+    i = j = 0
+
+    while i < len(first) and j < len(second):
+        length += max(0.0, min(first[i][1], second[j][1]) - max(first[i][0], second[j][0]))
+
+        if first[i][1] < second[j][1]:
+            i += 1
+        else:
+            j += 1
+
+    return length
+
+
+class StageTimeline:
+    """
+    Records when each stage of the pipeline e.g. extract or load was busy, from any number of threads
+    """
+
+    def __init__(self):
+        self.intervals: Dict[str, List[Interval]] = {}
+        self._lock = threading.Lock()
+
+    def record(self, stage: str, start: float, end: float):
+        with self._lock:
+            self.intervals.setdefault(stage, []).append((start, end))
+
+    @contextmanager
+    def measure(self, stage: str):
+        start = time.monotonic()
+
+        try:
+            yield
+        finally:
+            self.record(stage, start, time.monotonic())
+
+    def overlap_report(self) -> Dict[str, Dict[str, float]]:
+        """
+        :return: Dictionary mapping every stage to the seconds it was busy, the seconds of that during which any other
+        stage was busy as well and the share of the busy time that overlapped
+        """
+
+        with self._lock:
+            busy = {stage: merge_intervals(intervals) for stage, intervals in self.intervals.items()}
+
+        report = {}
+
+        for stage, intervals in busy.items():
+            others = merge_intervals(
+                [interval for other, spans in busy.items() if other != stage for interval in spans]
+            )
+
+            busy_seconds = sum(end - start for start, end in intervals)
+            overlapped_seconds = intersection_length(intervals, others)
+
+            report[stage] = {
+                "busy_seconds": round(busy_seconds, 3),
+                "overlapped_seconds": round(overlapped_seconds, 3),
+                "overlap_ratio": round(overlapped_seconds / busy_seconds, 3) if busy_seconds else 0.0,
+            }
+
+        return report
@@ -0,0 +1,217 @@
+import hashlib
+import re
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+import numpy as np
+import pandas as pd
+
+STOCK_DATA_COLUMNS = ["symbol", "datetime", "open", "high", "low", "close", "volume"]
+NEWS_DATA_COLUMNS = ["title", "description", "source_name", "author", "url", "published_date", "country"]
+WEATHER_DATA_COLUMNS = [
+    "city",
+    "country",
+    "datetime",
+    "condition",
+    "temp_celsius",
+    "temp_feels_like_celsius",
+    "wind_kph",
+    "humidity",
+]
+
+
+def as_naive_utc(value: datetime) -> datetime:
+    """
+    :return: The datetime in UTC without timezone info, which is how the DateTime columns store it
+    """
+
+    if value.tzinfo is None:
+        return value
+
+    return value.astimezone(timezone.utc).replace(tzinfo=None)
+
+
+def frame_to_records(frame: pd.DataFrame) -> List[Dict[str, Any]]:
+    """
+    :param frame: Typed dataframe e.g. from one of the *_frame functions
+    :return: List of dictionaries with plain Python values i.e. datetime instead of Timestamp and None instead of NaN
+    """
+
+    records = frame.astype(object).where(frame.notna(), None)
+
+    for column in frame.columns:
+        if pd.api.types.is_datetime64_any_dtype(frame[column]):
+            records[column] = pd.Series(frame[column].array.to_pydatetime(), index=frame.index, dtype=object)
+
+    return records.to_dict("records")
+
+
+def market_stack_frame(stock_data: List[Dict[str, Any]]) -> pd.DataFrame:
+    """
+    :param stock_data: The "data" field of a Marketstack /eod response
+    :return: Dataframe with the STOCK_DATA_COLUMNS, a UTC datetime column and a nullable integer volume column
+    """
+
+    frame = pd.DataFrame.from_records(stock_data, columns=["symbol", "date", "open", "high", "low", "close", "volume"])
+
+    frame["datetime"] = pd.to_datetime(frame["date"], format="%Y-%m-%dT%H:%M:%S%z", utc=True)
+
+    for column in ["open", "high", "low", "close"]:
+        frame[column] = pd.to_numeric(frame[column], errors="coerce").astype("float64")
+
+    # Missing and zero volumes are stored as NULL
+    volume = np.trunc(pd.to_numeric(frame["volume"], errors="coerce").astype("float64"))
+    frame["volume"] = volume.where(volume != 0).astype("Int64")
+
+    return frame[STOCK_DATA_COLUMNS]
+
+
+def alpha_vantage_frame(price_data: Dict[str, Dict[str, str]], symbol: str) -> pd.DataFrame:
+    """
+    :param price_data: The "Time Series (60min)" field of an AlphaVantage TIME_SERIES_INTRADAY response
+    :param symbol: The symbol the time series belongs to
+    :return: Dataframe with the STOCK_DATA_COLUMNS
+    """
+
+    column_renamings = {
+        '1. open': 'open',
+        '2. high': 'high',
+        '3. low': 'low',
+        '4. close': 'close',
+        '5. volume': 'volume',
+    }
+
+    frame = pd.DataFrame.from_dict(price_data, orient="index", columns=list(column_renamings))
+    frame = frame.rename(columns=column_renamings)
+
+    frame = frame.astype({"open": "float64", "high": "float64", "low": "float64", "close": "float64"})
+    frame["volume"] = frame["volume"].astype("float64").astype("int64")
+
+    frame["datetime"] = pd.to_datetime(frame.index, format="%Y-%m-%d %H:%M:%S")
+    frame["symbol"] = symbol
+
+    return frame.reset_index(drop=True)[STOCK_DATA_COLUMNS]
+
+
+def newsdataio_frame(articles: List[Dict[str, Any]], country: str) -> pd.DataFrame:
+    """
+    :param articles: The "results" field of a NewsDataIO response
+    :param country: The country code the articles were requested for e.g. de
+    :return: Dataframe with the NEWS_DATA_COLUMNS
+    """
+
+    column_renamings = {
+        "pubDate": "published_date",
+        "source_id": "source_name",
+        "creator": "author",
+        "link": "url",
+    }
+
+    frame = pd.DataFrame.from_records(
+        articles, columns=["title", "description", "source_id", "creator", "link", "pubDate"]
+    )
+    frame = frame.rename(columns=column_renamings)
+
+    frame["published_date"] = pd.to_datetime(frame["published_date"], format="%Y-%m-%d %H:%M:%S")
+    frame["country"] = country
+
+    return frame[NEWS_DATA_COLUMNS]
+
+
+def normalize_url(url: Optional[str]) -> str:
+    """
+    :return: The url without scheme, www. prefix, fragment, trailing slash and tracking parameters, so that the same
+    article linked from different feeds gets the same url
+    """
+
+    if not url:
+        return ""
+
+    parts = urlsplit(url.strip())
+
+    host = parts.netloc.lower().removeprefix("www.")
+    path = parts.path.rstrip("/")
+    query = urlencode(
+        sorted((key, value) for key, value in parse_qsl(parts.query) if not key.lower().startswith("utm_"))
+    )
+
+    return urlunsplit(("", host, path, query, "")).removeprefix("//")
+
+
+def news_fingerprint(url: Optional[str], title: Optional[str]) -> str:
+    """
+    :return: sha256 hex digest of the normalized url and the case and whitespace insensitive title of an article
+    """
+
+    normalized_title = re.sub(r"\s+", " ", title or "").strip().casefold()
+
+    return hashlib.sha256(f"{normalize_url(url)}\n{normalized_title}".encode("utf-8")).hexdigest()
+
+
+def weather_frame(weather_data: List[Dict[str, Any]]) -> pd.DataFrame:
+    """
+    :param weather_data: Weather records of one or more cities, e.g. from get_weather_data or get_hourly_weather_data
+    :return: Dataframe with the WEATHER_DATA_COLUMNS, a datetime column and float measurements
+    """
+
+    frame = pd.DataFrame.from_records(weather_data, columns=WEATHER_DATA_COLUMNS)
+
+    frame["datetime"] = pd.to_datetime(frame["datetime"], format="%Y-%m-%d %H:%M")
+
+    for column in ["temp_celsius", "temp_feels_like_celsius", "wind_kph", "humidity"]:
+        frame[column] = pd.to_numeric(frame[column], errors="coerce").astype("float64")
+
+    return frame
+
+
+def cross_rate_matrix(base_rates: np.ndarray) -> np.ndarray:
+    """
+    :param base_rates: Units of each currency per 1 unit of a common base currency
+    :return: N x N matrix where entry [i, j] is the number of units of currency j per 1 unit of currency i
+    """
+
+    return base_rates[np.newaxis, :] / base_rates[:, np.newaxis]
+
+
+def cross_rate_records(currencies: List[str], matrix: np.ndarray, last_update: datetime) -> List[Dict[str, Any]]:
+    """
+    :param currencies: The currencies of the rows and columns of the matrix
+    :param matrix: Cross rate matrix from cross_rate_matrix
+    :param last_update: Time of the snapshot the matrix was computed from
+    :return: List of dictionaries with the exchange rate of every pair of different currencies
+    """
+
+    first_indices, second_indices = np.nonzero(~np.eye(len(currencies), dtype=bool))
+
+    frame = pd.DataFrame(
+        {
+            "first_currency": np.asarray(currencies, dtype=object)[first_indices],
+            "second_currency": np.asarray(currencies, dtype=object)[second_indices],
+            "exchange_rate": matrix[first_indices, second_indices],
+        }
+    )
+    frame["datetime"] = last_update
+
+    return frame_to_records(frame)
+
+
+def cross_rate_discrepancies(
+    currencies: List[str], matrix: np.ndarray, first_currency: str, direct_rates: Dict[str, float], tolerance: float
+) -> Dict[str, float]:
+    """
+    :param direct_rates: Directly quoted units of each currency per 1 unit of first_currency
+    :return: Dictionary mapping each second currency to the relative difference between its triangulated and its
+    direct rate, for every pair where the difference is larger than tolerance
+    """
+
+    row = matrix[currencies.index(first_currency)]
+    direct = np.array([direct_rates.get(currency, np.nan) for currency in currencies])
+
+    relative_differences = np.abs(row - direct) / direct
+
+    return {
+        currency: float(relative_difference)
+        for currency, relative_difference in zip(currencies, relative_differences)
+        if relative_difference > tolerance
+    }
@@ -1,6 +1,45 @@
+import importlib
+import importlib.abc
+import importlib.util
 import os
 import sys
 
 PROJECT_PATH = os.getcwd()
 SOURCE_PATH = os.path.join(PROJECT_PATH, "src")
 sys.path.append(SOURCE_PATH)
+# The pipeline modules import each other by module name e.g. "from engine import Engine"
+PIPELINE_PATH = os.path.join(SOURCE_PATH, "pipeline")
+sys.path.append(PIPELINE_PATH)
+
+
+class PipelineModuleAliases(importlib.abc.MetaPathFinder, importlib.abc.Loader):
+    """
+    The tests import the pipeline modules as pipeline.<module>, the modules import each other as <module>. Both names
+    are bound to the same module object, otherwise every module would be loaded twice, with two ORM registries, two
+    sets of singletons and patches that only one of the copies sees.
+    """
+
+    def find_spec(self, fullname, path, target=None):
+        package, _, name = fullname.partition(".")
+
+        if package == "pipeline" and name and "." not in name:
+            return importlib.util.spec_from_loader(fullname, self)
+
+        return None
+
+    def create_module(self, spec):
+        module = importlib.import_module(spec.name.partition(".")[2])
+
+        # The import machinery sets __spec__ to the alias before exec_module, which puts the original back
+        self.original_spec = module.__spec__
+
+        return module
+
+    def exec_module(self, module):
+        module.__spec__ = self.original_spec
+
+
+sys.meta_path.insert(0, PipelineModuleAliases())
+
+# Keep the tests away from the on-disk response cache and the persistent API quota ledger
+os.environ.setdefault("PIPELINE_CONFIG", os.path.join(PROJECT_PATH, "tests", "pipeline.ini"))
@@ -0,0 +1,78 @@
+import os
+import tempfile
+import unittest
+from datetime import datetime
+from unittest.mock import patch
+
+import pandas as pd
+
+from pipeline import archive
+from pipeline.archive import archive_start, read_archive, write_partitions
+
+
+class TestArchive(unittest.TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+
+        patcher = patch.object(archive, "get_archive_directory", return_value=self.directory)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_archive_start(self):
+        self.assertIsNone(archive_start("StockData"))
+
+        os.makedirs(os.path.join(self.directory, "source=StockData", "month=2023-02", "symbol=AAPL"))
+        os.makedirs(os.path.join(self.directory, "source=StockData", "month=2022-11", "symbol=AAPL"))
+
+        self.assertEqual(archive_start("StockData"), datetime(2022, 11, 1))
+
+    @unittest.skipIf(archive.pa is None, "pyarrow is not installed")
+    def test_round_trip(self):
+        frame = pd.DataFrame(
+            {
+                "symbol": ["AAPL", "AAPL", "MSFT"],
+                "datetime": pd.to_datetime(["2023-01-31 10:00", "2023-02-01 10:00", "2023-01-31 10:00"]),
+                "close": [1.0, 2.0, 3.0],
+            }
+        )
+
+        self.assertEqual(write_partitions(frame, "StockData", self.directory), 3)
+
+        archived = read_archive(
+            "StockData", ["AAPL"], datetime(2023, 1, 1), datetime(2023, 1, 31, 23), ["symbol", "datetime", "close"]
+        )
+
+        self.assertEqual(archived["symbol"].tolist(), ["AAPL"])
+        self.assertEqual(archived["close"].tolist(), [1.0])
+
+    @unittest.skipIf(archive.pa is None, "pyarrow is not installed")
+    def test_second_run_merges_into_the_partition(self):
+        def archive_bars(days, close):
+            frame = pd.DataFrame(
+                {
+                    "symbol": ["AAPL"] * len(days),
+                    "datetime": pd.to_datetime([f"2023-01-{day:02d}" for day in days]),
+                    "close": [close] * len(days),
+                }
+            )
+
+            return write_partitions(frame, "StockData", self.directory)
+
+        # Like two nightly runs, the second one also archives a bar of the first one again
+        self.assertEqual(archive_bars([2, 3], 1.0), 1)
+        self.assertEqual(archive_bars([3, 4], 2.0), 1)
+
+        partition = os.path.join(self.directory, "source=StockData", "month=2023-01", "symbol=AAPL")
+
+        self.assertEqual(os.listdir(partition), ["data.parquet"])
+
+        archived = read_archive("StockData", ["AAPL"], datetime(2023, 1, 1), datetime(2023, 1, 31))
+
+        self.assertEqual(archived["datetime"].dt.day.tolist(), [2, 3, 4])
+        self.assertEqual(archived["close"].tolist(), [1.0, 2.0, 2.0])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,55 @@
+import unittest
+from datetime import datetime, timedelta, timezone
+from unittest.mock import MagicMock
+
+from pipeline.copy_loader import copy_into_staging, merge_staging_table
+from pipeline.load_data import ExchangeRateData, WeatherData
+
+
+class TestCopyLoader(unittest.TestCase):
+    def test_copy_into_staging(self):
+        session = MagicMock()
+        cursor = session.connection.return_value.connection.cursor.return_value
+        cursor.copy_expert.side_effect = lambda sql, buffer: setattr(cursor, "copied", (sql, buffer.read()))
+
+        rows = [
+            {
+                "city": "Munich",
+                "country": "Germany",
+                "datetime": datetime(2024, 1, 16, 13, 0, tzinfo=timezone(timedelta(hours=1))),
+                "condition": "",
+                "temp_celsius": 1.5,
+                "temp_feels_like_celsius": None,
+                "wind_kph": 10.0,
+                "humidity": 80.0,
+            }
+        ]
+
+        copy_into_staging(session, WeatherData, rows)
+
+        sql, csv_data = cursor.copied
+
+        self.assertIn("COPY staging_weatherdata", sql)
+        self.assertIn("FORMAT csv", sql)
+
+        # The datetime is converted to naive UTC, an empty string stays quoted and None becomes an unquoted NULL
+        self.assertEqual(csv_data.strip(), '"Munich","Germany",2024-01-16T12:00:00,"",1.5,,10.0,80.0')
+        cursor.close.assert_called_once()
+
+    def test_merge_staging_table(self):
+        session = MagicMock()
+
+        merge_staging_table(session, ExchangeRateData, update_on_conflict=False)
+
+        statement = str(session.execute.call_args.args[0])
+
+        self.assertIn('INSERT INTO "ExchangeRateData"', statement)
+        self.assertIn("FROM staging_exchangeratedata", statement)
+        self.assertIn('ON CONFLICT ("first_currency", "second_currency", "datetime") DO NOTHING', statement)
+
+        # The last staged row of every key comes first and is the one DISTINCT ON keeps
+        self.assertIn('"datetime", "load_sequence" DESC', statement)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,82 @@
+import unittest
+from datetime import datetime
+from types import SimpleNamespace
+from unittest.mock import patch
+
+import plotly.graph_objects as go
+from dash import no_update
+from dash.exceptions import PreventUpdate
+from sqlalchemy import create_engine
+
+from pipeline import dashboard
+from pipeline.dashboard import create_live_state, extend_stocks_graph
+from pipeline.load_data import Base, StockData
+
+
+def make_figure(resolution, x, last_bar):
+    fig = go.Figure(go.Scatter(name="AAPL", x=x, y=[float(point.day) for point in x]))
+    fig.update_layout(meta={"resolution": resolution, "last_bars": {"AAPL": last_bar.isoformat()}})
+
+    return fig
+
+
+class TestLiveUpdates(unittest.TestCase):
+    def setUp(self):
+        self.db_engine = create_engine("sqlite://")
+        Base.metadata.create_all(self.db_engine)
+
+        self.add_bars(range(1, 11))
+
+        patcher = patch.object(dashboard, "get_engine", return_value=SimpleNamespace(db_engine=self.db_engine))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def add_bars(self, days):
+        with self.db_engine.begin() as connection:
+            connection.execute(
+                StockData.__table__.insert(),
+                [{"symbol": "AAPL", "datetime": datetime(2024, 1, day), "close": float(day)} for day in days],
+            )
+
+    def test_raw_figure_appends_new_bars(self):
+        fig = make_figure("StockData", [datetime(2024, 1, 9), datetime(2024, 1, 10)], datetime(2024, 1, 10))
+        live_state = create_live_state(fig)
+
+        self.assertRaises(PreventUpdate, extend_stocks_graph, live_state, "us")
+
+        self.add_bars([11])
+
+        (extend_data, traces, _), figure, live_state = extend_stocks_graph(live_state, "us")
+
+        self.assertEqual(extend_data, {"x": [["2024-01-11T00:00:00"]], "y": [[11.0]]})
+        self.assertEqual(traces, [0])
+        self.assertIs(figure, no_update)
+        self.assertEqual(live_state["last"], {"AAPL": "2024-01-11T00:00:00"})
+
+    def test_weekly_figure_is_rebuilt(self):
+        # The last point is the start of the week, the bars of that week up to the 10th are already in it
+        fig = make_figure("StockDataWeekly", [datetime(2024, 1, 1), datetime(2024, 1, 8)], datetime(2024, 1, 10))
+        live_state = create_live_state(fig)
+
+        self.assertEqual(live_state["last"], {"AAPL": "2024-01-10T00:00:00"})
+        self.assertRaises(PreventUpdate, extend_stocks_graph, live_state, "us")
+
+        self.add_bars([11])
+
+        rebuilt = make_figure("StockDataWeekly", [datetime(2024, 1, 1), datetime(2024, 1, 8)], datetime(2024, 1, 11))
+
+        with patch.object(dashboard, "create_stocks_figure", return_value=rebuilt):
+            extend_data, figure, live_state = extend_stocks_graph(live_state, "us")
+
+        # The week of the new bar is replaced with the rebuilt figure instead of daily bars being appended to it
+        self.assertIs(extend_data, no_update)
+        self.assertIs(figure, rebuilt)
+        self.assertEqual(live_state["last"], {"AAPL": "2024-01-11T00:00:00"})
+
+        # Until run.py bumped the data version the cached figure does not have the new bar yet
+        with patch.object(dashboard, "create_stocks_figure", return_value=fig):
+            self.assertRaises(PreventUpdate, extend_stocks_graph, create_live_state(fig), "us")
+
+
+if __name__ == "__main__":
+    unittest.main()
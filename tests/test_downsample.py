@@ -0,0 +1,51 @@
+import unittest
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from pipeline.downsample import downsample_frame, lttb, visible_range
+
+
+class TestDownsample(unittest.TestCase):
+    def test_lttb_keeps_ends_and_peaks(self):
+        x = np.arange(1000, dtype=np.float64)
+        y = np.sin(x / 50)
+        y[437] = 10.0
+
+        indices = lttb(x, y, 100)
+
+        self.assertEqual(len(indices), 100)
+        self.assertEqual(indices[0], 0)
+        self.assertEqual(indices[-1], 999)
+        self.assertTrue(np.all(np.diff(indices) > 0))
+        self.assertIn(437, indices)
+
+        self.assertEqual(lttb(x[:50], y[:50], 100).tolist(), list(range(50)))
+
+    def test_downsample_frame(self):
+        frame = pd.DataFrame(
+            {
+                "symbol": pd.Categorical(["AAPL"] * 500 + ["MSFT"] * 10),
+                "datetime": list(pd.date_range("2020-01-01", periods=500))
+                + list(pd.date_range("2020-01-01", periods=10)),
+                "close": np.random.default_rng(0).random(510),
+            }
+        )
+
+        downsampled = downsample_frame(frame, x="datetime", y="close", by="symbol", max_points=50)
+
+        self.assertEqual(downsampled["symbol"].value_counts().to_dict(), {"AAPL": 50, "MSFT": 10})
+
+    def test_visible_range(self):
+        self.assertIsNone(visible_range(None))
+        self.assertIsNone(visible_range({"autosize": True}))
+        self.assertEqual(visible_range({"xaxis.autorange": True}), (None, None))
+        self.assertEqual(
+            visible_range({"xaxis.range[0]": "2024-01-02 12:30:00.5", "xaxis.range[1]": "2024-02-01"}),
+            (datetime(2024, 1, 2, 12, 30, 0, 500000), datetime(2024, 2, 1)),
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,70 @@
+import os
+import tempfile
+import unittest
+from unittest.mock import patch
+
+from sqlalchemy import create_engine, text
+
+import pipeline.engine as engine_module
+from pipeline.engine import InstrumentedQueuePool, get_engine, get_sessionmaker
+
+DATABASE_INI = """
+[postgresql]
+host = localhost
+port = 5432
+dbname = personal_dashboard
+user = postgres
+password = postgres
+
+[pool]
+pool_size = 2
+max_overflow = 0
+pool_pre_ping = false
+"""
+
+
+class TestEngineRegistry(unittest.TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+
+        config_path = os.path.join(directory.name, "database.ini")
+
+        with open(config_path, "w") as file:
+            file.write(DATABASE_INI)
+
+        patcher = patch.object(engine_module, "DATABASE_CONFIG_PATH", config_path)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        engine_module._engine = None
+        self.addCleanup(setattr, engine_module, "_engine", None)
+
+    def test_one_engine_per_process(self):
+        engine = get_engine()
+
+        self.assertIs(get_engine(), engine)
+        self.assertIs(get_sessionmaker(), engine.session_factory)
+        self.assertEqual(engine.db_engine.pool.size(), 2)
+        self.assertFalse(engine.db_engine.pool._pre_ping)
+
+        # A forked child process gets its own engine
+        with patch("os.getpid", return_value=os.getpid() + 1):
+            self.assertIsNot(get_engine(), engine)
+
+    def test_pool_stats(self):
+        db_engine = create_engine("sqlite://", poolclass=InstrumentedQueuePool)
+
+        for _ in range(3):
+            with db_engine.connect() as connection:
+                connection.execute(text("SELECT 1"))
+
+        report = db_engine.pool.stats.report()
+
+        self.assertEqual(report["checkouts"], 3)
+        self.assertEqual(report["timeouts"], 0)
+        self.assertGreaterEqual(report["max_wait_ms"], report["average_wait_ms"])
+
+
+if __name__ == "__main__":
+    unittest.main()
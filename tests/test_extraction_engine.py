@@ -0,0 +1,73 @@
+import sys
+import threading
+import time
+import unittest
+
+from pipeline.extraction_engine import ExtractionEngine, ExtractionTask
+
+
+def slow_extract(value):
+    time.sleep(0.5)
+    return value
+
+
+def fast_extract(value):
+    return value
+
+
+def failing_extract():
+    sys.exit(1)
+
+
+class TestExtractionEngine(unittest.TestCase):
+    def test_slow_provider_does_not_block_others(self):
+        tasks = [ExtractionTask("slow", slow_extract, ("slow",))] + [
+            ExtractionTask("fast", fast_extract, (i,)) for i in range(5)
+        ]
+
+        engine = ExtractionEngine({"slow": 1, "fast": 2})
+
+        results = [result for _, result in engine.run(tasks)]
+
+        self.assertEqual(results[-1], "slow")
+        self.assertCountEqual(results[:-1], list(range(5)))
+
+    def test_concurrency_limit_per_provider(self):
+        lock = threading.Lock()
+        in_flight = []
+        max_in_flight = []
+
+        def tracked_extract():
+            with lock:
+                in_flight.append(1)
+                max_in_flight.append(len(in_flight))
+            time.sleep(0.05)
+            with lock:
+                in_flight.pop()
+
+        engine = ExtractionEngine({"provider": 2})
+
+        list(engine.run([ExtractionTask("provider", tracked_extract) for _ in range(6)]))
+
+        self.assertEqual(max(max_in_flight), 2)
+
+    def test_streaming_task_yields_every_item(self):
+        engine = ExtractionEngine({"provider": 1})
+
+        results = [result for _, result in engine.run([ExtractionTask("provider", iter, ([1, 2, 3],), stream=True)])]
+
+        self.assertEqual(results, [1, 2, 3])
+
+    def test_failures_are_recorded(self):
+        engine = ExtractionEngine({"provider": 2})
+
+        results = list(
+            engine.run([ExtractionTask("provider", failing_extract), ExtractionTask("provider", fast_extract, (1,))])
+        )
+
+        self.assertEqual([result for _, result in results], [1])
+        self.assertEqual(len(engine.failures), 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,86 @@
+import os
+import tempfile
+import unittest
+from unittest.mock import Mock
+
+import requests
+
+from pipeline.http_cache import CacheMissError, ResponseCache
+
+
+def make_response(content: bytes, status_code: int = 200, headers=None):
+    response = Mock()
+    response.status_code = status_code
+    response.content = content
+    response.headers = headers or {}
+    response.encoding = "utf-8"
+    return response
+
+
+class TestResponseCache(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.cache = ResponseCache(directory=self.directory.name)
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_key_ignores_api_key(self):
+        first = self.cache.make_key("marketstack", "http://x/eod", {"access_key": "a", "symbols": "AAPL"})
+        second = self.cache.make_key("marketstack", "http://x/eod", {"symbols": "AAPL", "access_key": "b"})
+        other_symbol = self.cache.make_key("marketstack", "http://x/eod", {"symbols": "TSLA", "access_key": "a"})
+
+        self.assertEqual(first, second)
+        self.assertNotEqual(first, other_symbol)
+        self.assertNotIn(
+            "secret", self.cache.describe_request("exchangerate", "http://x/secret/USD", secrets=["secret"])
+        )
+
+    def test_fresh_entry_is_served_without_network(self):
+        fetch = Mock(return_value=make_response(b'{"data": []}'))
+
+        first = self.cache.get("marketstack", "http://x/eod", {"symbols": "AAPL"}, (), fetch)
+        second = self.cache.get("marketstack", "http://x/eod", {"symbols": "AAPL"}, (), fetch)
+
+        self.assertEqual(fetch.call_count, 1)
+        self.assertEqual(first.status_code, 200)
+        self.assertEqual(second.json(), {"data": []})
+
+    def test_stale_entry_is_revalidated(self):
+        self.cache.ttls["marketstack"] = 0
+        fetch = Mock(return_value=make_response(b'{"data": [1]}', headers={"ETag": '"v1"'}))
+
+        self.cache.get("marketstack", "http://x/eod", {}, (), fetch)
+
+        fetch.return_value = make_response(b"", status_code=304)
+        response = self.cache.get("marketstack", "http://x/eod", {}, (), fetch)
+
+        fetch.assert_called_with({"If-None-Match": '"v1"'})
+        self.assertEqual(response.json(), {"data": [1]})
+
+    def test_cache_only_mode_never_fetches(self):
+        self.cache.mode = "only"
+        fetch = Mock()
+
+        with self.assertRaises(requests.RequestException):
+            self.cache.get("marketstack", "http://x/eod", {}, (), fetch)
+
+        self.assertRaises(CacheMissError, self.cache.get, "weatherapi", "http://x", {}, (), fetch)
+        fetch.assert_not_called()
+
+    def test_least_recently_used_entries_are_evicted(self):
+        self.cache.max_size_bytes = 2500
+
+        for index in range(3):
+            key = self.cache.make_key("coincap", f"http://x/{index}")
+            self.cache.store(key, f"coincap http://x/{index}", make_response(b"x" * 1000))
+            os.utime(self.cache._paths(key)[0], (index, index))
+
+        self.cache.evict()
+
+        self.assertIsNone(self.cache.lookup(self.cache.make_key("coincap", "http://x/0")))
+        self.assertIsNotNone(self.cache.lookup(self.cache.make_key("coincap", "http://x/2")))
+
+
+if __name__ == "__main__":
+    unittest.main()
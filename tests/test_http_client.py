@@ -0,0 +1,22 @@
+import unittest
+from unittest.mock import patch
+
+import requests
+
+from pipeline.http_client import get_session, get_timeout
+
+
+class TestHttpClient(unittest.TestCase):
+    @patch("requests.Session.request")
+    def test_session_uses_provider_timeout(self, request):
+        session = get_session("newsapi")
+
+        # Client libraries such as newsapi pass their own timeout
+        session.get("https://newsapi.org/v2/top-headlines", timeout=30)
+
+        self.assertEqual(request.call_args.kwargs["timeout"], get_timeout("newsapi"))
+        self.assertIsInstance(session, requests.Session)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,148 @@
+import unittest
+from datetime import datetime, timezone
+
+from sqlalchemy import func, select
+
+from pipeline.engine import Engine
+from pipeline.load_data import (
+    NewsData,
+    StockData,
+    Watermark,
+    WeatherData,
+    insert_exchange_rates,
+    insert_news_articles,
+    insert_stock_data,
+    insert_weather_data,
+    load_watermarks,
+)
+from pipeline.migrations import migrate
+
+try:
+    import duckdb_engine
+except ImportError:
+    duckdb_engine = None
+
+
+def make_bar(symbol, day, close):
+    return {
+        "symbol": symbol,
+        "datetime": datetime(2024, 1, day, tzinfo=timezone.utc),
+        "open": 1.0,
+        "high": 2.0,
+        "low": 0.5,
+        "close": close,
+        "volume": 100,
+    }
+
+
+def make_article(title, url, country):
+    return {
+        "title": title,
+        "description": None,
+        "source_name": "source",
+        "author": None,
+        "url": url,
+        "published_date": datetime(2024, 1, 16),
+        "country": country,
+    }
+
+
+class LoaderTests:
+    db_type: str
+
+    def setUp(self):
+        self.engine = Engine(db_type=self.db_type, db_name=":memory:")
+        migrate(self.engine)
+
+    def count(self, model) -> int:
+        with self.engine.session_factory.begin() as session:
+            return session.execute(select(func.count()).select_from(model)).scalar()
+
+    def test_insert_stock_data(self):
+        insert_stock_data(self.engine, [make_bar("AAPL", 1, 1.0), make_bar("AAPL", 2, 2.0), make_bar("MSFT", 2, 3.0)])
+
+        # Loading again updates the bars after the watermark instead of duplicating them
+        insert_stock_data(self.engine, (bar for bar in [make_bar("AAPL", 2, 2.5), make_bar("AAPL", 3, 3.0)]))
+
+        self.assertEqual(self.count(StockData), 4)
+        self.assertEqual(
+            load_watermarks(self.engine, "StockData"), {"AAPL": datetime(2024, 1, 3), "MSFT": datetime(2024, 1, 2)}
+        )
+
+        with self.engine.session_factory.begin() as session:
+            close = session.execute(
+                select(StockData.close).where(StockData.symbol == "AAPL", StockData.datetime == datetime(2024, 1, 2))
+            ).scalar()
+
+        self.assertEqual(close, 2.5)
+
+    def test_duplicate_keys_keep_last_row(self):
+        # The bars of one batch are merged with a single statement, the last bar with the same key must win
+        bars = [make_bar("AAPL", 1, close) for close in [1.0, 5.0, 3.0, 4.0]] + [make_bar("MSFT", 1, 2.0)]
+        bars.append(make_bar("AAPL", 1, 9.0))
+
+        insert_stock_data(self.engine, bars, watermarks={})
+
+        with self.engine.session_factory.begin() as session:
+            closes = dict(session.execute(select(StockData.symbol, StockData.close)).all())
+
+        self.assertEqual(closes, {"AAPL": 9.0, "MSFT": 2.0})
+
+    def test_insert_exchange_rates(self):
+        rate = {
+            "first_currency": "USD",
+            "second_currency": "EUR",
+            "datetime": datetime(2024, 1, 16),
+            "exchange_rate": 0.9,
+        }
+
+        insert_exchange_rates(self.engine, [rate])
+        insert_exchange_rates(self.engine, [dict(rate, exchange_rate=0.8)])
+
+        self.assertEqual(self.count(Watermark), 1)
+
+    def test_insert_weather_history_after_current(self):
+        def make_weather(day, hour):
+            return {
+                "city": "Munich",
+                "country": "Germany",
+                "datetime": datetime(2026, 10, day, hour, tzinfo=timezone.utc),
+                "condition": "Sunny",
+                "temp_celsius": 10.0,
+                "temp_feels_like_celsius": 9.0,
+                "wind_kph": 5.0,
+                "humidity": 60.0,
+            }
+
+        insert_weather_data(self.engine, make_weather(18, 12))
+
+        # The history of a past date lies behind the watermark of the current conditions
+        insert_weather_data(self.engine, [make_weather(1, hour) for hour in range(24)], incremental=False)
+
+        self.assertEqual(self.count(WeatherData), 25)
+        self.assertEqual(load_watermarks(self.engine, "WeatherData"), {"Munich, Germany": datetime(2026, 10, 18, 12)})
+
+    def test_insert_news_articles(self):
+        articles = [
+            make_article("Markets rally", "https://example.com/a", "de"),
+            make_article("Markets  rally", "https://www.example.com/a/", "us"),
+            make_article("Markets fall", "https://example.com/b", "us"),
+        ]
+
+        insert_news_articles(self.engine, articles)
+        insert_news_articles(self.engine, articles)
+
+        self.assertEqual(self.count(NewsData), 2)
+
+
+class TestSQLiteLoaders(LoaderTests, unittest.TestCase):
+    db_type = "sqlite"
+
+
+@unittest.skipIf(duckdb_engine is None, "duckdb_engine is not installed")
+class TestDuckDBLoaders(LoaderTests, unittest.TestCase):
+    db_type = "duckdb"
+
+
+if __name__ == "__main__":
+    unittest.main()
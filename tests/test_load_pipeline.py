@@ -0,0 +1,109 @@
+import threading
+import time
+import unittest
+
+from pipeline.extraction_engine import ExtractionEngine, ExtractionTask
+from pipeline.load_pipeline import LoadPipeline
+from pipeline.rate_limiter import QuotaLedger, RateLimiter
+from pipeline.stage_timeline import StageTimeline, intersection_length, merge_intervals
+
+
+def extract_pages(pages):
+    for page in range(pages):
+        time.sleep(0.05)
+        yield page
+
+
+class TestStageTimeline(unittest.TestCase):
+    def test_merge_and_intersect(self):
+        self.assertEqual(merge_intervals([(3, 4), (0, 1), (0.5, 2)]), [(0, 2), (3, 4)])
+        self.assertEqual(intersection_length([(0, 2), (3, 4)], [(1, 3.5)]), 1.5)
+
+    def test_overlap_report(self):
+        timeline = StageTimeline()
+        timeline.record("extract", 0, 4)
+        timeline.record("load", 3, 5)
+
+        report = timeline.overlap_report()
+
+        self.assertEqual(report["extract"], {"busy_seconds": 4, "overlapped_seconds": 1, "overlap_ratio": 0.25})
+        self.assertEqual(report["load"], {"busy_seconds": 2, "overlapped_seconds": 1, "overlap_ratio": 0.5})
+
+
+class TestLoadPipeline(unittest.TestCase):
+    def make_extraction_engine(self, queue_size):
+        return ExtractionEngine({"test": 2}, RateLimiter(ledger=QuotaLedger(None)), queue_size=queue_size)
+
+    def test_extract_and_load_overlap(self):
+        loaded = []
+        loading = threading.Event()
+        extracted = threading.Event()
+
+        def extract():
+            yield 0
+
+            # Produces the second page while the first one is being loaded
+            loading.wait(timeout=5)
+            time.sleep(0.02)
+            extracted.set()
+
+            yield from range(1, 10)
+
+        def load(engine, page):
+            if page == 0:
+                loading.set()
+                extracted.wait(timeout=5)
+
+            loaded.append(page)
+
+        tasks = [ExtractionTask("test", extract, load=load, stream=True)]
+
+        pipeline = LoadPipeline(None, self.make_extraction_engine(queue_size=2), writers=1, queue_size=2)
+        report = pipeline.run(tasks)
+
+        self.assertEqual(loaded, list(range(10)))
+        self.assertEqual(pipeline.failures, [])
+        self.assertGreater(report["load"]["overlapped_seconds"], 0)
+
+    def test_backpressure(self):
+        produced = []
+        loaded = []
+        max_waiting = []
+        lock = threading.Lock()
+
+        def extract():
+            for page in range(20):
+                with lock:
+                    produced.append(page)
+                yield page
+
+        def load(engine, page):
+            time.sleep(0.01)
+
+            with lock:
+                loaded.append(page)
+                max_waiting.append(len(produced) - len(loaded))
+
+        tasks = [ExtractionTask("test", extract, load=load, stream=True)]
+
+        LoadPipeline(None, self.make_extraction_engine(queue_size=1), writers=1, queue_size=1).run(tasks)
+
+        self.assertEqual(len(loaded), 20)
+
+        # One page in each queue, one handed over by the main thread and one that waits to be put
+        self.assertLessEqual(max(max_waiting), 4)
+
+    def test_failed_load_is_recorded(self):
+        def load(engine, page):
+            raise ValueError("database is down")
+
+        tasks = [ExtractionTask("test", extract_pages, (2,), load=load, stream=True)]
+
+        pipeline = LoadPipeline(None, self.make_extraction_engine(queue_size=2), writers=2, queue_size=2)
+        pipeline.run(tasks)
+
+        self.assertEqual(len(pipeline.failures), 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
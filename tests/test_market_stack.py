@@ -0,0 +1,95 @@
+import json
+import unittest
+from datetime import datetime, timezone
+from unittest.mock import Mock, patch
+
+from pipeline.extract_data import (
+    chunk_symbols,
+    estimate_exchange_rate_calls,
+    estimate_market_stack_calls,
+    iter_stock_data_market_stack,
+)
+from pipeline.http_cache import ResponseCache
+
+
+def make_page(data, offset, total):
+    response = Mock()
+    response.status_code = 200
+    response.content = json.dumps(
+        {"pagination": {"limit": 2, "offset": offset, "count": len(data), "total": total}, "data": data}
+    )
+    return response
+
+
+def make_data_point(symbol, date):
+    return {
+        "symbol": symbol,
+        "date": date,
+        "open": 1.0,
+        "high": 2.0,
+        "low": 0.5,
+        "close": 1.5,
+        "volume": 100.0,
+        "exchange": "XNAS",
+    }
+
+
+class TestMarketStackBatching(unittest.TestCase):
+    def test_chunk_symbols(self):
+        self.assertEqual(chunk_symbols(["A", "B", "A", "C", "D"], 2), [["A", "B"], ["C", "D"]])
+
+    def test_estimate_calls(self):
+        today = datetime(2024, 1, 15)
+        symbols = [f"S{i}" for i in range(10)]
+
+        # A year of history for 10 symbols is about 2610 bars, 3 pages of 1000
+        self.assertEqual(estimate_market_stack_calls(symbols, 1000, today=today), 3)
+        self.assertEqual(
+            estimate_market_stack_calls(symbols, 1000, {symbol: datetime(2024, 1, 10) for symbol in symbols}, today), 1
+        )
+
+        self.assertEqual(estimate_exchange_rate_calls(["USD", "EUR"], verify=False), 1)
+        self.assertEqual(estimate_exchange_rate_calls(["USD", "EUR"], verify=True), 3)
+
+    @patch('pipeline.extract_data.get_api_key', return_value="key")
+    @patch('pipeline.http_client.get_response_cache', return_value=ResponseCache(mode="off"))
+    @patch('requests.Session.get')
+    def test_follows_pagination_and_splits_by_symbol(self, mock_get, *_):
+        mock_get.side_effect = [
+            make_page(
+                [
+                    make_data_point("AAPL", "2024-01-12T00:00:00+0000"),
+                    make_data_point("TSLA", "2024-01-12T00:00:00+0000"),
+                ],
+                0,
+                3,
+            ),
+            make_page([make_data_point("AAPL", "2024-01-11T00:00:00+0000")], 2, 3),
+        ]
+
+        pages = list(iter_stock_data_market_stack(["AAPL", "TSLA"], limit=2))
+
+        self.assertEqual(mock_get.call_count, 2)
+        self.assertEqual(mock_get.call_args_list[1].kwargs["params"]["offset"], 2)
+        self.assertEqual(mock_get.call_args_list[0].kwargs["params"]["symbols"], "AAPL,TSLA")
+        self.assertEqual(mock_get.call_args_list[0].kwargs["params"]["access_key"], "key")
+
+        self.assertEqual(sorted(pages[0]), ["AAPL", "TSLA"])
+        self.assertEqual(
+            pages[1]["AAPL"],
+            [
+                {
+                    "symbol": "AAPL",
+                    "datetime": datetime(2024, 1, 11, tzinfo=timezone.utc),
+                    "open": 1.0,
+                    "high": 2.0,
+                    "low": 0.5,
+                    "close": 1.5,
+                    "volume": 100,
+                }
+            ],
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,52 @@
+import unittest
+from datetime import date
+from types import SimpleNamespace
+from unittest.mock import MagicMock
+
+from sqlalchemy import create_engine, inspect
+from sqlalchemy.orm import sessionmaker
+
+from pipeline.migrations import add_months, ensure_partitions, migrate, month_starts
+
+
+class TestMigrations(unittest.TestCase):
+    def test_month_starts(self):
+        self.assertEqual(add_months(date(2024, 12, 15), 1), date(2025, 1, 1))
+        self.assertEqual(add_months(date(2024, 3, 31), -3), date(2023, 12, 1))
+        self.assertEqual(
+            month_starts(date(2023, 11, 20), date(2024, 2, 1)),
+            [date(2023, 11, 1), date(2023, 12, 1), date(2024, 1, 1), date(2024, 2, 1)],
+        )
+
+    def test_ensure_partitions_cover_the_history(self):
+        session = MagicMock()
+        # None of the partitions exist yet
+        session.execute.return_value.scalar.return_value = None
+
+        ensure_partitions(session, months_ahead=1, today=date(2024, 3, 10), months_back=2)
+
+        statements = [str(call.args[0]) for call in session.execute.call_args_list]
+        attached = [statement for statement in statements if "ATTACH PARTITION" in statement]
+
+        self.assertEqual(len(attached), 8)
+        self.assertIn(
+            'ALTER TABLE "StockData" ATTACH PARTITION "StockData_2024_01" '
+            "FOR VALUES FROM ('2024-01-01') TO ('2024-02-01')",
+            attached,
+        )
+        self.assertIn('ATTACH PARTITION "ExchangeRateData_2024_04"', attached[-1])
+
+        # Rows of the month that landed in the default partition are moved into the new partition
+        self.assertTrue(any('DELETE FROM "StockData_default"' in statement for statement in statements))
+
+    def test_migrate_other_databases(self):
+        db_engine = create_engine("sqlite://")
+        engine = SimpleNamespace(db_engine=db_engine, session_factory=sessionmaker(bind=db_engine))
+
+        # The versioned migrations need PostgreSQL, other databases only get the tables
+        self.assertEqual(migrate(engine), [])
+        self.assertIn("StockData", inspect(db_engine).get_table_names())
+
+
+if __name__ == "__main__":
+    unittest.main()
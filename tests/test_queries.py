@@ -0,0 +1,179 @@
+import unittest
+from datetime import datetime
+from types import SimpleNamespace
+from unittest.mock import MagicMock
+
+from sqlalchemy import create_engine
+from sqlalchemy.dialects import postgresql
+
+from pipeline.load_data import Base, NewsData, StockData, StockDataDaily, StockDataMonthly, StockDataWeekly
+from pipeline.queries import (
+    choose_resolution,
+    get_last_bar_times,
+    get_new_stock_closes,
+    get_news_page,
+    get_stock_closes,
+    search_news,
+)
+
+
+class TestQueries(unittest.TestCase):
+    def test_choose_resolution(self):
+        start = datetime(2020, 1, 1)
+
+        self.assertIs(choose_resolution(start, datetime(2020, 1, 20), min_points=100), StockData)
+        self.assertIs(choose_resolution(start, datetime(2020, 12, 31), min_points=100), StockDataDaily)
+        self.assertIs(choose_resolution(start, datetime(2022, 12, 31), min_points=100), StockDataWeekly)
+        self.assertIs(choose_resolution(start, datetime(2029, 12, 31), min_points=100), StockDataMonthly)
+
+    def test_get_stock_closes(self):
+        db_engine = create_engine("sqlite://")
+        Base.metadata.create_all(db_engine)
+
+        with db_engine.begin() as connection:
+            connection.execute(
+                StockData.__table__.insert(),
+                [
+                    {"symbol": "AAPL", "datetime": datetime(2024, 1, 2), "close": 2.0},
+                    {"symbol": "AAPL", "datetime": datetime(2024, 1, 1), "close": 1.0},
+                    {"symbol": "MSFT", "datetime": datetime(2024, 1, 1), "close": 3.0},
+                ],
+            )
+
+        frame = get_stock_closes(SimpleNamespace(db_engine=db_engine), ["AAPL"])
+
+        self.assertEqual(list(frame.columns), ["symbol", "datetime", "close"])
+        self.assertEqual(frame["close"].tolist(), [1.0, 2.0])
+        self.assertEqual(frame.attrs["resolution"], "StockData")
+        self.assertEqual(str(frame["symbol"].dtype), "category")
+        self.assertEqual(str(frame["datetime"].dtype), "datetime64[ns]")
+        self.assertEqual(str(frame["close"].dtype), "float64")
+
+        empty = get_stock_closes(SimpleNamespace(db_engine=db_engine), ["NVDA"])
+
+        self.assertTrue(empty.empty)
+        self.assertEqual(str(empty["close"].dtype), "float64")
+
+    def test_get_new_stock_closes(self):
+        db_engine = create_engine("sqlite://")
+        Base.metadata.create_all(db_engine)
+
+        with db_engine.begin() as connection:
+            connection.execute(
+                StockData.__table__.insert(),
+                [
+                    {"symbol": symbol, "datetime": datetime(2024, 1, day), "close": float(day)}
+                    for symbol in ["AAPL", "MSFT", "TSLA"]
+                    for day in range(1, 6)
+                ],
+            )
+
+        engine = SimpleNamespace(db_engine=db_engine)
+
+        frame = get_new_stock_closes(engine, {"AAPL": datetime(2024, 1, 3), "MSFT": datetime(2024, 1, 4)})
+
+        self.assertEqual(frame["symbol"].tolist(), ["AAPL", "AAPL", "MSFT"])
+        self.assertEqual(frame["close"].tolist(), [4.0, 5.0, 5.0])
+        self.assertTrue(get_new_stock_closes(engine, {"AAPL": datetime(2024, 1, 5)}).empty)
+
+        self.assertEqual(
+            get_last_bar_times(engine, ["AAPL", "NVDA"]),
+            {"AAPL": datetime(2024, 1, 5)},
+        )
+
+    def test_get_news_page(self):
+        db_engine = create_engine("sqlite://")
+        Base.metadata.create_all(db_engine)
+
+        with db_engine.begin() as connection:
+            connection.execute(
+                NewsData.__table__.insert(),
+                [
+                    {"id": 1, "title": "a", "country": "de", "published_date": datetime(2024, 1, 1)},
+                    {"id": 2, "title": "b", "country": "de", "published_date": datetime(2024, 1, 3)},
+                    {"id": 3, "title": "c", "country": "de", "published_date": datetime(2024, 1, 3)},
+                    {"id": 4, "title": "d", "country": "us", "published_date": datetime(2024, 1, 4)},
+                    {"id": 5, "title": "e", "country": "de", "published_date": datetime(2024, 1, 2)},
+                ],
+            )
+
+        engine = SimpleNamespace(db_engine=db_engine)
+        titles = []
+        after = None
+
+        while True:
+            page = get_news_page(engine, "de", after=after, page_size=2)
+            titles.append([article.title for article in page])
+
+            if len(page) < 2:
+                break
+
+            after = (page[-1].published_date, page[-1].id)
+
+        self.assertEqual(titles, [["c", "b"], ["e", "a"], []])
+
+    def test_search_news(self):
+        db_engine = create_engine("sqlite://")
+        Base.metadata.create_all(db_engine)
+
+        with db_engine.begin() as connection:
+            connection.execute(
+                NewsData.__table__.insert(),
+                [
+                    {
+                        "title": "ECB raises rates",
+                        "description": None,
+                        "country": "de",
+                        "published_date": datetime(2024, 1, 1),
+                    },
+                    {
+                        "title": "Rates stay",
+                        "description": "100% sure",
+                        "country": "de",
+                        "published_date": datetime(2024, 1, 5),
+                    },
+                    {
+                        "title": "Rates fall",
+                        "description": None,
+                        "country": "us",
+                        "published_date": datetime(2024, 1, 5),
+                    },
+                    {
+                        "title": "Football",
+                        "description": "ECB",
+                        "country": "de",
+                        "published_date": datetime(2024, 1, 6),
+                    },
+                ],
+            )
+
+        engine = SimpleNamespace(db_engine=db_engine)
+
+        def titles(*args, **kwargs):
+            return [article.title for article in search_news(engine, *args, **kwargs)]
+
+        self.assertEqual(titles("rates", "de"), ["Rates stay", "ECB raises rates"])
+        self.assertEqual(titles("rates ecb", "de"), ["ECB raises rates"])
+        self.assertEqual(titles("rates", "de", start=datetime(2024, 1, 2)), ["Rates stay"])
+        self.assertEqual(titles("rates", "de", end=datetime(2024, 1, 2)), ["ECB raises rates"])
+        self.assertEqual(titles("rates", "de", offset=1), ["ECB raises rates"])
+        self.assertEqual(titles("0%", "de"), ["Rates stay"])
+        self.assertEqual(titles(" ", "de"), [])
+
+    def test_search_news_ranks_limited_candidates(self):
+        engine = MagicMock()
+        engine.db_engine.dialect.name = "postgresql"
+        connection = engine.db_engine.connect.return_value.__enter__.return_value
+
+        search_news(engine, "rates", "de", offset=20, candidates=500)
+
+        statement = connection.execute.call_args.args[0].compile(dialect=postgresql.dialect())
+        sql = str(statement)
+
+        # The newest matches are picked with the GIN index first and only they are ranked
+        self.assertLess(sql.index("LIMIT"), sql.index(") AS anon_1 ORDER BY ts_rank_cd"))
+        self.assertEqual(sorted(value for value in statement.params.values() if isinstance(value, int)), [20, 20, 500])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,59 @@
+import os
+import tempfile
+import time
+import unittest
+
+from pipeline.extraction_engine import ExtractionEngine, ExtractionTask
+from pipeline.rate_limiter import Quota, QuotaExceededError, QuotaLedger, RateLimiter, TokenBucket
+
+
+class TestRateLimiter(unittest.TestCase):
+    def test_token_bucket_waits_for_tokens(self):
+        bucket = TokenBucket(rate=20, capacity=1)
+
+        start = time.monotonic()
+        for _ in range(3):
+            bucket.acquire()
+
+        self.assertGreaterEqual(time.monotonic() - start, 0.09)
+
+    def test_quota_is_persisted_between_runs(self):
+        with tempfile.TemporaryDirectory() as directory:
+            state_file = os.path.join(directory, "quota_usage.json")
+            quotas = {"alphavantage": Quota.parse("2/day")}
+
+            RateLimiter(quotas=quotas, ledger=QuotaLedger(state_file)).acquire("alphavantage")
+
+            rate_limiter = RateLimiter(quotas=quotas, ledger=QuotaLedger(state_file))
+
+            self.assertEqual(rate_limiter.remaining("alphavantage"), 1)
+
+            rate_limiter.acquire("alphavantage")
+
+            self.assertRaises(QuotaExceededError, rate_limiter.acquire, "alphavantage")
+            self.assertEqual(rate_limiter.report(), {"alphavantage": "0 of 2 calls left today"})
+
+            # Retries have already been sent, they are recorded even when the budget is used up
+            rate_limiter.charge("alphavantage", 2)
+
+            self.assertEqual(QuotaLedger(state_file).used("alphavantage", quotas["alphavantage"]), 4)
+            self.assertRaisesRegex(QuotaExceededError, "daily budget", rate_limiter.acquire, "alphavantage")
+
+    def test_engine_skips_tasks_over_budget(self):
+        rate_limiter = RateLimiter(quotas={"newsdataio": Quota.parse("2/day")}, ledger=QuotaLedger(None))
+        engine = ExtractionEngine({"newsdataio": 1}, rate_limiter)
+
+        tasks = [
+            ExtractionTask("newsdataio", str, ("low",)),
+            ExtractionTask("newsdataio", str, ("high",), priority=1),
+            ExtractionTask("newsdataio", str, ("expensive",), cost=2),
+        ]
+
+        results = [result for _, result in engine.run(tasks)]
+
+        self.assertEqual(results, ["high", "low"])
+        self.assertEqual([task.args for task in engine.skipped], [("expensive",)])
+
+
+if __name__ == "__main__":
+    unittest.main()
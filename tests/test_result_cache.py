@@ -0,0 +1,64 @@
+import os
+import tempfile
+import unittest
+
+from pipeline.result_cache import ResultCache, bump_data_version, get_data_version
+
+
+class TestResultCache(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.version_file = os.path.join(self.directory.name, "data_version")
+        self.calls = []
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def make_function(self, cache):
+        @cache.memoize
+        def build(country, start=None):
+            self.calls.append((country, start))
+            return f"{country}-{start}"
+
+        return build
+
+    def test_results_are_cached_until_the_version_changes(self):
+        build = self.make_function(ResultCache(max_entries=2, version_file=self.version_file))
+
+        self.assertEqual(build("Germany"), "Germany-None")
+        self.assertEqual(build("Germany"), "Germany-None")
+        build("India", start=1)
+        self.assertEqual(len(self.calls), 2)
+
+        # The least recently used result is evicted once there are more than max_entries
+        build("Germany")
+        build("United States")
+        build("India", start=1)
+        self.assertEqual(len(self.calls), 4)
+
+        self.assertEqual(get_data_version(self.version_file), "0")
+        bump_data_version(self.version_file)
+        self.assertNotEqual(get_data_version(self.version_file), "0")
+
+        build("United States")
+        self.assertEqual(len(self.calls), 5)
+
+    def test_results_are_shared_on_disk(self):
+        results = os.path.join(self.directory.name, "results")
+
+        first = self.make_function(ResultCache(directory=results, version_file=self.version_file))
+        second = self.make_function(ResultCache(directory=results, version_file=self.version_file))
+
+        first("Germany")
+        self.assertEqual(second("Germany"), "Germany-None")
+        self.assertEqual(len(self.calls), 1)
+
+        bump_data_version(self.version_file)
+
+        second("Germany")
+        self.assertEqual(len(self.calls), 2)
+        self.assertEqual(len(os.listdir(results)), 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
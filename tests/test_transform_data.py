@@ -2,17 +2,26 @@
 # since now we just have to specify the "assert" keyword and don't need to do any inheritance
 
 import unittest
-from datetime import datetime
+from datetime import datetime, timezone
 from unittest.mock import Mock, patch
 
+import numpy as np
 import pytest
 import requests
 
 from pipeline.extract_data import get_stock_data_alpha_vantage
+from pipeline.transform_data import (
+    cross_rate_discrepancies,
+    cross_rate_matrix,
+    cross_rate_records,
+    frame_to_records,
+    market_stack_frame,
+    news_fingerprint,
+)
 
 
 class TestTransformData(unittest.TestCase):
-    @patch('requests.get')
+    @patch('requests.Session.get')
     def test_transform_data(self, mock_get):
         mock_response = Mock()
         response_dict = {
@@ -87,6 +96,79 @@ class TestTransformData(unittest.TestCase):
 
         self.assertEqual(user_data, expected_result)
 
+    def test_market_stack_frame(self):
+        stock_data = [
+            {
+                'open': 185.675,
+                'high': 185.7,
+                'low': 185.56,
+                'close': 185.63,
+                'volume': 25944.0,
+                'adj_close': 185.63,
+                'symbol': 'AAPL',
+                'exchange': 'XNAS',
+                'date': '2024-01-12T00:00:00+0000',
+            },
+            {
+                'open': 185.8,
+                'high': 185.81,
+                'low': 185.65,
+                'close': 185.67,
+                'volume': None,
+                'adj_close': 185.67,
+                'symbol': 'AAPL',
+                'exchange': 'XNAS',
+                'date': '2024-01-11T00:00:00+0000',
+            },
+        ]
+
+        records = frame_to_records(market_stack_frame(stock_data))
+
+        self.assertEqual(
+            records[0],
+            {
+                'symbol': 'AAPL',
+                'datetime': datetime(2024, 1, 12, tzinfo=timezone.utc),
+                'open': 185.675,
+                'high': 185.7,
+                'low': 185.56,
+                'close': 185.63,
+                'volume': 25944,
+            },
+        )
+        self.assertIsNone(records[1]['volume'])
+        self.assertIs(type(records[0]['datetime']), datetime)
+
+    def test_cross_rates(self):
+        currencies = ["USD", "EUR", "INR"]
+        matrix = cross_rate_matrix(np.array([1.0, 0.5, 80.0]))
+
+        records = cross_rate_records(currencies, matrix, datetime(2024, 1, 16, tzinfo=timezone.utc))
+
+        self.assertEqual(len(records), 6)
+        self.assertIn(
+            {
+                'first_currency': 'EUR',
+                'second_currency': 'INR',
+                'exchange_rate': 160.0,
+                'datetime': datetime(2024, 1, 16, tzinfo=timezone.utc),
+            },
+            records,
+        )
+        discrepancies = cross_rate_discrepancies(
+            currencies, matrix, "EUR", {"USD": 2.0, "EUR": 1.0, "INR": 150.0}, 1e-3
+        )
+
+        self.assertEqual(list(discrepancies), ["INR"])
+        self.assertAlmostEqual(discrepancies["INR"], 10.0 / 150.0)
+
+    def test_news_fingerprint(self):
+        fingerprint = news_fingerprint("https://www.example.com/news/1/?utm_source=feed#top", "Markets  Rally")
+
+        self.assertEqual(fingerprint, news_fingerprint("http://example.com/news/1", "markets rally"))
+        self.assertNotEqual(fingerprint, news_fingerprint("http://example.com/news/2", "markets rally"))
+        self.assertNotEqual(fingerprint, news_fingerprint("http://example.com/news/1", "markets fall"))
+
 
 if __name__ == "__main__":
     unittest.main()
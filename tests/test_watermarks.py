@@ -0,0 +1,102 @@
+import unittest
+from datetime import datetime, timezone
+
+from pipeline.engine import Engine
+from pipeline.extraction_engine import ExtractionEngine, ExtractionTask
+from pipeline.load_data import (
+    Base,
+    PendingWatermarks,
+    StockData,
+    advance_watermarks,
+    filter_new_rows,
+    get_watermarks,
+    insert_stock_data,
+)
+from pipeline.load_pipeline import LoadPipeline
+from pipeline.rate_limiter import QuotaLedger, RateLimiter
+
+
+def make_bar(symbol, day):
+    return {"symbol": symbol, "datetime": datetime(2024, 1, day, tzinfo=timezone.utc), "close": 1.0}
+
+
+class TestWatermarks(unittest.TestCase):
+    def setUp(self):
+        self.engine = Engine(db_type="sqlite", db_name=":memory:")
+        Base.metadata.create_all(self.engine.db_engine)
+
+    def test_filter_new_rows(self):
+        rows = [make_bar("AAPL", 1), make_bar("AAPL", 3), make_bar("MSFT", 1)]
+
+        # Rows at the watermark are kept so that a bar that was updated later in the day is written again
+        self.assertEqual(
+            filter_new_rows("StockData", rows, {"AAPL": datetime(2024, 1, 3)}),
+            [make_bar("AAPL", 3), make_bar("MSFT", 1)],
+        )
+
+    def test_advance_watermarks_only_moves_forward(self):
+        with self.engine.session_factory.begin() as session:
+            advance_watermarks(session, "StockData", [make_bar("AAPL", 2), make_bar("AAPL", 5), make_bar("MSFT", 1)])
+            advance_watermarks(session, "StockData", [make_bar("AAPL", 3), make_bar("MSFT", 4)])
+
+        with self.engine.session_factory.begin() as session:
+            self.assertEqual(
+                get_watermarks(session, "StockData"),
+                {"AAPL": datetime(2024, 1, 5), "MSFT": datetime(2024, 1, 4)},
+            )
+            self.assertEqual(get_watermarks(session, "ExchangeRateData"), {})
+
+    def test_snapshot_keeps_older_batches(self):
+        with self.engine.session_factory.begin() as session:
+            advance_watermarks(session, "StockData", [make_bar("AAPL", 2)])
+            snapshot = get_watermarks(session, "StockData")
+
+        # Providers return the newest data first, the second batch is older than what the first one stored
+        batches = [[make_bar("AAPL", 6), make_bar("AAPL", 5)], [make_bar("AAPL", 4), make_bar("AAPL", 1)]]
+        loaded = []
+
+        for batch in batches:
+            with self.engine.session_factory.begin() as session:
+                rows = filter_new_rows("StockData", batch, snapshot)
+                advance_watermarks(session, "StockData", rows)
+                loaded.extend(rows)
+
+        self.assertEqual(loaded, [make_bar("AAPL", 6), make_bar("AAPL", 5), make_bar("AAPL", 4)])
+
+        with self.engine.session_factory.begin() as session:
+            self.assertEqual(get_watermarks(session, "StockData"), {"AAPL": datetime(2024, 1, 6)})
+
+    def test_failed_page_keeps_watermarks(self):
+        pages = [[make_bar("AAPL", 6), make_bar("AAPL", 5)], [make_bar("AAPL", 4), make_bar("AAPL", 3)]]
+
+        def extract(fail_on_page):
+            for page, bars in enumerate(pages):
+                if page == fail_on_page:
+                    # Like the Marketstack extractor when a request fails
+                    raise SystemExit(1)
+
+                yield bars
+
+        def run(fail_on_page):
+            pending_watermarks = PendingWatermarks("StockData")
+
+            def load(engine, bars):
+                insert_stock_data(engine, bars, watermarks={}, pending_watermarks=pending_watermarks)
+
+            task = ExtractionTask(
+                "test", extract, (fail_on_page,), load=load, stream=True, finish=pending_watermarks.advance
+            )
+            extraction_engine = ExtractionEngine({"test": 1}, RateLimiter(ledger=QuotaLedger(None)))
+
+            LoadPipeline(self.engine, extraction_engine, writers=1).run([task])
+
+            with self.engine.session_factory.begin() as session:
+                return get_watermarks(session, "StockData"), session.query(StockData).count()
+
+        # The first page was stored, but the watermark stays put so that the next run fetches the second page again
+        self.assertEqual(run(fail_on_page=1), ({}, 2))
+        self.assertEqual(run(fail_on_page=None), ({"AAPL": datetime(2024, 1, 6)}, 4))
+
+
+if __name__ == "__main__":
+    unittest.main()